@@ -0,0 +1,143 @@
+import logging
+from collections import Counter, namedtuple
+from typing import Dict, Optional
+
+from config import (
+    ADMISSION_COSTS, ADMISSION_USER_BURST, ADMISSION_USER_RATE, ADMISSION_GUILD_BURST, ADMISSION_GUILD_RATE,
+    ADMISSION_GLOBAL_BURST, ADMISSION_GLOBAL_RATE, ADMISSION_RESERVE, ADMISSION_PRUNE_SECONDS
+)
+from timeutil import get_clock
+
+# Ticket lifecycle commands; only the per-user limit applies to them
+CRITICAL_COMMANDS = frozenset({'claim', 'unclaim', 'reclaim', 'officer'})
+
+# retry_after is in seconds; notify is set on the first rejection since the caller was last admitted
+Decision = namedtuple('Decision', ['admitted', 'reason', 'retry_after', 'notify'])
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated_ms')
+
+    def __init__(self, capacity: float, rate: float, now: int):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_ms = now
+
+    def refill(self, now: int):
+        """Add the tokens earned since the last refill."""
+        if now > self.updated_ms:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_ms) * self.rate / 1000)
+            self.updated_ms = now
+
+    def take(self, cost: float):
+        """Remove tokens, never going below zero."""
+        self.tokens = max(0.0, self.tokens - cost)
+
+    def wait_for(self, level: float) -> float:
+        """Seconds until the bucket holds `level` tokens."""
+        return max(0.0, (level - self.tokens) / self.rate) if self.rate > 0 else float('inf')
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.capacity
+
+class AdmissionController:
+    """Token-bucket admission for commands: per user, per guild and global.
+
+    Decisions are made in memory before a command is parsed, so shedding costs
+    no database or REST work. Read-only commands must leave ADMISSION_RESERVE of
+    every bucket untouched, which keeps headroom for ticket-critical commands;
+    those are limited per user only and still drain the shared buckets.
+    """
+
+    def __init__(self, bot, clock=None):
+        self.bot = bot
+        self.clock = clock or get_clock()
+        now = self.clock.now_ms()
+        self.global_bucket = TokenBucket(ADMISSION_GLOBAL_BURST, ADMISSION_GLOBAL_RATE, now)
+        self.guild_buckets: Dict[int, TokenBucket] = {}
+        self.user_buckets: Dict[tuple, TokenBucket] = {}  # (guild ID, user ID) -> bucket
+        self.notified = set()  # (guild ID, user ID) already told to slow down
+        self.counters = {'admitted': 0, 'priority': 0, 'shed': 0}
+        self.shed_by_reason = Counter()
+        self.shed_by_command = Counter()
+        self.shed_by_guild = Counter()
+        self._pruned_at = now
+
+    def cost_of(self, command: str) -> float:
+        """Get a command's token cost."""
+        return ADMISSION_COSTS.get(command, 1)
+
+    def check(self, command: str, guild_id: Optional[int], user_id: int) -> Decision:
+        """Admit or shed one command invocation, charging every bucket it passes."""
+        now = self.clock.now_ms()
+        guild_key = guild_id or 0
+        user_key = (guild_key, user_id)
+        cost = self.cost_of(command)
+        critical = command in CRITICAL_COMMANDS
+
+        user = self.user_buckets.get(user_key)
+        if user is None:
+            user = self.user_buckets[user_key] = TokenBucket(ADMISSION_USER_BURST, ADMISSION_USER_RATE, now)
+        guild = self.guild_buckets.get(guild_key)
+        if guild is None:
+            guild = self.guild_buckets[guild_key] = TokenBucket(ADMISSION_GUILD_BURST, ADMISSION_GUILD_RATE, now)
+        buckets = (('user', user), ('guild', guild), ('global', self.global_bucket))
+        for _, bucket in buckets:
+            bucket.refill(now)
+
+        checked = buckets[:1] if critical else buckets
+        for reason, bucket in checked:
+            needed = cost if critical else cost + bucket.capacity * ADMISSION_RESERVE
+            if bucket.tokens < needed:
+                return self._shed(command, guild_key, user_key, reason, bucket.wait_for(needed))
+
+        for _, bucket in buckets:
+            bucket.take(cost)
+        self.counters['admitted'] += 1
+        if critical:
+            self.counters['priority'] += 1
+        self.notified.discard(user_key)
+
+        if now - self._pruned_at >= ADMISSION_PRUNE_SECONDS * 1000:
+            self._prune(now)
+        return Decision(True, None, 0.0, False)
+
+    def _shed(self, command: str, guild_key: int, user_key: tuple, reason: str, retry_after: float) -> Decision:
+        """Count a rejection; only the first one of a burst asks for a reply."""
+        self.counters['shed'] += 1
+        self.shed_by_reason[reason] += 1
+        self.shed_by_command[command] += 1
+        self.shed_by_guild[guild_key] += 1
+
+        notify = user_key not in self.notified
+        if notify:
+            self.notified.add(user_key)
+            logging.info(
+                f"Shedding {command} from user {user_key[1]} in guild {guild_key}: "
+                f"{reason} limit, retry in {retry_after:.1f} s"
+            )
+        return Decision(False, reason, retry_after, notify)
+
+    def _prune(self, now: int):
+        """Drop buckets that have refilled completely; they are recreated full on demand."""
+        for buckets in (self.user_buckets, self.guild_buckets):
+            for key, bucket in list(buckets.items()):
+                bucket.refill(now)
+                if bucket.full:
+                    del buckets[key]
+                    self.notified.discard(key)
+        self._pruned_at = now
+
+    def stats(self) -> dict:
+        """Get admission counters and the most-shed commands and guilds."""
+        return {
+            **self.counters,
+            'by_reason': dict(self.shed_by_reason),
+            'top_commands': self.shed_by_command.most_common(5),
+            'top_guilds': self.shed_by_guild.most_common(5),
+            'global_tokens': round(self.global_bucket.tokens, 1),
+            'tracked_users': len(self.user_buckets),
+            'tracked_guilds': len(self.guild_buckets)
+        }
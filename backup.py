@@ -0,0 +1,212 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from config import (
+    BACKUP_DIR, BACKUP_COPY_TIMEOUT, BACKUP_BUSY_RETRY, BACKUP_GENERATIONS
+)
+from tracing import traced
+
+REQUIRED_TABLES = {'guild_config', 'ticket_claims', 'leaderboard', 'ticket_holders', 'active_timeouts'}
+PRE_RESTORE_PREFIX = "pre-restore-"
+SQLITE_DONE = 101  # sqlite3_backup_step result once every page is copied
+
+def backup_stem(name: str) -> str:
+    """Get the database a backup name belongs to, e.g. 'ticket_bot' or 'shard-03'."""
+    base = name[:-len('.gz')] if name.endswith('.gz') else name
+    return base[:-len('.db')].rsplit('-', 2)[0]
+
+def _database_stem(path: str) -> str:
+    """Get the backup stem of a live database file."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def verify_database(path: str) -> Optional[str]:
+    """Run integrity and schema checks. Returns None if valid, otherwise the problem."""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                return f"quick_check failed: {result}"
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = REQUIRED_TABLES - tables
+            if missing:
+                return f"missing tables: {', '.join(sorted(missing))}"
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return f"unreadable database: {e}"
+    return None
+
+def online_copy(source_path: str, target_path: str, timeout: float = BACKUP_COPY_TIMEOUT) -> int:
+    """Copy a live database with the sqlite online-backup API. Returns total pages copied.
+
+    The copy runs as one step: a stepped copy restarts from the first page
+    whenever another connection writes, so on a busy bot it never finishes.
+    Attempts that find the source locked are retried until `timeout`, then
+    TimeoutError is raised and the target is left untouched.
+    """
+    total_pages = 0
+    deadline = time.monotonic() + timeout
+
+    def progress(status, remaining, total):
+        nonlocal total_pages
+        total_pages = total
+        if status != SQLITE_DONE and time.monotonic() > deadline:
+            raise TimeoutError(f"Online copy of {source_path} did not finish within {timeout} s")
+
+    # Short busy wait per attempt, so the deadline is checked between attempts
+    source = sqlite3.connect(source_path, timeout=BACKUP_BUSY_RETRY)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=-1, progress=progress, sleep=BACKUP_BUSY_RETRY)
+    finally:
+        target.close()
+        source.close()
+    return total_pages
+
+class BackupManager:
+    """Scheduled online backups with verification, rotation and restore."""
+
+    def __init__(self, bot, backup_dir: str = BACKUP_DIR):
+        self.bot = bot
+        self.backup_dir = backup_dir
+        self._lock = asyncio.Lock()
+        self.last_success: Optional[float] = None
+        self.last_report: dict = {}
+
+    def list_backups(self) -> List[str]:
+        """List backup file names, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = [n for n in os.listdir(self.backup_dir) if n.endswith('.db') or n.endswith('.db.gz')]
+        return sorted(names, reverse=True)
+
+    def _create_backup(self) -> dict:
+        """Copy, verify and rotate every database file (one, or one per shard). Runs in a worker thread."""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        started_at = time.perf_counter()
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        names, pages, size = [], 0, 0
+
+        for db_path in self.bot.database.paths:
+            name = f"{_database_stem(db_path)}-{timestamp}.db"
+            final_path = os.path.join(self.backup_dir, name)
+            tmp_path = f"{final_path}.tmp"
+
+            try:
+                pages += online_copy(db_path, tmp_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            problem = verify_database(tmp_path)
+            if problem:
+                os.remove(tmp_path)
+                raise RuntimeError(f"Backup verification of {name} failed: {problem}")
+            os.replace(tmp_path, final_path)
+            names.append(name)
+            size += os.path.getsize(final_path)
+
+        self._rotate()
+        return {
+            'name': names[0] if len(names) == 1 else f"{len(names)} shards at {timestamp}",
+            'pages': pages,
+            'size': size,
+            'duration_s': round(time.perf_counter() - started_at, 2)
+        }
+
+    def _rotate(self):
+        """Per database file, compress all but the newest backup and drop generations beyond the limit."""
+        by_stem = {}
+        for name in self.list_backups():
+            by_stem.setdefault(backup_stem(name), []).append(name)
+
+        for names in by_stem.values():
+            for name in names[1:]:
+                if not name.endswith('.db'):
+                    continue
+                path = os.path.join(self.backup_dir, name)
+                with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(path)
+
+            for name in names[BACKUP_GENERATIONS:]:
+                path = os.path.join(self.backup_dir, name)
+                os.remove(path if os.path.exists(path) else f"{path}.gz")
+
+    @traced('job.backup', root=True)
+    async def run(self) -> Optional[dict]:
+        """Take a backup without blocking the event loop."""
+        if self._lock.locked():
+            logging.info("Backup already running, skipping")
+            return None
+
+        async with self._lock:
+            try:
+                report = await asyncio.to_thread(self._create_backup)
+                self.last_success = time.time()
+                self.last_report = report
+                logging.info(
+                    f"Backup {report['name']} completed: {report['pages']} pages, "
+                    f"{report['size']} bytes in {report['duration_s']} s"
+                )
+                return report
+            except Exception as e:
+                logging.error(f"Error creating backup: {e}")
+                self.last_report = {'error': str(e)}
+                return None
+
+    @property
+    def lag_seconds(self) -> Optional[float]:
+        """Seconds since the last successful backup."""
+        return time.time() - self.last_success if self.last_success else None
+
+    def _restore(self, name: str):
+        """Validate a backup and copy it over the database file it was taken from. Runs in a worker thread."""
+        if os.path.basename(name) != name or name not in self.list_backups():
+            raise ValueError(f"Backup {name} not found")
+
+        stem = backup_stem(name)
+        if stem.startswith(PRE_RESTORE_PREFIX):
+            stem = stem[len(PRE_RESTORE_PREFIX):]
+        targets = [path for path in self.bot.database.paths if _database_stem(path) == stem]
+        if not targets:
+            raise ValueError(f"Backup {name} does not belong to a current database file")
+        db_path = targets[0]
+
+        path = os.path.join(self.backup_dir, name)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            candidate = os.path.join(tmp_dir, 'restore.db')
+            if name.endswith('.gz'):
+                with gzip.open(path, 'rb') as src, open(candidate, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfile(path, candidate)
+
+            problem = verify_database(candidate)
+            if problem:
+                raise ValueError(f"Backup {name} is invalid: {problem}")
+
+            # Keep the current state in case the restore needs undoing
+            os.makedirs(self.backup_dir, exist_ok=True)
+            safety_path = os.path.join(
+                self.backup_dir, f"{PRE_RESTORE_PREFIX}{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+            )
+            online_copy(db_path, safety_path)
+
+            # The backup API swaps pages in under a write lock, so open connections stay valid
+            online_copy(candidate, db_path)
+
+    async def restore(self, name: str):
+        """Restore a backup into the live database."""
+        async with self._lock:
+            await asyncio.to_thread(self._restore, name)
+        logging.info(f"Database restored from backup {name}")
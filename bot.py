@@ -2,33 +2,31 @@ import discord
 from discord.ext import commands
 import asyncio
 import logging
-import sqlite3
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-import pytz
+import time
+from typing import Optional
 
-from database import Database
+from sharding import open_database
 from permissions import PermissionManager
 from timeouts import TimeoutManager
-from leaderboard import Leaderboard
-from config import BOT_PREFIX, DATABASE_PATH, TIMEZONE
-
-# === Flask server to keep Render Web Service alive ===
-from flask import Flask
-import threading
-import os
-
-app = Flask(__name__)
-
-@app.route('/')
-def index():
-    return 'Bot is running!', 200
-
-def run_web_server():
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port)
-
-# =====================================================
+from ingestion import MessageIngestion
+from snapshot import StateSnapshot
+from perfstats import ResponseTimeTracker
+from timeline import TimelineStore
+from retention import RetentionManager
+from backup import BackupManager
+from reports import WeeklyReports
+from recovery import RecoveryManager
+from reconciler import PermissionReconciler
+from tickets import TicketService
+from admission import AdmissionController
+from dispatch import AutoDispatcher
+from reloader import HotReloader
+from tracing import tracer, traced, trace_http
+from startup import profiler
+from config import (
+    BOT_PREFIX, DATABASE_PATH, TIMEZONE, BACKUP_INTERVAL_HOURS, TRACE_FLUSH_SECONDS, FAST_BOOT,
+    RECONCILE_INTERVAL_MINUTES, PERF_FLUSH_SECONDS
+)
 
 class TicketBot(commands.Bot):
     def __init__(self):
@@ -43,28 +41,187 @@ class TicketBot(commands.Bot):
             help_command=None
         )
         
+        # Every REST call (sends, permission edits, rate-limit waits) becomes a span
+        trace_http(self.http)
+        
         # Initialize components - FIXED NAMES
-        self.database = Database(DATABASE_PATH)
+        # Fast boot runs the schema checks in a thread while logging in
+        self.database = open_database(DATABASE_PATH, initialize=not FAST_BOOT)
+        self._db_init_task: Optional[asyncio.Task] = None
+        if not FAST_BOOT:
+            profiler.mark('db_init')
         self.permissions = PermissionManager(self)  # Changed from permission_manager
         self.timeout_manager = TimeoutManager(self)
-        self.leaderboard = Leaderboard(self, self.database)
+        self._leaderboard = None  # Created on first use
+        self._leaderboard_state = None  # Snapshot section held until the leaderboard is created
+        self.ingestion = MessageIngestion(self)
+        self.perf_stats = ResponseTimeTracker()
+        self.timelines = TimelineStore()
+        self.retention = RetentionManager(self)
+        self.backups = BackupManager(self)
+        self.reports = WeeklyReports(self)
+        self.recovery = RecoveryManager(self)
+        self.reconciler = PermissionReconciler(self)
+        self.tickets = TicketService(self)
+        self.admission = AdmissionController(self)
+        self.dispatcher = AutoDispatcher(self)
+        self.reloader = HotReloader(self)
         
-        # Initialize scheduler
-        self.scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
+        # Shutdown checkpoint / warm restart
+        self.snapshot = StateSnapshot()
+        self._warm_timeout_states = None
+        self._register_snapshot_sections()
+        
+        # Startup timing
+        self.started_at = time.perf_counter()
+        self.startup_report = {}
+        
+        # Gateway session state reported by /ready
+        self.gateway_connected = False
+        
+        # Scheduler is created (and APScheduler imported) when jobs are set up
+        self.scheduler = None
+        self._deferred_started = False
+    
+    @property
+    def leaderboard(self):
+        """Leaderboard renderer, imported and created on first use."""
+        if self._leaderboard is None:
+            from leaderboard import Leaderboard
+            self._leaderboard = Leaderboard(self, self.database)
+            if self._leaderboard_state is not None:
+                self._leaderboard.import_state(self._leaderboard_state)
+                self._leaderboard_state = None
+        return self._leaderboard
+    
+    async def login(self, token: str):
+        """Log in, overlapping database initialization with the HTTP login in fast-boot mode."""
+        if FAST_BOOT and self._db_init_task is None:
+            self._db_init_task = asyncio.create_task(self._init_database())
+        await super().login(token)
+    
+    async def _init_database(self):
+        """Run schema setup and migrations in a worker thread."""
+        started = time.perf_counter()
+        await asyncio.to_thread(self.database.init_database)
+        profiler.record('db_init', time.perf_counter() - started)
         
     async def setup_hook(self):
         """Setup hook called when bot is starting."""
         try:
+            profiler.mark('login')
+            if self._db_init_task is not None:
+                await self._db_init_task
             # Load commands
             await self.load_extension('bot_commands')
-            # Setup scheduled tasks
-            self._setup_scheduler()
+            # Warm-load in-memory state from the last clean shutdown
+            await self._load_snapshot()
+            # Response-time history is stored in the database, so it survives cold starts
+            await self.perf_stats.load(self.database)
+            # Auto-dispatch opt-ins are checked on every ticket transition, so they are kept in memory
+            await self.dispatcher.load_enabled()
+            # Start message ingestion workers
+            self.ingestion.start()
+            if not FAST_BOOT:
+                self._start_deferred_services()
+            profiler.mark('setup')
             logging.info("Bot setup completed successfully")
         except Exception as e:
             logging.error(f"Error during bot setup: {e}")
     
+    def _start_deferred_services(self):
+        """Register persistent views and start scheduled jobs (deferred to first ready in fast boot)."""
+        if self._deferred_started:
+            return
+        self._deferred_started = True
+        # Keep leaderboard buttons working on messages sent before a restart
+        from leaderboard import LeaderboardView
+        self.add_view(LeaderboardView(self.leaderboard))
+        self.leaderboard.start_live_updates()
+        # Setup scheduled tasks
+        self._setup_scheduler()
+    
+    def _register_snapshot_sections(self):
+        """Register in-memory state that is checkpointed on shutdown."""
+        self.snapshot.register(
+            'active_timeouts',
+            self.database.get_active_timeout_states,
+            lambda states: setattr(self, '_warm_timeout_states', states),
+            lambda: setattr(self, '_warm_timeout_states', None)
+        )
+        self.snapshot.register(
+            'timeout_manager',
+            lambda: self.timeout_manager.export_state(),
+            lambda state: self.timeout_manager.import_state(state),
+            lambda: self.timeout_manager.test_timeouts.clear()
+        )
+        self.snapshot.register(
+            'leaderboard',
+            self._dump_leaderboard_state,
+            self._load_leaderboard_state,
+            self._clear_leaderboard_state
+        )
+        self.snapshot.register(
+            'perf_stats',
+            self.perf_stats.export_state,
+            self.perf_stats.import_state,
+            self.perf_stats.active.clear
+        )
+        self.snapshot.register(
+            'timelines',
+            self.timelines.export_state,
+            self.timelines.import_state,
+            self.timelines.active.clear
+        )
+        self.snapshot.register(
+            'dispatch',
+            self.dispatcher.export_state,
+            self.dispatcher.import_state,
+            self.dispatcher.clear_state
+        )
+    
+    def _dump_leaderboard_state(self):
+        """Export leaderboard state without creating the leaderboard; unused state is carried over."""
+        if self._leaderboard is not None:
+            return self._leaderboard.export_state()
+        return self._leaderboard_state or {}
+    
+    def _load_leaderboard_state(self, state):
+        """Hold leaderboard state until first use, so warm boots keep the leaderboard import deferred."""
+        if self._leaderboard is not None:
+            self._leaderboard.import_state(state)
+        else:
+            self._leaderboard_state = state
+    
+    def _clear_leaderboard_state(self):
+        """Drop held or loaded leaderboard state."""
+        self._leaderboard_state = None
+        if self._leaderboard is not None:
+            self._leaderboard.view_state.clear()
+    
+    async def _load_snapshot(self):
+        """Warm-load state from the shutdown snapshot, or fall back to a cold start."""
+        try:
+            fingerprint = await asyncio.to_thread(self.database.get_state_fingerprint)
+            reason = await asyncio.to_thread(self.snapshot.load, fingerprint)
+            if reason is None:
+                logging.info("Warm start: in-memory state loaded from shutdown snapshot")
+                return
+            logging.info(f"Cold start: {reason}")
+        except Exception as e:
+            logging.error(f"Error loading state snapshot: {e}")
+        
+        # Discard anything a partially loaded snapshot may have left behind
+        self.snapshot.clear()
+    
     def _setup_scheduler(self):
         """Setup scheduled tasks for leaderboard resets."""
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.cron import CronTrigger
+        from apscheduler.triggers.interval import IntervalTrigger
+        import pytz
+        
+        self.scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
         
         # Daily reset at 00:00 GMT+2
         self.scheduler.add_job(
@@ -80,9 +237,53 @@ class TicketBot(commands.Bot):
             id='weekly_reset'
         )
         
+        # Retention pass every night at 04:00 GMT+2, outside the reset window
+        self.scheduler.add_job(
+            self.retention.run,
+            CronTrigger(hour=4, minute=0, timezone=pytz.timezone(TIMEZONE)),
+            id='retention'
+        )
+        
+        # Online database backup
+        self.scheduler.add_job(
+            self.backups.run,
+            IntervalTrigger(hours=BACKUP_INTERVAL_HOURS, timezone=pytz.timezone(TIMEZONE)),
+            id='backup'
+        )
+        
+        # Export sampled traces
+        self.scheduler.add_job(
+            self._flush_traces,
+            IntervalTrigger(seconds=TRACE_FLUSH_SECONDS, timezone=pytz.timezone(TIMEZONE)),
+            id='trace_flush'
+        )
+        
+        # Store response-time sketches changed since the last flush
+        self.scheduler.add_job(
+            self._flush_perf_stats,
+            IntervalTrigger(seconds=PERF_FLUSH_SECONDS, timezone=pytz.timezone(TIMEZONE)),
+            id='perf_flush'
+        )
+        
+        # Re-apply claim overwrites that drifted
+        self.scheduler.add_job(
+            self.reconciler.run,
+            IntervalTrigger(minutes=RECONCILE_INTERVAL_MINUTES, timezone=pytz.timezone(TIMEZONE)),
+            id='permission_reconcile'
+        )
+        
         self.scheduler.start()
         logging.info("Scheduler started successfully")
     
+    async def _flush_traces(self):
+        """Append sampled traces to the JSONL export."""
+        await asyncio.to_thread(tracer.flush)
+    
+    async def _flush_perf_stats(self):
+        """Write changed response-time sketches to the database."""
+        await self.perf_stats.flush(self.database)
+    
+    @traced('job.daily_reset', root=True)
     async def _daily_reset(self):
         """Daily leaderboard reset task."""
         try:
@@ -96,44 +297,56 @@ class TicketBot(commands.Bot):
             logging.error(f"Error in daily reset: {e}")
     
     async def _send_daily_leaderboards(self):
-        """Send daily leaderboards to configured channels."""
+        """Bring every persistent leaderboard message up to date with the final daily standings."""
         try:
-            leaderboard_channels = self.database.get_all_leaderboard_channels()
-            
-            for guild_id, channel_id in leaderboard_channels:
-                channel = self.get_channel(channel_id)
-                if channel and isinstance(channel, discord.TextChannel):
-                    # FIXED NAME
-                    await self.leaderboard.send_leaderboard(channel, "daily")
-                    logging.info(f"Sent daily leaderboard to channel {channel_id}")
-                else:
-                    logging.warning(f"Leaderboard channel {channel_id} not found or invalid, cleaning up config")
-                    # Clean up invalid channel from database
-                    with sqlite3.connect(self.database.db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            UPDATE guild_config SET leaderboard_channel_id = NULL WHERE guild_id = ?
-                        ''', (guild_id,))
-                        conn.commit()
+            await self.leaderboard.update_leaderboard_channels()
         except Exception as e:
             logging.error(f"Error sending daily leaderboards: {e}")
     
+    @traced('job.weekly_reset', root=True)
     async def _weekly_reset(self):
         """Weekly leaderboard reset task."""
         try:
+            # Report on the week before its counters are wiped
+            try:
+                await self.reports.post_weekly_reports()
+            except Exception as e:
+                logging.error(f"Error posting weekly reports: {e}")
+            
             # FIXED NAME
             await self.leaderboard.reset_weekly_scores()
             logging.info("Weekly leaderboard reset completed")
         except Exception as e:
             logging.error(f"Error in weekly reset: {e}")
     
+    async def on_connect(self):
+        """Event fired when the gateway session is established."""
+        self.gateway_connected = True
+    
+    async def on_resumed(self):
+        """Event fired when a dropped gateway session is resumed."""
+        self.gateway_connected = True
+    
+    async def on_disconnect(self):
+        """Event fired when the gateway connection drops."""
+        self.gateway_connected = False
+    
     async def on_ready(self):
         """Event fired when bot is ready."""
         logging.info(f'{self.user} has connected to Discord!')
         logging.info(f'Bot is in {len(self.guilds)} guilds')
+        profiler.mark('ready')
         
         # Resume timeout monitoring for any active timeouts
         await self._resume_timeout_monitoring()
+        profiler.mark('resume')
+        
+        # Interactions only arrive once connected, so views and jobs can wait until now
+        self._start_deferred_services()
+        profiler.mark('deferred')
+        if not profiler.logged:
+            profiler.log_report()
+            self.startup_report['timings'] = profiler.report()
         
         # Set bot status
         await self.change_presence(
@@ -146,24 +359,67 @@ class TicketBot(commands.Bot):
     async def _resume_timeout_monitoring(self):
         """Resume timeout monitoring for active timeouts."""
         try:
-            active_timeouts = self.database.get_all_active_timeouts()
+            load_started = time.perf_counter()
+            if self._warm_timeout_states is not None:
+                # First ready after a warm start; snapshot was validated against the database
+                states, self._warm_timeout_states = self._warm_timeout_states, None
+            else:
+                states = await asyncio.to_thread(self.database.get_active_timeout_states)
+            load_ms = round((time.perf_counter() - load_started) * 1000, 1)
+            
+            report = await self.timeout_manager.resume_all(states)
+            self._track_resumed_claims(states)
+            self.dispatcher.rebuild_loads()
+            report['load_ms'] = load_ms
+            
+            if not self.startup_report:
+                # First ready after boot; later calls are reconnects
+                report['startup_to_ready_s'] = round(time.perf_counter() - self.started_at, 2)
+                self.startup_report = report
             
-            for timeout_info in active_timeouts:
-                channel_id = timeout_info[0]
-                
-                # Verify channel still exists
-                channel = self.get_channel(channel_id)
-                if channel:
-                    await self.timeout_manager.start_timeout_monitoring(channel_id)
-                    logging.info(f"Resumed timeout monitoring for channel {channel_id}")
-                else:
-                    # Clean up stale timeout data
-                    self.database.remove_timeout(channel_id)
-                    logging.info(f"Cleaned up stale timeout data for channel {channel_id}")
+            logging.info(
+                f"Resumed timeout monitoring: {report['total']} active, {report['started']} scheduled, "
+                f"{report['overdue']} overdue handled, {report['skipped']} already running, "
+                f"{report['stale']} stale removed (load {load_ms} ms, resume {report['duration_ms']} ms)"
+            )
+            if 'startup_to_ready_s' in report:
+                logging.info(f"Startup to ready: {report['startup_to_ready_s']} s")
         
         except Exception as e:
             logging.error(f"Error resuming timeout monitoring: {e}")
     
+    def _track_resumed_claims(self, states):
+        """Start response-time tracking and timelines for claims that were open before a restart."""
+        for channel_id, claimer_id, ticket_holder_id, claim_time, *_ in states:
+            if self.perf_stats.is_tracking(channel_id) and self.timelines.is_tracking(channel_id):
+                continue
+            channel = self.get_channel(channel_id)
+            if not channel or not getattr(channel, 'guild', None):
+                continue
+            if claim_time is None:
+                continue
+            if not self.perf_stats.is_tracking(channel_id):
+                self.perf_stats.track_claim(channel_id, channel.guild.id, claimer_id, ticket_holder_id, claim_time / 1000)
+            if not self.timelines.is_tracking(channel_id):
+                # Messages sent while offline are not recovered; the timeline starts empty
+                self.timelines.start(channel_id, claimer_id, ticket_holder_id, claim_time)
+    
+    async def reload_state_from_database(self):
+        """Drop in-memory state derived from the database and rebuild it (e.g. after a restore)."""
+        for channel_id in list(self.timeout_manager.timeout_tasks.keys()):
+            await self.timeout_manager.stop_timeout_monitoring(channel_id)
+        self.timeout_manager.deadlines.clear()
+        self.perf_stats.active.clear()
+        self.timelines.active.clear()
+        # Re-runs migrations and, when sharded, reloads the channel directory
+        await asyncio.to_thread(self.database.init_database)
+        self.database._bump_score_version()
+        await self.dispatcher.load_enabled()
+        if self._leaderboard is not None:
+            self._leaderboard.render_cache.clear()
+            self._leaderboard.cursors.clear()
+        await self._resume_timeout_monitoring()
+    
     async def on_guild_join(self, guild):
         """Event fired when bot joins a guild."""
         logging.info(f"Joined guild: {guild.name} (ID: {guild.id})")
@@ -171,6 +427,16 @@ class TicketBot(commands.Bot):
     async def on_guild_remove(self, guild):
         """Event fired when bot leaves a guild."""
         logging.info(f"Left guild: {guild.name} (ID: {guild.id})")
+        await self.retention.purge_guild(guild.id)
+    
+    async def on_guild_channel_create(self, channel):
+        """Event fired when a channel is created."""
+        await self.dispatcher.on_channel_create(channel)
+    
+    async def on_guild_channel_delete(self, channel):
+        """Event fired when a channel is deleted."""
+        self.dispatcher.forget(channel.id)
+        await self.retention.purge_channel(channel.id)
     
     async def on_message(self, message):
         """Event fired when a message is sent."""
@@ -178,18 +444,48 @@ class TicketBot(commands.Bot):
         if message.author.bot:
             return
         
-        # Update last message time for timeout tracking
-        if message.channel.id:
-            self.database.update_last_message(message.channel.id, message.author.id)
+        # Queue activity update for timeout tracking; applied in batches by ingestion workers
+        self.ingestion.submit(message)
+        # First message in a new ticket channel names its holder for auto-dispatch
+        self.dispatcher.on_message(message)
         
         # Process commands
         await self.process_commands(message)
     
+    async def invoke(self, ctx):
+        """Invoke a command inside a root trace span."""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        
+        # Shed over-limit commands before any parsing, checks or database work
+        decision = self.admission.check(ctx.command.qualified_name, ctx.guild.id if ctx.guild else None, ctx.author.id)
+        if not decision.admitted:
+            if decision.notify:
+                try:
+                    await ctx.send(
+                        f"⏳ Too many commands right now - try again in {max(1, round(decision.retry_after))}s.",
+                        delete_after=10
+                    )
+                except discord.HTTPException:
+                    pass
+            return
+        
+        with tracer.span(
+            f"command.{ctx.command.qualified_name}", root=True,
+            guild=ctx.guild.id if ctx.guild else None, channel=ctx.channel.id, user=ctx.author.id
+        ) as span:
+            await super().invoke(ctx)
+            if span is not None and ctx.command_failed:
+                span.error = "command failed"
+    
     async def on_command_error(self, ctx, error):
         """Global error handler for commands."""
         if isinstance(error, commands.CommandNotFound):
             return  # Ignore unknown commands
         
+        elif isinstance(error, commands.NotOwner):
+            await ctx.send("❌ Only the bot owner can use this command.")
+        
         elif isinstance(error, commands.MissingPermissions):
             await ctx.send("❌ You don't have permission to use this command.")
         
@@ -206,10 +502,23 @@ class TicketBot(commands.Bot):
     async def close(self):
         """Clean shutdown of the bot."""
         try:
+            # Drain pending activity writes
+            await self.ingestion.stop()
+            await self._flush_perf_stats()
+            
+            # Checkpoint in-memory state while timers are still registered
+            fingerprint = await asyncio.to_thread(self.database.get_state_fingerprint)
+            await asyncio.to_thread(self.snapshot.save, fingerprint)
+            
             # Stop scheduler
-            if hasattr(self, 'scheduler') and self.scheduler.running:
+            if self.scheduler is not None and self.scheduler.running:
                 self.scheduler.shutdown()
             
+            await asyncio.to_thread(tracer.flush)
+            self.reports.shutdown()
+            if self._leaderboard is not None:
+                self._leaderboard.stop_live_updates()
+            
             # Cancel all timeout tasks
             for channel_id in list(self.timeout_manager.timeout_tasks.keys()):
                 await self.timeout_manager.stop_timeout_monitoring(channel_id)
@@ -224,15 +533,6 @@ class TicketBot(commands.Bot):
 
 # === Main runner ===
 if __name__ == "__main__":
-    # Start web server in background thread
-    threading.Thread(target=run_web_server).start()
-    
-    # Get Discord token
-    token = os.environ.get("DISCORD_TOKEN")
-    if not token:
-        print("ERROR: DISCORD_TOKEN environment variable not set!")
-        exit(1)
-    
-    # Start the Discord bot
-    bot = TicketBot()
-    bot.run(token)
+    # main.py owns startup, including the status server
+    from main import main
+    main()
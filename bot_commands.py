@@ -3,6 +3,16 @@ from discord.ext import commands
 import logging
 from datetime import datetime, timedelta
 import asyncio
+import io
+import os
+import tempfile
+
+from export import EXPORT_TABLES, EXPORT_FORMATS, export_table, parse_date
+from perfstats import METRICS, format_duration
+from tickets import InvalidTransition, TRANSITIONS
+from tracing import tracer
+from config import REPORT_DAYS
+from recovery import FAILED, parse_filters, format_result
 
 class BotCommands(commands.Cog):
     def __init__(self, bot):
@@ -23,7 +33,8 @@ class BotCommands(commands.Cog):
             "?reclaim @user - Reclaim a timed-out ticket\n"
             "?unclaim - Unclaim your ticket\n"
             "?officer - Invite officers to help\n"
-            "?ticketholder @user - Set ticket holder"
+            "?ticketholder @user - Set ticket holder\n"
+            "?duty [on/off] - Join or leave automatic ticket assignment"
         )
         embed.add_field(
             name="🎫 Ticket Commands",
@@ -36,7 +47,10 @@ class BotCommands(commands.Cog):
             "?lb daily - Show daily leaderboard\n"
             "?lb weekly - Show weekly leaderboard\n"
             "?lb total - Show all-time leaderboard\n"
-            "?lb [period] [page] - Show specific page (10 per page)"
+            "?lb [period] [page] - Show specific page (10 per page)\n"
+            "?lb global [period] [page] - Show the combined leaderboard of this server's group\n"
+            "?perfstats [@staff] - Show response-time percentiles\n"
+            "Use the buttons under a leaderboard to change page or period"
         )
         embed.add_field(
             name="🏆 Leaderboard Commands",
@@ -50,7 +64,18 @@ class BotCommands(commands.Cog):
             "?officerrole @role - Set officer role\n"
             "?category #category - Set allowed category\n"
             "?leaderboardchannel #channel - Set leaderboard channel\n"
-            "?test <channel_id> - Test timeout (admins only)"
+            "?test <channel_id> - Test timeout (admins only)\n"
+            "?ingeststats - Show message queue stats (admins only)\n"
+            "?drift [now] - Show permission drift counters or run a check (admins only)\n"
+            "?admission - Show command admission and shedding counters (admins only)\n"
+            "?autodispatch [on/off] - Show or toggle automatic ticket assignment (admins only)\n"
+            "?export [table] [format] [since] [until] - Export data (admins only)\n"
+            "?trace last [count] - Show the slowest recent traces (admins only)\n"
+            "?weeklyreport [days] - Post a staff performance report (admins only)\n"
+            "?recover [category=<id>] [claimer=@user] [older=<minutes>] [dry] - Bulk-unclaim stuck tickets (admins only)\n"
+            "?lbgroup [name/none] - Show or set this server's leaderboard group (owner only)\n"
+            "?backup [now/status/list] / ?restore <name> - Backups (owner only)\n"
+            "?reload - Reload commands and managers without reconnecting (owner only)"
         )
         embed.add_field(
             name="⚙️ Admin Commands",
@@ -113,10 +138,10 @@ class BotCommands(commands.Cog):
                 await ctx.send("❌ Staff role not found.")
                 return
 
-            # Set ticket holder
+            # Resolve ticket holder
+            set_holder = True
             if user:
                 ticket_holder = user
-                self.bot.database.set_ticket_holder(ctx.channel.id, user.id, ctx.author.id)
             else:
                 # Get existing ticket holder or use command author
                 holder_id = self.bot.database.get_ticket_holder(ctx.channel.id)
@@ -125,22 +150,17 @@ class BotCommands(commands.Cog):
                     if not ticket_holder:
                         await ctx.send("❌ Previous ticket holder not found. Please specify a user.")
                         return
+                    set_holder = False
                 else:
                     ticket_holder = ctx.author
-                    self.bot.database.set_ticket_holder(ctx.channel.id, ctx.author.id, ctx.author.id)
-
-            # Create claim record
-            self.bot.database.create_claim(ctx.guild.id, ctx.channel.id, ctx.author.id)
-
-            # Restrict permissions
-            original_permissions = await self.bot.permissions.restrict_channel_permissions(
-                ctx.channel, ticket_holder, ctx.author, staff_role
-            )
 
-            # Save timeout info
-            self.bot.database.save_timeout(
-                ctx.channel.id, ctx.author.id, ticket_holder.id, original_permissions
-            )
+            # Restrict permissions and record holder, claim and timeout in one locked transition
+            try:
+                await self.bot.tickets.claim(ctx.channel, ctx.author, ticket_holder, staff_role, set_holder)
+            except InvalidTransition:
+                # Someone else won the race for this ticket
+                await ctx.send("❌ This ticket is already claimed. Use `?unclaim` to release it first.")
+                return
 
             # Send confirmation
             embed = discord.Embed(
@@ -178,14 +198,12 @@ class BotCommands(commands.Cog):
                 await ctx.send("❌ You can only unclaim tickets you have claimed.")
                 return
 
-            # Restore permissions
-            await self.bot.permissions.restore_channel_permissions(ctx.channel, original_permissions)
-
-            # FIXED: Complete the claim with proper officer_used parameter (no points awarded here)
-            self.bot.database.complete_claim(ctx.channel.id, timeout_occurred=False, officer_used=officer_used)
-
-            # Remove timeout info
-            self.bot.database.remove_timeout(ctx.channel.id)
+            # Restore permissions and complete the claim in one locked transition (no points awarded here)
+            try:
+                await self.bot.tickets.complete(ctx.channel, 'unclaim', expected_claimer=claimer_id)
+            except InvalidTransition:
+                await ctx.send("❌ This ticket's claim changed while unclaiming. Please check and try again.")
+                return
 
             # Send confirmation
             embed = discord.Embed(
@@ -217,20 +235,18 @@ class BotCommands(commands.Cog):
                 await ctx.send("❌ You don't have permission to use this command.")
                 return
 
-            # Get timeout info to check if there was a timeout
-            timeout_info = self.bot.database.get_timeout_info(ctx.channel.id)
-            if not timeout_info:
+            # Only timed-out (or currently claimed) tickets can be reclaimed
+            state = await self.bot.tickets.get_state(ctx.channel.id)
+            if state not in TRANSITIONS['reclaim'][0]:
                 await ctx.send("❌ No timeout found for this channel.")
                 return
 
-            claimer_id, ticket_holder_id, claim_time, last_staff_msg, last_holder_msg, original_permissions, officer_used = timeout_info
-
             # Get ticket holder
             if user:
                 ticket_holder = user
-                self.bot.database.set_ticket_holder(ctx.channel.id, user.id, ctx.author.id)
             else:
-                ticket_holder = ctx.guild.get_member(ticket_holder_id)
+                ticket_holder_id = self.bot.database.get_ticket_holder(ctx.channel.id)
+                ticket_holder = ctx.guild.get_member(ticket_holder_id) if ticket_holder_id else None
                 if not ticket_holder:
                     await ctx.send("❌ Original ticket holder not found. Please specify a user.")
                     return
@@ -241,18 +257,14 @@ class BotCommands(commands.Cog):
                 await ctx.send("❌ Staff role not found.")
                 return
 
-            # Create new claim record
-            self.bot.database.create_claim(ctx.guild.id, ctx.channel.id, ctx.author.id)
-
-            # Restrict permissions again
-            new_original_permissions = await self.bot.permissions.restrict_channel_permissions(
-                ctx.channel, ticket_holder, ctx.author, staff_role
-            )
-
-            # Update timeout info
-            self.bot.database.save_timeout(
-                ctx.channel.id, ctx.author.id, ticket_holder.id, new_original_permissions
-            )
+            # Restrict permissions again and record the new claim in one locked transition
+            try:
+                await self.bot.tickets.claim(
+                    ctx.channel, ctx.author, ticket_holder, staff_role, set_holder=user is not None, action='reclaim'
+                )
+            except InvalidTransition:
+                await ctx.send("❌ This ticket can no longer be reclaimed.")
+                return
 
             # Send confirmation
             embed = discord.Embed(
@@ -285,6 +297,7 @@ class BotCommands(commands.Cog):
                 return
 
             # Set ticket holder
+            self.bot.database.register_channel(ctx.channel.id, ctx.guild.id)
             self.bot.database.set_ticket_holder(ctx.channel.id, user.id, ctx.author.id)
 
             embed = discord.Embed(
@@ -322,14 +335,19 @@ class BotCommands(commands.Cog):
                 await ctx.send("❌ Officer role not found.")
                 return
 
-            # Add officer permissions
-            await self.bot.permissions.add_officer_permissions(ctx.channel, officer_role)
+            async with self.bot.tickets.locks.hold(ctx.channel.id):
+                # Add officer permissions
+                await self.bot.permissions.add_officer_permissions(ctx.channel, officer_role)
 
-            # Mark officer as used
-            self.bot.database.mark_officer_used(ctx.channel.id)
-            
-            # NEW: Analyze conversation and award points based on responsiveness
-            points_awarded = self.bot.database.analyze_conversation_and_award_points(ctx.channel.id)
+                # Mark officer as used
+                await asyncio.to_thread(self.bot.database.mark_officer_used, ctx.channel.id)
+                
+                # NEW: Analyze conversation and award points based on responsiveness
+                timeline = self.bot.timelines.get(ctx.channel.id)
+                points_awarded = await asyncio.to_thread(
+                    self.bot.database.analyze_conversation_and_award_points, ctx.channel.id,
+                    timeline.summarize() if timeline is not None else None
+                )
 
             # Send response
             embed = discord.Embed(
@@ -433,21 +451,55 @@ class BotCommands(commands.Cog):
         await ctx.send(embed=embed)
         logging.info(f"Leaderboard channel set to {channel.id} for guild {ctx.guild.id}")
 
+        # Post the persistent message that is edited from now on
+        await self.bot.leaderboard.update_leaderboard_channels(ctx.guild.id)
+
     @commands.command(name='lb', aliases=['leaderboard'])
-    async def show_leaderboard(self, ctx, period: str = "total", page: int = 1):
-        """Show leaderboard. Usage: ?lb [daily/weekly/total] [page]"""
+    async def show_leaderboard(self, ctx, *args: str):
+        """Show leaderboard. Usage: ?lb [global] [daily/weekly/total] [page]"""
         valid_periods = ["daily", "weekly", "total"]
-        
+        args = list(args)
+        show_global = bool(args) and args[0].lower() == "global"
+        if show_global:
+            args.pop(0)
+
+        period = args[0] if args else "total"
+        page = args[1] if len(args) > 1 else "1"
         if period not in valid_periods:
             # If first argument is a number, treat it as page for total leaderboard
-            try:
-                page = int(period)
-                period = "total"
-            except ValueError:
-                await ctx.send(f"❌ Invalid period. Use: {', '.join(valid_periods)}")
+            period, page = "total", period
+        try:
+            page = int(page)
+        except ValueError:
+            await ctx.send(f"❌ Invalid period. Use: {', '.join(valid_periods)}")
+            return
+
+        if show_global:
+            await self.bot.leaderboard.send_global_leaderboard(ctx.channel, period, page)
+        else:
+            await self.bot.leaderboard.send_leaderboard(ctx.channel, period, page)
+
+    @commands.command(name='lbgroup')
+    @commands.is_owner()
+    async def set_leaderboard_group(self, ctx, group: str = None):
+        """Show or set this server's leaderboard group (owner only). Usage: ?lbgroup [name/none]"""
+        leaderboard = self.bot.leaderboard
+        if group is None:
+            current = await asyncio.to_thread(self.bot.database.get_guild_group, ctx.guild.id)
+            if current is None:
+                await ctx.send("This server isn't part of a leaderboard group.")
                 return
+            members = await leaderboard.get_group_guilds(current)
+            await ctx.send(f"🌐 This server is in group **{current}** with {len(members)} server(s).")
+            return
 
-        await self.bot.leaderboard.send_leaderboard(ctx.channel, period, page)
+        if group.lower() == "none":
+            await leaderboard.set_guild_group(ctx.guild.id, None)
+            await ctx.send("✅ Removed this server from its leaderboard group.")
+        else:
+            await leaderboard.set_guild_group(ctx.guild.id, group)
+            await ctx.send(f"✅ This server now shares the global leaderboard of group **{group}**.")
+        logging.info(f"Leaderboard group for guild {ctx.guild.id} set to {group} by {ctx.author.id}")
 
     @commands.command(name='stats')
     async def show_user_stats(self, ctx, user: discord.Member = None):
@@ -457,6 +509,37 @@ class BotCommands(commands.Cog):
         
         await self.bot.leaderboard.send_user_stats(ctx.channel, user)
 
+    @commands.command(name='perfstats')
+    async def show_perf_stats(self, ctx, user: discord.Member = None):
+        """Show response-time percentiles for a staff member, or the guild rollup."""
+        if user:
+            sketches = self.bot.perf_stats.get_staff_sketches(ctx.guild.id, user.id)
+            title = f"⏱️ Response Times for @{user.display_name}"
+        else:
+            sketches = self.bot.perf_stats.get_guild_sketches(ctx.guild.id)
+            title = f"⏱️ Response Times for {ctx.guild.name}"
+
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+
+        if not sketches:
+            embed.description = "No response-time data recorded yet."
+        for metric, label in METRICS.items():
+            sketch = sketches.get(metric)
+            if not sketch:
+                continue
+            embed.add_field(
+                name=label,
+                value=(
+                    f"p50 **{format_duration(sketch.quantile(0.5))}** • "
+                    f"p90 **{format_duration(sketch.quantile(0.9))}** • "
+                    f"p99 **{format_duration(sketch.quantile(0.99))}**\n"
+                    f"{sketch.count} samples, max {format_duration(sketch.max)}"
+                ),
+                inline=False
+            )
+
+        await ctx.send(embed=embed)
+
     @commands.command(name='resetdaily')
     @commands.has_permissions(administrator=True)
     async def reset_daily_leaderboard(self, ctx):
@@ -485,6 +568,210 @@ class BotCommands(commands.Cog):
         await ctx.send(embed=embed)
         logging.info(f"Weekly leaderboard reset by {ctx.author.id}")
 
+    @commands.command(name='export')
+    @commands.has_permissions(administrator=True)
+    async def export_data(self, ctx, table: str = "claims", fmt: str = "csv", since: str = None, until: str = None):
+        """Export this guild's data as a compressed file. Usage: ?export [claims/leaderboard/rollup] [csv/jsonl] [since] [until]"""
+        if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+            await ctx.send(f"❌ Usage: `?export [{'/'.join(EXPORT_TABLES)}] [{'/'.join(EXPORT_FORMATS)}] [YYYY-MM-DD] [YYYY-MM-DD]`")
+            return
+
+        try:
+            parse_date(since)
+            parse_date(until)
+        except ValueError:
+            await ctx.send("❌ Dates must use the format YYYY-MM-DD.")
+            return
+
+        filename = f"{table}-{ctx.guild.id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}.gz"
+        out_path = os.path.join(tempfile.gettempdir(), filename)
+
+        try:
+            rows = await asyncio.to_thread(
+                export_table, self.bot.database.path_for_guild(ctx.guild.id), table, out_path, fmt, ctx.guild.id, since, until
+            )
+
+            if os.path.getsize(out_path) > ctx.guild.filesize_limit:
+                await ctx.send(f"❌ Export of {rows} rows is too large to upload. Use a narrower date range or the CLI.")
+                return
+
+            await ctx.send(f"📦 Exported {rows} rows from **{table}**.", file=discord.File(out_path, filename=filename))
+            logging.info(f"Export of {table} ({rows} rows) sent by {ctx.author.id} in guild {ctx.guild.id}")
+
+        except Exception as e:
+            logging.error(f"Error in export command: {e}")
+            await ctx.send("❌ An error occurred while exporting data.")
+        finally:
+            try:
+                os.remove(out_path)
+            except OSError:
+                pass
+
+    @commands.command(name='backup')
+    @commands.is_owner()
+    async def backup_command(self, ctx, action: str = "status"):
+        """Manage database backups (owner only). Usage: ?backup [now/status/list]"""
+        backups = self.bot.backups
+
+        if action == "now":
+            await ctx.send("💾 Starting backup...")
+            report = await backups.run()
+            if report:
+                await ctx.send(
+                    f"✅ Backup **{report['name']}** completed: {report['pages']} pages, "
+                    f"{report['size'] // 1024} KiB in {report['duration_s']} s."
+                )
+            else:
+                await ctx.send(f"❌ Backup failed: {backups.last_report.get('error', 'already running')}")
+
+        elif action == "list":
+            names = backups.list_backups()
+            if not names:
+                await ctx.send("No backups found.")
+                return
+            await ctx.send("💾 **Backups (newest first):**\n" + "\n".join(f"`{name}`" for name in names))
+
+        else:
+            embed = discord.Embed(title="💾 Backup Status", color=discord.Color.blue())
+            lag = backups.lag_seconds
+            embed.add_field(name="Last Backup", value=backups.last_report.get('name', 'None this session'), inline=False)
+            embed.add_field(name="Lag", value=f"{int(lag // 60)} minutes" if lag is not None else "-", inline=True)
+            embed.add_field(name="Duration", value=f"{backups.last_report.get('duration_s', '-')} s", inline=True)
+            embed.add_field(name="Generations", value=str(len(backups.list_backups())), inline=True)
+            if 'error' in backups.last_report:
+                embed.add_field(name="Last Error", value=backups.last_report['error'], inline=False)
+            await ctx.send(embed=embed)
+
+    @commands.command(name='weeklyreport')
+    @commands.has_permissions(administrator=True)
+    async def weekly_report(self, ctx, days: int = REPORT_DAYS):
+        """Post a staff performance report for the last days (admins only). Usage: ?weeklyreport [days]"""
+        try:
+            async with ctx.typing():
+                await self.bot.reports.send_report(ctx.channel, max(1, days))
+        except Exception as e:
+            logging.error(f"Error in weekly report command: {e}")
+            await ctx.send("❌ An error occurred while building the report.")
+
+    @commands.command(name='recover')
+    @commands.has_permissions(administrator=True)
+    async def recover_tickets(self, ctx, *filters: str):
+        """Complete stuck claims in bulk and restore their permissions (admins only).
+        Usage: ?recover [category=<id>] [claimer=@user] [older=<minutes>] [concurrency=<n>] [dry]"""
+        try:
+            options = parse_filters(list(filters))
+        except ValueError as e:
+            await ctx.send(f"❌ {e}. Usage: `?recover [category=<id>] [claimer=@user] [older=<minutes>] [concurrency=<n>] [dry]`")
+            return
+
+        status_message = await ctx.send("🔧 Selecting claims...")
+
+        async def show_progress(done: int, total: int):
+            await status_message.edit(content=f"🔧 Recovering tickets: {done}/{total}")
+
+        try:
+            report = await self.bot.recovery.recover(ctx.guild.id, progress=show_progress, **options)
+        except RuntimeError as e:
+            await status_message.edit(content=f"❌ {e}.")
+            return
+        except Exception as e:
+            logging.error(f"Error in recover command: {e}")
+            await status_message.edit(content="❌ An error occurred while recovering tickets.")
+            return
+
+        if not report['selected']:
+            await status_message.edit(content="No active claims match those filters.")
+            return
+
+        counts = " • ".join(f"{status}: {count}" for status, count in sorted(report['counts'].items()))
+        embed = discord.Embed(
+            title="🔧 Ticket Recovery" + (" (dry run)" if report['dry_run'] else ""),
+            description=f"{report['selected']} claims selected • {counts} • {report['duration_s']} s",
+            color=discord.Color.red() if report['counts'].get(FAILED) else discord.Color.green()
+        )
+        lines = [format_result(result) for result in report['results']]
+        shown, length = [], 0
+        for line in lines:
+            if length + len(line) + 1 > 1024:
+                break
+            shown.append(line)
+            length += len(line) + 1
+        embed.add_field(name="Channels", value="\n".join(shown), inline=False)
+
+        await status_message.edit(content=f"🔧 Recovery finished: {report['selected']}/{report['selected']}")
+        if len(shown) < len(lines):
+            embed.set_footer(text=f"{len(lines) - len(shown)} more channels in the attached file")
+            summary = "\n".join(
+                f"{r['channel_id']}\t{r['claimer_id']}\t{r['status']}\t{r['detail'] or ''}" for r in report['results']
+            )
+            file = discord.File(io.BytesIO(summary.encode('utf-8')), filename=f"recovery_{ctx.guild.id}.tsv")
+            await ctx.send(embed=embed, file=file)
+        else:
+            await ctx.send(embed=embed)
+        logging.info(f"Recovery run by {ctx.author.id} in guild {ctx.guild.id}: {report['counts']}")
+
+    @commands.command(name='trace')
+    @commands.has_permissions(administrator=True)
+    async def show_traces(self, ctx, action: str = "last", count: int = 5):
+        """Show the slowest recent traces (admin only). Usage: ?trace last [count]"""
+        if action != "last":
+            await ctx.send("❌ Usage: `?trace last [count]`")
+            return
+
+        traces = tracer.slowest(max(1, min(count, 10)))
+        if not traces:
+            await ctx.send(f"No traces recorded yet (sampling {tracer.sample_rate:.0%} of operations).")
+            return
+
+        embed = discord.Embed(title="🔍 Slowest Recent Traces", color=discord.Color.blue())
+        for trace in traces:
+            # Largest child spans show where the time went
+            children = sorted(
+                (s for s in trace['spans'] if s['parent_id'] is not None),
+                key=lambda s: s['duration_ms'], reverse=True
+            )[:4]
+            lines = [f"`{s['name']}` {s['duration_ms']:.0f} ms" + (" ⚠️" if s['error'] else "") for s in children]
+            started = datetime.fromtimestamp(trace['start_ms'] / 1000).strftime('%H:%M:%S')
+            embed.add_field(
+                name=f"{trace['name']} — {trace['duration_ms']:.0f} ms ({started})" + (" ❌" if trace['error'] else ""),
+                value="\n".join(lines) or "No child spans",
+                inline=False
+            )
+        counters = tracer.counters
+        embed.set_footer(text=f"{counters['sampled']}/{counters['started']} operations sampled, {len(tracer.traces)} in buffer")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='restore')
+    @commands.is_owner()
+    async def restore_backup(self, ctx, name: str):
+        """Validate a backup and restore it into the live database (owner only)."""
+        await ctx.send(f"♻️ Validating and restoring **{name}**...")
+        try:
+            await self.bot.backups.restore(name)
+            await self.bot.reload_state_from_database()
+            await ctx.send(f"✅ Database restored from **{name}**. A pre-restore backup was saved.")
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+        except Exception as e:
+            logging.error(f"Error restoring backup {name}: {e}")
+            await ctx.send("❌ An error occurred while restoring the backup.")
+
+    @commands.command(name='reload')
+    @commands.is_owner()
+    async def reload_code(self, ctx):
+        """Reload commands, config and the permission, timeout and leaderboard managers in place (owner only)."""
+        await ctx.send("🔄 Reloading...")
+        try:
+            report = await self.bot.reloader.reload()
+        except Exception as e:
+            logging.error(f"Hot reload failed: {e}")
+            await ctx.send(f"❌ Reload failed, still running the previous code: {e}")
+            return
+        await ctx.send(
+            f"✅ Reloaded {', '.join(report['modules'])} in {report['duration_ms']} ms "
+            f"({report['timeouts_moved']} timers moved, {report['timeouts_kept']} left to finish)"
+        )
+
     @commands.command(name='timeout')
     @commands.has_permissions(administrator=True)
     async def manual_timeout(self, ctx, user: discord.Member):
@@ -528,14 +815,147 @@ class BotCommands(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ Timeout test failed: {str(e)}")
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Track messages for timeout system."""
-        if message.author.bot:
+    @commands.command(name='ingeststats')
+    @commands.has_permissions(administrator=True)
+    async def show_ingest_stats(self, ctx):
+        """Show message ingestion queue depth and counters (admin only)."""
+        stats = self.bot.ingestion.stats()
+
+        embed = discord.Embed(
+            title="📥 Message Ingestion",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Queue Depth", value=f"{stats['depth']}/{stats['capacity']}", inline=True)
+        embed.add_field(name="Workers", value=str(stats['workers']), inline=True)
+        embed.add_field(name="Batches", value=str(stats['batches']), inline=True)
+        embed.add_field(name="Processed", value=str(stats['processed']), inline=True)
+        embed.add_field(name="Coalesced", value=str(stats['coalesced']), inline=True)
+        embed.add_field(name="Dropped", value=str(stats['dropped']), inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='drift')
+    @commands.has_permissions(administrator=True)
+    async def show_drift(self, ctx, action: str = "stats"):
+        """Show permission drift counters, or run a reconcile pass now (admin only). Usage: ?drift [now]"""
+        reconciler = self.bot.reconciler
+        if action == "now":
+            await ctx.send("🔍 Checking claimed channels for permission drift...")
+            await reconciler.run()
+
+        stats = reconciler.stats()
+        last = stats['last_pass']
+        embed = discord.Embed(title="🔐 Permission Drift", color=discord.Color.blue())
+        embed.add_field(name="Passes", value=str(stats['passes']), inline=True)
+        embed.add_field(name="Checked", value=str(stats['checked']), inline=True)
+        embed.add_field(name="Drifted", value=str(stats['drifted']), inline=True)
+        embed.add_field(name="Corrected", value=str(stats['corrected']), inline=True)
+        embed.add_field(name="Failed", value=str(stats['failed']), inline=True)
+        embed.add_field(name="Deferred", value=str(stats['deferred']), inline=True)
+        embed.add_field(
+            name="By Overwrite",
+            value=f"Staff role: {stats['by_kind']['staff_role']} • Claimer: {stats['by_kind']['claimer']}",
+            inline=False
+        )
+        if last:
+            embed.set_footer(
+                text=f"Last pass: {last['checked']} checked, {last['drifted']} drifted, "
+                     f"{last['corrected']} corrected in {last['duration_s']} s"
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='admission')
+    @commands.has_permissions(administrator=True)
+    async def show_admission(self, ctx):
+        """Show command admission counters and the most-shed commands and servers (admin only)."""
+        stats = self.bot.admission.stats()
+
+        embed = discord.Embed(title="🚦 Command Admission", color=discord.Color.blue())
+        embed.add_field(name="Admitted", value=str(stats['admitted']), inline=True)
+        embed.add_field(name="Ticket Priority", value=str(stats['priority']), inline=True)
+        embed.add_field(name="Shed", value=str(stats['shed']), inline=True)
+        by_reason = stats['by_reason']
+        embed.add_field(
+            name="Shed By Limit",
+            value=f"User: {by_reason.get('user', 0)} • Server: {by_reason.get('guild', 0)} • Global: {by_reason.get('global', 0)}",
+            inline=False
+        )
+        if stats['top_commands']:
+            embed.add_field(
+                name="Most Shed Commands",
+                value="\n".join(f"?{command}: {count}" for command, count in stats['top_commands']),
+                inline=True
+            )
+        if stats['top_guilds']:
+            embed.add_field(
+                name="Most Shed Servers",
+                value="\n".join(f"{guild_id}: {count}" for guild_id, count in stats['top_guilds']),
+                inline=True
+            )
+        embed.set_footer(
+            text=f"Global bucket: {stats['global_tokens']} tokens • "
+                 f"{stats['tracked_users']} users / {stats['tracked_guilds']} servers tracked"
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='duty')
+    async def toggle_duty(self, ctx, state: str = None):
+        """Join or leave automatic ticket assignment, or show who is on duty. Usage: ?duty [on/off]"""
+        staff_role_id = (await asyncio.to_thread(self.bot.database.get_guild_config, ctx.guild.id))[0]
+        if not staff_role_id or not self.bot.permissions.has_staff_role(ctx.author, staff_role_id):
+            await ctx.send("❌ You don't have permission to use this command.")
             return
-        
-        # Update last message time for timeout tracking
-        self.bot.database.update_last_message(message.channel.id, message.author.id)
+
+        dispatcher = self.bot.dispatcher
+        if state is None:
+            on_duty = dispatcher.stats(ctx.guild.id)['on_duty']
+            if not on_duty:
+                await ctx.send("Nobody is on duty for automatic assignment.")
+                return
+            lines = "\n".join(f"<@{user_id}>: {load} open" for user_id, load in on_duty)
+            await ctx.send(embed=discord.Embed(title="🟢 On Duty", description=lines, color=discord.Color.green()))
+            return
+
+        if state.lower() not in ("on", "off"):
+            await ctx.send("❌ Usage: ?duty [on/off]")
+            return
+        dispatcher.set_on_duty(ctx.guild.id, ctx.author.id, state.lower() == "on")
+        if state.lower() == "on":
+            await ctx.send("🟢 You're on duty: new and timed-out tickets may be assigned to you.")
+        else:
+            await ctx.send("⚪ You're off duty and won't be assigned tickets automatically.")
+        logging.info(f"Staff {ctx.author.id} set duty {state.lower()} in guild {ctx.guild.id}")
+
+    @commands.command(name='autodispatch')
+    @commands.has_permissions(administrator=True)
+    async def auto_dispatch(self, ctx, state: str = None):
+        """Show automatic assignment stats, or turn it on or off for this server (admin only). Usage: ?autodispatch [on/off]"""
+        if state is not None:
+            if state.lower() not in ("on", "off"):
+                await ctx.send("❌ Usage: ?autodispatch [on/off]")
+                return
+            await self.bot.dispatcher.set_enabled(ctx.guild.id, state.lower() == "on")
+            logging.info(f"Auto-dispatch for guild {ctx.guild.id} set {state.lower()} by {ctx.author.id}")
+
+        enabled = ctx.guild.id in self.bot.dispatcher.enabled
+        stats = self.bot.dispatcher.stats(ctx.guild.id)
+        embed = discord.Embed(
+            title="🤖 Automatic Assignment",
+            description="Enabled" if enabled else "Disabled - staff claim tickets by hand",
+            color=discord.Color.green() if enabled else discord.Color.light_grey()
+        )
+        embed.add_field(name="On Duty", value=str(len(stats['on_duty'])), inline=True)
+        embed.add_field(name="Assigned", value=str(stats['assigned']), inline=True)
+        embed.add_field(name="Reassigned", value=str(stats['reassigned']), inline=True)
+        embed.add_field(name="Waiting", value=f"{stats['backlog']} queued", inline=True)
+        embed.add_field(name="Failed", value=str(stats['failed']), inline=True)
+        for kind, label in (('auto', "Time to Claim (auto)"), ('manual', "Time to Claim (manual)")):
+            ttc = stats['time_to_claim'][kind]
+            embed.add_field(
+                name=label,
+                value=f"p50 **{format_duration(ttc['p50'])}** • p90 **{format_duration(ttc['p90'])}** • {ttc['count']} tickets",
+                inline=False
+            )
+        await ctx.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(BotCommands(bot))
@@ -17,5 +17,102 @@ TIMEOUT_MESSAGE = "⏰ Ticket timeout reached. Permissions have been restored."
 RECLAIM_MESSAGE = "⏰ This ticket is now available for claiming again due to staff timeout."
 
 # Web monitor configuration
-WEB_PORT = 5000
+WEB_PORT = int(os.getenv('PORT', 5000))  # Hosting platforms pass the port to bind in PORT
 WEB_HOST = "0.0.0.0"
+LOOP_LAG_INTERVAL = 1.0  # Seconds between event loop lag probes
+READY_MAX_LOOP_LAG = 0.5  # /ready fails when the loop falls further behind than this (seconds)
+READY_DB_TIMEOUT = 2.0  # Seconds /ready waits for the database ping
+
+# Message ingestion configuration
+INGEST_QUEUE_SIZE = 5000  # Max buffered message events before overflow policy applies
+INGEST_WORKERS = 2
+INGEST_BATCH_SIZE = 200
+INGEST_OVERFLOW_POLICY = "coalesce"  # "coalesce" keeps latest event per (channel, user), "drop" sheds it
+INGEST_OVERFLOW_MAX_KEYS = 20000
+
+# Timeout resume configuration
+RESUME_CONCURRENCY = 10  # Max overdue timeouts handled at once on startup
+
+# Shutdown snapshot configuration
+SNAPSHOT_PATH = "state_snapshot.json.gz"
+SNAPSHOT_MAX_AGE_SECONDS = 3600  # Older snapshots are ignored and state is rebuilt from the database
+
+# Leaderboard render cache configuration
+LEADERBOARD_CACHE_SIZE = 256  # Max rendered pages/summaries kept in memory
+LEADERBOARD_CURSOR_TTL = 300  # Seconds a paginated leaderboard cursor is reused before reloading
+LEADERBOARD_VIEW_STATE_MAX = 1000  # Max leaderboard messages whose page/period is remembered
+LEADERBOARD_LIVE_WINDOW = 30  # Seconds score changes are collected before the persistent message is edited
+
+# Response-time sketch configuration
+PERF_SKETCH_ACCURACY = 0.02  # Relative error of reported quantiles
+PERF_SKETCH_MAX_BUCKETS = 256  # Per-sketch memory bound
+PERF_FLUSH_SECONDS = 60  # Changed sketches are written to the database this often (and on each completed claim)
+
+# Retention configuration
+RETENTION_DAYS = 90  # Completed claims older than this are rolled up into daily aggregates
+HOLDER_RETENTION_DAYS = 30  # Ticket holders without an active claim are purged after this
+RETENTION_BATCH_SIZE = 500  # Claims rolled up per transaction
+RETENTION_VACUUM_PAGES = 200  # Pages freed per incremental_vacuum slice
+RETENTION_SLICE_PAUSE = 0.05  # Seconds yielded between slices
+
+# Export configuration
+EXPORT_CHUNK_ROWS = 1000  # Rows fetched and written per chunk
+
+# Backup configuration
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_COPY_TIMEOUT = 120  # Seconds an online copy may wait for the source to be free before failing
+BACKUP_BUSY_RETRY = 0.25  # Seconds between attempts while another connection holds the lock
+BACKUP_GENERATIONS = 7  # Backups kept; all but the newest are gzip-compressed
+
+# Ticket activity timeline configuration
+TIMELINE_MAX_EVENTS = 512  # Messages kept per claim; the oldest quarter is dropped when full
+RESPONSE_WINDOW_MINUTES = 15  # Staff replies within this window count as responsive
+
+# Tracing configuration
+TRACE_SAMPLE_RATE = 0.25  # Fraction of root operations (commands, timeouts, jobs) traced
+TRACE_BUFFER_SIZE = 500  # Recent sampled traces kept in memory
+TRACE_EXPORT_PATH = "traces.jsonl"
+TRACE_EXPORT_MAX_BYTES = 10 * 1024 * 1024  # Export file is rotated to .1 past this size
+TRACE_FLUSH_SECONDS = 60
+
+# Startup configuration
+FAST_BOOT = os.getenv('FAST_BOOT', '1') != '0'  # Overlap DB init with login, defer scheduler/views to first ready
+STARTUP_BENCH_HISTORY = "startup_bench.jsonl"  # Results appended by startup_benchmark.py
+
+# Weekly report configuration
+REPORT_DAYS = 7  # Claims covered by the report posted before the weekly reset
+REPORT_WORKERS = 1  # Processes aggregating reports off the event loop
+REPORT_TOP_STAFF = 10  # Staff shown in the embed; the attached CSV has everyone
+
+# Bulk recovery configuration
+RECOVERY_CONCURRENCY = 5  # Channels whose permissions are restored at once
+RECOVERY_PROGRESS_EVERY = 10  # Channels between progress updates
+
+# Permission reconciler configuration
+RECONCILE_INTERVAL_MINUTES = 5
+RECONCILE_SLICE_MS = 20  # Cache comparisons run for at most this long before yielding the event loop
+RECONCILE_GRACE_SECONDS = 60  # Claims younger than this are skipped while the cache catches up
+RECONCILE_MAX_FIXES = 50  # Channels corrected per pass; the rest wait for the next pass
+RECONCILE_FIX_INTERVAL = 0.5  # Seconds between corrected channels, keeping REST traffic low
+
+# Command admission control (token buckets; rates are tokens per second)
+ADMISSION_USER_BURST = 6
+ADMISSION_USER_RATE = 0.5
+ADMISSION_GUILD_BURST = 40
+ADMISSION_GUILD_RATE = 4
+ADMISSION_GLOBAL_BURST = 200
+ADMISSION_GLOBAL_RATE = 30
+ADMISSION_RESERVE = 0.25  # Fraction of each bucket only ticket-critical commands may use
+ADMISSION_PRUNE_SECONDS = 300  # How often idle, fully refilled buckets are dropped
+ADMISSION_COSTS = {  # Tokens charged per command; unlisted commands cost 1 (keep below the user burst minus reserve)
+    'lb': 2, 'stats': 2, 'perfstats': 2, 'trace': 2, 'recover': 4, 'export': 4, 'weeklyreport': 4
+}
+
+# Database sharding (split an existing database first with: python sharding.py --shards N)
+DATABASE_SHARDS = int(os.getenv('DATABASE_SHARDS', '0'))  # 0 keeps everything in DATABASE_PATH
+DATABASE_SHARD_DIR = "shards"  # Shard files are named shard-00.db, shard-01.db, ...
+
+# Automatic ticket assignment (opt in per guild with ?autodispatch on; staff opt in with ?duty on)
+AUTODISPATCH_MAX_LOAD = 3  # Open claims a staff member may hold before they are skipped
+AUTODISPATCH_BACKLOG = 200  # Tickets per guild waiting for a free staff member
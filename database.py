@@ -1,17 +1,61 @@
 import sqlite3
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
-import time
+import threading
+from typing import Callable, Dict, List, Tuple, Optional
 
+from tickets import TicketState, InvalidTransition
+from config import RESPONSE_WINDOW_MINUTES
+from timeutil import get_clock, to_ms, date_to_ms
+from tracing import traced_methods
+
+# Bumped by one-shot data migrations, tracked in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+# Columns holding timestamps, stored as UTC epoch milliseconds since schema version 1
+TIMESTAMP_COLUMNS = {
+    'ticket_claims': ('claimed_at', 'completed_at'),
+    'ticket_holders': ('set_at',),
+    'active_timeouts': ('claim_time', 'last_staff_message', 'last_holder_message'),
+    'ticket_state': ('updated_at',),
+    'leaderboard': ('last_daily_reset', 'last_weekly_reset')
+}
+
+# SQLite expression for the UTC day of a millisecond timestamp
+_DAY_SQL = "date(claimed_at / 1000, 'unixepoch')"
+
+@traced_methods('db')
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, initialize: bool = True, clock=None):
         self.db_path = db_path
-        self.init_database()
+        self.clock = clock or get_clock()
+        # Score versions let caches detect leaderboard changes without querying
+        self.score_versions: Dict[int, int] = {}
+        self.score_epoch = 0  # Bumped by resets that touch every guild
+        self._version_lock = threading.Lock()
+        # Called with the guild ID (None for every guild) after scores change, from any thread
+        self.score_listeners: List[Callable[[Optional[int]], None]] = []
+        if initialize:
+            self.init_database()
+    
+    def get_score_version(self, guild_id: int) -> Tuple[int, int]:
+        """Get the current leaderboard score version for a guild."""
+        return (self.score_epoch, self.score_versions.get(guild_id, 0))
+    
+    def _bump_score_version(self, guild_id: Optional[int] = None):
+        """Invalidate cached leaderboard data for one guild, or all guilds."""
+        with self._version_lock:
+            if guild_id is None:
+                self.score_epoch += 1
+            else:
+                self.score_versions[guild_id] = self.score_versions.get(guild_id, 0) + 1
+        for listener in self.score_listeners:
+            listener(guild_id)
     
     def init_database(self):
         """Initialize the database with required tables."""
+        self._enable_incremental_vacuum()
+        
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
@@ -38,6 +82,14 @@ class Database:
                 cursor.execute('ALTER TABLE guild_config ADD COLUMN leaderboard_channel_id INTEGER')
                 logging.info("Added leaderboard_channel_id column to guild_config table")
             
+            if 'leaderboard_message_id' not in columns:
+                cursor.execute('ALTER TABLE guild_config ADD COLUMN leaderboard_message_id INTEGER')
+                logging.info("Added leaderboard_message_id column to guild_config table")
+            
+            if 'auto_dispatch' not in columns:
+                cursor.execute('ALTER TABLE guild_config ADD COLUMN auto_dispatch BOOLEAN DEFAULT FALSE')
+                logging.info("Added auto_dispatch column to guild_config table")
+            
             # Ticket claims table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS ticket_claims (
@@ -45,7 +97,7 @@ class Database:
                     guild_id INTEGER,
                     channel_id INTEGER,
                     user_id INTEGER,
-                    claimed_at TIMESTAMP,
+                    claimed_at INTEGER,
                     completed BOOLEAN DEFAULT FALSE,
                     timeout_occurred BOOLEAN DEFAULT FALSE,
                     score_awarded BOOLEAN DEFAULT FALSE
@@ -60,8 +112,8 @@ class Database:
                     daily_claims INTEGER DEFAULT 0,
                     weekly_claims INTEGER DEFAULT 0,
                     total_claims INTEGER DEFAULT 0,
-                    last_daily_reset DATE,
-                    last_weekly_reset DATE,
+                    last_daily_reset INTEGER,
+                    last_weekly_reset INTEGER,
                     PRIMARY KEY (guild_id, user_id)
                 )
             ''')
@@ -72,7 +124,7 @@ class Database:
                     channel_id INTEGER PRIMARY KEY,
                     user_id INTEGER,
                     set_by INTEGER,
-                    set_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    set_at INTEGER
                 )
             ''')
             
@@ -82,9 +134,9 @@ class Database:
                     channel_id INTEGER PRIMARY KEY,
                     claimer_id INTEGER,
                     ticket_holder_id INTEGER,
-                    claim_time TIMESTAMP,
-                    last_staff_message TIMESTAMP,
-                    last_holder_message TIMESTAMP,
+                    claim_time INTEGER,
+                    last_staff_message INTEGER,
+                    last_holder_message INTEGER,
                     original_permissions TEXT,
                     officer_used BOOLEAN DEFAULT FALSE
                 )
@@ -107,7 +159,123 @@ class Database:
                 )
             ''')
             
+            # Outcome columns recorded when a claim ends
+            cursor.execute("PRAGMA table_info(ticket_claims)")
+            claim_columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'completed_at' not in claim_columns:
+                cursor.execute('ALTER TABLE ticket_claims ADD COLUMN completed_at INTEGER')
+                logging.info("Added completed_at column to ticket_claims table")
+            
+            if 'end_reason' not in claim_columns:
+                cursor.execute('ALTER TABLE ticket_claims ADD COLUMN end_reason TEXT')
+                logging.info("Added end_reason column to ticket_claims table")
+            
+            if 'officer_used' not in claim_columns:
+                cursor.execute('ALTER TABLE ticket_claims ADD COLUMN officer_used BOOLEAN DEFAULT FALSE')
+                logging.info("Added officer_used column to ticket_claims table")
+            
+            if 'timeline' not in claim_columns:
+                cursor.execute('ALTER TABLE ticket_claims ADD COLUMN timeline BLOB')
+                logging.info("Added timeline column to ticket_claims table")
+            
+            # Ticket state machine
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ticket_state (
+                    channel_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER,
+                    state TEXT,
+                    claimer_id INTEGER,
+                    updated_at INTEGER
+                )
+            ''')
+            
+            # Daily aggregates of claims removed by retention
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS claim_daily_rollup (
+                    guild_id INTEGER,
+                    user_id INTEGER,
+                    day TEXT,
+                    claims INTEGER DEFAULT 0,
+                    timeouts INTEGER DEFAULT 0,
+                    PRIMARY KEY (guild_id, user_id, day)
+                )
+            ''')
+            
+            # Guilds whose leaderboards are combined into a global view (one group per guild)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS guild_groups (
+                    guild_id INTEGER PRIMARY KEY,
+                    group_name TEXT NOT NULL
+                )
+            ''')
+            
+            # Serialized response-time sketches so ?perfstats history survives restarts (user_id 0 is the guild rollup)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS perf_sketches (
+                    guild_id INTEGER,
+                    user_id INTEGER,
+                    metric TEXT,
+                    data TEXT,
+                    updated_at INTEGER,
+                    PRIMARY KEY (guild_id, user_id, metric)
+                )
+            ''')
+            
+            # Indexes for per-channel lookups and retention scans
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_claims_channel ON ticket_claims (channel_id, completed)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_claims_completed ON ticket_claims (completed, claimed_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_claims_guild ON ticket_claims (guild_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_guild_groups_name ON guild_groups (group_name)')
+            
             conn.commit()
+            
+            self._migrate_timestamps(conn)
+    
+    def _migrate_timestamps(self, conn):
+        """One-shot conversion of legacy ISO-string timestamps to UTC epoch milliseconds."""
+        cursor = conn.cursor()
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        
+        converted = 0
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for table, columns in TIMESTAMP_COLUMNS.items():
+                for column in columns:
+                    cursor.execute(f"SELECT rowid, {column} FROM {table} WHERE typeof({column}) = 'text'")
+                    updates = []
+                    for rowid, value in cursor.fetchall():
+                        try:
+                            # Bare dates (leaderboard resets) came from SQLite's CURRENT_DATE, which is UTC
+                            ms = date_to_ms(value) if len(value) == 10 else to_ms(value)
+                        except (TypeError, ValueError):
+                            logging.warning(f"Unparseable {table}.{column} value {value!r}, clearing it")
+                            ms = None
+                        updates.append((ms, rowid))
+                    cursor.executemany(f'UPDATE {table} SET {column} = ? WHERE rowid = ?', updates)
+                    converted += len(updates)
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        if converted:
+            logging.info(f"Migrated {converted} timestamps to UTC epoch milliseconds")
+    
+    def _enable_incremental_vacuum(self):
+        """Switch the database to incremental auto-vacuum (one-time full VACUUM)."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if mode != 2:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+                logging.info("Enabled incremental auto-vacuum")
+        finally:
+            conn.close()
     
     def set_staff_role(self, guild_id: int, role_id: int):
         """Set the staff role for a guild."""
@@ -178,11 +346,96 @@ class Database:
             cursor.execute('''
                 INSERT OR IGNORE INTO guild_config (guild_id) VALUES (?)
             ''', (guild_id,))
+            # A new channel gets a new persistent message
             cursor.execute('''
-                UPDATE guild_config SET leaderboard_channel_id = ? WHERE guild_id = ?
+                UPDATE guild_config SET leaderboard_channel_id = ?, leaderboard_message_id = NULL WHERE guild_id = ?
             ''', (channel_id, guild_id))
             conn.commit()
 
+    def clear_leaderboard_channel(self, guild_id: int):
+        """Stop automatic leaderboard updates for a guild whose channel is gone."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE guild_config SET leaderboard_channel_id = NULL, leaderboard_message_id = NULL WHERE guild_id = ?
+            ''', (guild_id,))
+            conn.commit()
+
+    def set_leaderboard_message(self, guild_id: int, message_id: Optional[int]):
+        """Remember the persistent leaderboard message edited in place for a guild."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE guild_config SET leaderboard_message_id = ? WHERE guild_id = ?
+            ''', (message_id, guild_id))
+            conn.commit()
+
+    def get_live_leaderboards(self, guild_id: Optional[int] = None):
+        """Get (guild_id, channel_id, message_id) of configured leaderboard channels."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            query = '''
+                SELECT guild_id, leaderboard_channel_id, leaderboard_message_id FROM guild_config
+                WHERE leaderboard_channel_id IS NOT NULL
+            '''
+            if guild_id is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query + ' AND guild_id = ?', (guild_id,))
+            return cursor.fetchall()
+
+    def set_auto_dispatch(self, guild_id: int, enabled: bool):
+        """Turn automatic ticket assignment on or off for a guild."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO guild_config (guild_id) VALUES (?)
+            ''', (guild_id,))
+            cursor.execute('''
+                UPDATE guild_config SET auto_dispatch = ? WHERE guild_id = ?
+            ''', (enabled, guild_id))
+            conn.commit()
+
+    def get_auto_dispatch(self, guild_id: int) -> bool:
+        """Check whether automatic ticket assignment is on for a guild."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT auto_dispatch FROM guild_config WHERE guild_id = ?', (guild_id,))
+            result = cursor.fetchone()
+            return bool(result and result[0])
+
+    def get_auto_dispatch_guilds(self) -> List[int]:
+        """Get every guild with automatic ticket assignment on."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT guild_id FROM guild_config WHERE auto_dispatch')
+            return [row[0] for row in cursor.fetchall()]
+
+    def save_perf_sketches(self, rows: List[Tuple[int, int, str, str]]):
+        """Store (guild_id, user_id, metric, JSON) response-time sketches, replacing earlier versions."""
+        updated_at = self.clock.now_ms()
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO perf_sketches (guild_id, user_id, metric, data, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(guild_id, user_id, metric, data, updated_at) for guild_id, user_id, metric, data in rows])
+            conn.commit()
+
+    def get_perf_sketches(self) -> List[Tuple[int, int, str, str]]:
+        """Get every stored (guild_id, user_id, metric, JSON) response-time sketch."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT guild_id, user_id, metric, data FROM perf_sketches')
+            return cursor.fetchall()
+
+    def get_staff_roles(self) -> Dict[int, int]:
+        """Get the configured staff role of every guild."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT guild_id, staff_role_id FROM guild_config WHERE staff_role_id IS NOT NULL')
+            return dict(cursor.fetchall())
+
     def get_all_leaderboard_channels(self):
         """Get all leaderboard channels across all guilds."""
         with sqlite3.connect(self.db_path) as conn:
@@ -232,16 +485,6 @@ class Database:
             result = cursor.fetchone()
             return result if result else (None, None, None, None)
 
-    def create_claim(self, guild_id: int, channel_id: int, user_id: int):
-        """Create a new ticket claim record."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO ticket_claims (guild_id, channel_id, user_id, claimed_at)
-                VALUES (?, ?, ?, ?)
-            ''', (guild_id, channel_id, user_id, datetime.now().isoformat()))
-            conn.commit()
-
     def get_active_claim(self, channel_id: int):
         """Get active claim for a channel to prevent duplicate claims."""
         with sqlite3.connect(self.db_path) as conn:
@@ -253,69 +496,7 @@ class Database:
             ''', (channel_id,))
             return cursor.fetchone()
 
-    def complete_claim(self, channel_id: int, timeout_occurred: bool = False, officer_used: bool = False):
-        """Mark a claim as completed - FIXED: No points awarded here, only via officer command."""
-        max_retries = 3
-        
-        for attempt in range(max_retries):
-            try:
-                with sqlite3.connect(self.db_path, timeout=30.0) as conn:
-                    cursor = conn.cursor()
-                    
-                    # Debug logging
-                    logging.info(f"=== COMPLETE_CLAIM DEBUG ===")
-                    logging.info(f"Channel ID: {channel_id}")
-                    logging.info(f"Timeout occurred: {timeout_occurred}")
-                    logging.info(f"Officer used: {officer_used}")
-                    
-                    # Get the most recent claim for this channel
-                    cursor.execute('''
-                        SELECT guild_id, user_id, score_awarded FROM ticket_claims 
-                        WHERE channel_id = ? AND completed = FALSE 
-                        ORDER BY claimed_at DESC LIMIT 1
-                    ''', (channel_id,))
-                    result = cursor.fetchone()
-                    
-                    logging.info(f"Query result: {result}")
-                    
-                    if result:
-                        guild_id, user_id, score_awarded = result
-                        
-                        logging.info(f"Guild ID: {guild_id}")
-                        logging.info(f"User ID: {user_id}")
-                        logging.info(f"Score already awarded: {score_awarded}")
-                        
-                        # Mark as completed
-                        cursor.execute('''
-                            UPDATE ticket_claims 
-                            SET completed = TRUE, timeout_occurred = ?, score_awarded = TRUE
-                            WHERE channel_id = ? AND user_id = ? AND completed = FALSE
-                        ''', (timeout_occurred, channel_id, user_id))
-
-                        logging.info(f"Claim marked as completed. Rows affected: {cursor.rowcount}")
-
-                        # FIXED: Don't award points on unclaim - points should only be awarded on officer command
-                        logging.info(f"Unclaim completed - no points awarded (points awarded via officer command)")
-                        
-                        conn.commit()
-                        logging.info(f"Database changes committed")
-                        break
-                    else:
-                        logging.warning(f"No active claim found for channel {channel_id}")
-                        break
-                        
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    logging.warning(f"Database locked, retrying in {attempt + 1} seconds...")
-                    time.sleep(attempt + 1)
-                    continue
-                else:
-                    logging.error(f"Database error after {attempt + 1} attempts: {e}")
-                    raise
-            
-            logging.info(f"=== END COMPLETE_CLAIM DEBUG ===")
-
-    def analyze_conversation_and_award_points(self, channel_id: int):
+    def analyze_conversation_and_award_points(self, channel_id: int, timeline_summary: Optional[dict] = None):
         """Analyze conversation history and award points based on responsiveness."""
         with sqlite3.connect(self.db_path, timeout=30.0) as conn:
             cursor = conn.cursor()
@@ -333,16 +514,12 @@ class Database:
                 
             claimer_id, ticket_holder_id, claim_time, last_staff_msg, last_holder_msg = timeout_info
             
-            # Parse timestamps
             try:
-                claim_time_dt = datetime.fromisoformat(claim_time)
-                last_staff_dt = datetime.fromisoformat(last_staff_msg)
-                last_holder_dt = datetime.fromisoformat(last_holder_msg)
-                current_time = datetime.now()
+                current_time = self.clock.now_ms()
                 
                 # Calculate time differences
-                time_since_staff_msg = (current_time - last_staff_dt).total_seconds() / 60  # minutes
-                time_since_holder_msg = (current_time - last_holder_dt).total_seconds() / 60  # minutes
+                time_since_staff_msg = (current_time - last_staff_msg) / 60000  # minutes
+                time_since_holder_msg = (current_time - last_holder_msg) / 60000  # minutes
                 
                 logging.info(f"=== CONVERSATION ANALYSIS ===")
                 logging.info(f"Time since last staff message: {time_since_staff_msg:.1f} minutes")
@@ -355,18 +532,43 @@ class Database:
                 
                 should_award = False
                 reason = ""
+                window = RESPONSE_WINDOW_MINUTES
                 
-                if time_since_staff_msg <= 15:
-                    # Staff was responsive
-                    should_award = True
-                    if time_since_holder_msg <= 15:
-                        reason = "Both staff and holder were responsive - staff gets point"
+                # With a timeline, judge every holder turn rather than just the last two messages
+                decided = False
+                if timeline_summary:
+                    pending_wait = timeline_summary['pending_wait']
+                    closed_turns = timeline_summary['turns'] - (pending_wait is not None)
+                    answered = timeline_summary['answered_in_window']
+                    logging.info(
+                        f"Timeline: {timeline_summary['claimer_messages']} staff / {timeline_summary['holder_messages']} holder messages, "
+                        f"{answered}/{closed_turns} turns answered within {window} min, "
+                        f"longest wait {timeline_summary['max_wait'] / 60:.1f} min"
+                    )
+                    
+                    if pending_wait is not None and pending_wait > window * 60:
+                        decided = True
+                        reason = f"Holder has been waiting {pending_wait / 60:.1f} minutes for a reply - no point awarded"
+                    elif closed_turns > 0:
+                        decided = True
+                        should_award = answered * 2 >= closed_turns
+                        if should_award:
+                            reason = f"Staff answered {answered}/{closed_turns} holder turns within {window} minutes - staff gets point"
+                        else:
+                            reason = f"Staff answered only {answered}/{closed_turns} holder turns within {window} minutes - no point awarded"
+                
+                if not decided:
+                    if time_since_staff_msg <= window:
+                        # Staff was responsive
+                        should_award = True
+                        if time_since_holder_msg <= window:
+                            reason = "Both staff and holder were responsive - staff gets point"
+                        else:
+                            reason = "Staff was responsive, holder was not - staff gets point"
                     else:
-                        reason = "Staff was responsive, holder was not - staff gets point"
-                else:
-                    # Staff was not responsive
-                    should_award = False
-                    reason = "Staff was not responsive within 15 minutes - no point awarded"
+                        # Staff was not responsive
+                        should_award = False
+                        reason = f"Staff was not responsive within {window} minutes - no point awarded"
                 
                 logging.info(f"Decision: {reason}")
                 logging.info(f"Should award points: {should_award}")
@@ -382,7 +584,10 @@ class Database:
                     guild_result = cursor.fetchone()
                     if guild_result:
                         guild_id = guild_result[0]
-                        self.award_score(guild_id, claimer_id)
+                        # Same connection: a nested one would wait on our own lock
+                        self._award_score(cursor, guild_id, claimer_id)
+                        conn.commit()
+                        self._bump_score_version(guild_id)
                         logging.info(f"Points awarded to claimer {claimer_id} via officer command")
                         return True
                     
@@ -397,28 +602,9 @@ class Database:
         """Award a point to a user."""
         with sqlite3.connect(self.db_path, timeout=30.0) as conn:
             cursor = conn.cursor()
-            
-            logging.info(f"=== AWARD_SCORE DEBUG ===")
-            logging.info(f"Awarding score to user {user_id} in guild {guild_id}")
-            
-            # Create or update leaderboard entry
-            cursor.execute('''
-                INSERT OR IGNORE INTO leaderboard (guild_id, user_id) VALUES (?, ?)
-            ''', (guild_id, user_id))
-            
-            logging.info(f"Insert/ignore leaderboard entry. Rows affected: {cursor.rowcount}")
-            
-            cursor.execute('''
-                UPDATE leaderboard 
-                SET daily_claims = daily_claims + 1,
-                    weekly_claims = weekly_claims + 1,
-                    total_claims = total_claims + 1
-                WHERE guild_id = ? AND user_id = ?
-            ''', (guild_id, user_id))
-            
-            logging.info(f"Updated leaderboard scores. Rows affected: {cursor.rowcount}")
-            
+            self._award_score(cursor, guild_id, user_id)
             conn.commit()
+            self._bump_score_version(guild_id)
             
             # Verify the update worked
             cursor.execute('''
@@ -429,6 +615,28 @@ class Database:
             logging.info(f"Current scores for user {user_id}: {result}")
             logging.info(f"=== END AWARD_SCORE DEBUG ===")
 
+    def _award_score(self, cursor, guild_id: int, user_id: int):
+        """Award a point using the caller's connection; the caller commits."""
+        logging.info(f"=== AWARD_SCORE DEBUG ===")
+        logging.info(f"Awarding score to user {user_id} in guild {guild_id}")
+        
+        # Create or update leaderboard entry
+        cursor.execute('''
+            INSERT OR IGNORE INTO leaderboard (guild_id, user_id) VALUES (?, ?)
+        ''', (guild_id, user_id))
+        
+        logging.info(f"Insert/ignore leaderboard entry. Rows affected: {cursor.rowcount}")
+        
+        cursor.execute('''
+            UPDATE leaderboard 
+            SET daily_claims = daily_claims + 1,
+                weekly_claims = weekly_claims + 1,
+                total_claims = total_claims + 1
+            WHERE guild_id = ? AND user_id = ?
+        ''', (guild_id, user_id))
+        
+        logging.info(f"Updated leaderboard scores. Rows affected: {cursor.rowcount}")
+
     def get_leaderboard(self, guild_id: int, period: str = "total"):
         """Get leaderboard data for a specific period."""
         with sqlite3.connect(self.db_path) as conn:
@@ -455,23 +663,76 @@ class Database:
             
             return cursor.fetchall()
 
+    def get_leaderboard_rows(self, guild_id: int):
+        """Get daily, weekly and total scores for every ranked user in a guild."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, daily_claims, weekly_claims, total_claims FROM leaderboard
+                WHERE guild_id = ? AND total_claims > 0
+            ''', (guild_id,))
+            return cursor.fetchall()
+
+    def get_report_claims(self, guild_id: int, since: int, until: int):
+        """Get claims made in [since, until) ms for the weekly report."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, claimed_at, completed_at, end_reason, officer_used, timeline
+                FROM ticket_claims
+                WHERE guild_id = ? AND claimed_at >= ? AND claimed_at < ?
+            ''', (guild_id, since, until))
+            return cursor.fetchall()
+
+    def set_guild_group(self, guild_id: int, group_name: Optional[str]):
+        """Put a guild into a leaderboard group, or remove it from its group with None."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            if group_name is None:
+                cursor.execute('DELETE FROM guild_groups WHERE guild_id = ?', (guild_id,))
+            else:
+                cursor.execute('''
+                    INSERT INTO guild_groups (guild_id, group_name) VALUES (?, ?)
+                    ON CONFLICT(guild_id) DO UPDATE SET group_name = excluded.group_name
+                ''', (guild_id, group_name))
+            conn.commit()
+
+    def get_guild_group(self, guild_id: int) -> Optional[str]:
+        """Get the leaderboard group a guild belongs to."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT group_name FROM guild_groups WHERE guild_id = ?', (guild_id,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def get_group_guilds(self, group_name: str) -> List[int]:
+        """Get the guild IDs in a leaderboard group."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT guild_id FROM guild_groups WHERE group_name = ? ORDER BY guild_id
+            ''', (group_name,))
+            return [row[0] for row in cursor.fetchall()]
+
     def reset_daily_leaderboard(self):
         """Reset all daily leaderboard scores."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                UPDATE leaderboard SET daily_claims = 0, last_daily_reset = CURRENT_DATE
-            ''')
+                UPDATE leaderboard SET daily_claims = 0, last_daily_reset = ?
+            ''', (self.clock.now_ms(),))
             conn.commit()
+        self._bump_score_version()
 
     def reset_weekly_leaderboard(self):
         """Reset all weekly leaderboard scores."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                UPDATE leaderboard SET weekly_claims = 0, last_weekly_reset = CURRENT_DATE
-            ''')
+                UPDATE leaderboard SET weekly_claims = 0, last_weekly_reset = ?
+            ''', (self.clock.now_ms(),))
             conn.commit()
+        self._bump_score_version()
 
     def set_ticket_holder(self, channel_id: int, user_id: int, set_by: int):
         """Set or update the ticket holder for a channel."""
@@ -480,7 +741,7 @@ class Database:
             cursor.execute('''
                 INSERT OR REPLACE INTO ticket_holders (channel_id, user_id, set_by, set_at)
                 VALUES (?, ?, ?, ?)
-            ''', (channel_id, user_id, set_by, datetime.now().isoformat()))
+            ''', (channel_id, user_id, set_by, self.clock.now_ms()))
             conn.commit()
 
     def get_ticket_holder(self, channel_id: int) -> Optional[int]:
@@ -493,18 +754,6 @@ class Database:
             result = cursor.fetchone()
             return result[0] if result else None
 
-    def save_timeout(self, channel_id: int, claimer_id: int, ticket_holder_id: int, original_permissions: str):
-        """Save timeout information for a channel."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            current_time = datetime.now().isoformat()
-            cursor.execute('''
-                INSERT OR REPLACE INTO active_timeouts 
-                (channel_id, claimer_id, ticket_holder_id, claim_time, last_staff_message, last_holder_message, original_permissions)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (channel_id, claimer_id, ticket_holder_id, current_time, current_time, current_time, original_permissions))
-            conn.commit()
-
     def get_timeout_info(self, channel_id: int):
         """Get timeout information for a channel."""
         with sqlite3.connect(self.db_path) as conn:
@@ -516,6 +765,84 @@ class Database:
             ''', (channel_id,))
             return cursor.fetchone()
 
+    def get_active_timeout_states(self):
+        """Get full state of all active timeouts in a single query."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id, claimer_id, ticket_holder_id, claim_time, last_staff_message,
+                       last_holder_message, original_permissions, officer_used
+                FROM active_timeouts
+            ''')
+            return cursor.fetchall()
+
+    def ping(self):
+        """Run a trivial query to confirm the database is reachable."""
+        with sqlite3.connect(self.db_path, timeout=1.0) as conn:
+            conn.execute('SELECT 1').fetchone()
+
+    @property
+    def paths(self) -> List[str]:
+        """Database files holding this store's data."""
+        return [self.db_path]
+
+    def path_for_guild(self, guild_id: int) -> str:
+        """Get the database file holding a guild's data."""
+        return self.db_path
+
+    def register_channel(self, channel_id: int, guild_id: int):
+        """Record which guild a channel belongs to before writing channel-keyed rows (no-op for one file)."""
+
+    def get_known_channels(self) -> List[int]:
+        """Get every channel ID with stored ticket data."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id FROM ticket_state
+                UNION SELECT channel_id FROM ticket_claims
+                UNION SELECT channel_id FROM active_timeouts
+                UNION SELECT channel_id FROM ticket_holders
+            ''')
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_state_fingerprint(self):
+        """Get a cheap fingerprint of claim state used to validate warm-start snapshots."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(channel_id), 0), MAX(claim_time),
+                       MAX(last_staff_message), MAX(last_holder_message)
+                FROM active_timeouts
+            ''')
+            timeouts = list(cursor.fetchone())
+            cursor.execute('SELECT COUNT(*), MAX(id) FROM ticket_claims WHERE completed = FALSE')
+            claims = list(cursor.fetchone())
+            return timeouts + claims
+
+    def get_recovery_candidates(self, claimer_id: Optional[int] = None, claimed_before: Optional[int] = None):
+        """Get (channel_id, guild_id, claimer_id, claim_time) of active claims matching the filters.
+
+        guild_id is None for channels claimed before the state table existed.
+        """
+        conditions, params = [], []
+        if claimer_id is not None:
+            conditions.append('t.claimer_id = ?')
+            params.append(claimer_id)
+        if claimed_before is not None:
+            conditions.append('t.claim_time < ?')
+            params.append(claimed_before)
+
+        query = '''
+            SELECT t.channel_id, s.guild_id, t.claimer_id, t.claim_time
+            FROM active_timeouts t LEFT JOIN ticket_state s ON s.channel_id = t.channel_id
+        '''
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query + ' ORDER BY t.claim_time', params)
+            return cursor.fetchall()
+
     def get_all_active_timeouts(self):
         """Get all active timeouts."""
         with sqlite3.connect(self.db_path) as conn:
@@ -530,31 +857,64 @@ class Database:
             cursor.execute('DELETE FROM active_timeouts WHERE channel_id = ?', (channel_id,))
             conn.commit()
 
+    def remove_timeouts(self, channel_ids: List[int]):
+        """Remove timeout information for several channels at once."""
+        if not channel_ids:
+            return
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('DELETE FROM active_timeouts WHERE channel_id = ?', [(c,) for c in channel_ids])
+            conn.commit()
+
     def update_last_message(self, channel_id: int, user_id: int):
         """Update last message time for timeout tracking."""
-        with sqlite3.connect(self.db_path) as conn:
+        self.update_last_messages([(channel_id, user_id, self.clock.now_ms())])
+
+    def update_last_messages(self, events: List[Tuple[int, int, int]]):
+        """Apply a batch of (channel_id, user_id, sent_at_ms) activity updates in one transaction."""
+        if not events:
+            return
+
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
             cursor = conn.cursor()
-            current_time = datetime.now().isoformat()
-            
-            # Check if this is an active timeout
-            cursor.execute('SELECT claimer_id, ticket_holder_id FROM active_timeouts WHERE channel_id = ?', (channel_id,))
-            timeout_info = cursor.fetchone()
-            
-            if timeout_info:
-                claimer_id, ticket_holder_id = timeout_info
-                
+
+            # Look up claimer/holder for every channel in the batch at once
+            channel_ids = list({channel_id for channel_id, _, _ in events})
+            participants = {}
+            for start in range(0, len(channel_ids), 500):
+                chunk = channel_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT channel_id, claimer_id, ticket_holder_id FROM active_timeouts
+                    WHERE channel_id IN ({placeholders})
+                ''', chunk)
+                for channel_id, claimer_id, ticket_holder_id in cursor.fetchall():
+                    participants[channel_id] = (claimer_id, ticket_holder_id)
+
+            staff_updates = []
+            holder_updates = []
+            for channel_id, user_id, sent_at in events:
+                if channel_id not in participants:
+                    continue
+                claimer_id, ticket_holder_id = participants[channel_id]
                 if user_id == claimer_id:
-                    # Update staff message time
-                    cursor.execute('''
-                        UPDATE active_timeouts SET last_staff_message = ? WHERE channel_id = ?
-                    ''', (current_time, channel_id))
+                    staff_updates.append((sent_at, channel_id, sent_at))
                 elif user_id == ticket_holder_id:
-                    # Update holder message time
-                    cursor.execute('''
-                        UPDATE active_timeouts SET last_holder_message = ? WHERE channel_id = ?
-                    ''', (current_time, channel_id))
-                
-                conn.commit()
+                    holder_updates.append((sent_at, channel_id, sent_at))
+
+            # Never move a timestamp backwards if batches are applied out of order
+            if staff_updates:
+                cursor.executemany('''
+                    UPDATE active_timeouts SET last_staff_message = ?
+                    WHERE channel_id = ? AND (last_staff_message IS NULL OR last_staff_message < ?)
+                ''', staff_updates)
+            if holder_updates:
+                cursor.executemany('''
+                    UPDATE active_timeouts SET last_holder_message = ?
+                    WHERE channel_id = ? AND (last_holder_message IS NULL OR last_holder_message < ?)
+                ''', holder_updates)
+
+            conn.commit()
 
     def mark_officer_used(self, channel_id: int):
         """Mark that officer command was used for this ticket."""
@@ -564,3 +924,199 @@ class Database:
                 UPDATE active_timeouts SET officer_used = TRUE WHERE channel_id = ?
             ''', (channel_id,))
             conn.commit()
+
+    def rollup_old_claims(self, cutoff: int, batch_size: int) -> int:
+        """Fold one batch of completed claims older than cutoff into daily aggregates and delete them."""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM ticket_claims
+                    WHERE completed = TRUE AND claimed_at < ?
+                    ORDER BY id LIMIT ?
+                )
+            ''', (cutoff, batch_size))
+            max_id, count = cursor.fetchone()
+            if not count:
+                return 0
+            
+            cursor.execute(f'''
+                INSERT INTO claim_daily_rollup (guild_id, user_id, day, claims, timeouts)
+                SELECT guild_id, user_id, {_DAY_SQL}, COUNT(*), SUM(timeout_occurred)
+                FROM ticket_claims
+                WHERE completed = TRUE AND claimed_at < ? AND id <= ?
+                GROUP BY guild_id, user_id, {_DAY_SQL}
+                ON CONFLICT (guild_id, user_id, day) DO UPDATE SET
+                    claims = claims + excluded.claims,
+                    timeouts = timeouts + excluded.timeouts
+            ''', (cutoff, max_id))
+            cursor.execute('''
+                DELETE FROM ticket_claims WHERE completed = TRUE AND claimed_at < ? AND id <= ?
+            ''', (cutoff, max_id))
+            deleted = cursor.rowcount
+            conn.commit()
+            return deleted
+
+    def purge_stale_holders(self, cutoff: int) -> int:
+        """Delete ticket holder rows older than cutoff for channels without an active claim."""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM ticket_holders
+                WHERE set_at < ? AND channel_id NOT IN (SELECT channel_id FROM active_timeouts)
+            ''', (cutoff,))
+            conn.commit()
+            return cursor.rowcount
+
+    def purge_channel(self, channel_id: int):
+        """Remove all data for a deleted channel, keeping completed claims as daily aggregates."""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                INSERT INTO claim_daily_rollup (guild_id, user_id, day, claims, timeouts)
+                SELECT guild_id, user_id, {_DAY_SQL}, COUNT(*), SUM(timeout_occurred)
+                FROM ticket_claims
+                WHERE channel_id = ? AND completed = TRUE
+                GROUP BY guild_id, user_id, {_DAY_SQL}
+                ON CONFLICT (guild_id, user_id, day) DO UPDATE SET
+                    claims = claims + excluded.claims,
+                    timeouts = timeouts + excluded.timeouts
+            ''', (channel_id,))
+            cursor.execute('DELETE FROM ticket_claims WHERE channel_id = ?', (channel_id,))
+            cursor.execute('DELETE FROM active_timeouts WHERE channel_id = ?', (channel_id,))
+            cursor.execute('DELETE FROM ticket_holders WHERE channel_id = ?', (channel_id,))
+            cursor.execute('DELETE FROM ticket_state WHERE channel_id = ?', (channel_id,))
+            conn.commit()
+
+    def get_guild_channels(self, guild_id: int) -> List[int]:
+        """Get every channel a guild has claim or ticket state for."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id FROM ticket_claims WHERE guild_id = ?
+                UNION SELECT channel_id FROM ticket_state WHERE guild_id = ?
+            ''', (guild_id, guild_id))
+            return [row[0] for row in cursor.fetchall()]
+
+    def purge_guild(self, guild_id: int):
+        """Remove all data for a guild the bot is no longer in."""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            # Channel-keyed tables have no guild_id, so go through the guild's claims
+            cursor.execute('''
+                DELETE FROM active_timeouts WHERE channel_id IN
+                    (SELECT DISTINCT channel_id FROM ticket_claims WHERE guild_id = ?)
+            ''', (guild_id,))
+            cursor.execute('''
+                DELETE FROM ticket_holders WHERE channel_id IN
+                    (SELECT DISTINCT channel_id FROM ticket_claims WHERE guild_id = ?)
+            ''', (guild_id,))
+            for table in ('ticket_state', 'ticket_claims', 'claim_daily_rollup', 'leaderboard', 'allowed_categories', 'guild_config', 'guild_groups', 'perf_sketches'):
+                cursor.execute(f'DELETE FROM {table} WHERE guild_id = ?', (guild_id,))
+            conn.commit()
+        self._bump_score_version(guild_id)
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Free up to `pages` unused pages. Returns the number of free pages left."""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        try:
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_freelist_count(self) -> int:
+        """Get the number of unused pages in the database file."""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def _read_ticket_state(self, cursor, channel_id: int) -> TicketState:
+        """Read a ticket's state, deriving it for channels claimed before the state table existed."""
+        cursor.execute('SELECT state FROM ticket_state WHERE channel_id = ?', (channel_id,))
+        result = cursor.fetchone()
+        if result:
+            return TicketState(result[0])
+
+        cursor.execute('SELECT 1 FROM active_timeouts WHERE channel_id = ?', (channel_id,))
+        return TicketState.CLAIMED if cursor.fetchone() else TicketState.UNCLAIMED
+
+    def get_ticket_state(self, channel_id: int) -> TicketState:
+        """Get a ticket's current state."""
+        with sqlite3.connect(self.db_path) as conn:
+            return self._read_ticket_state(conn.cursor(), channel_id)
+
+    def apply_claim(self, guild_id: int, channel_id: int, claimer_id: int, holder_id: int, set_by: int,
+                    original_permissions: str, action: str, expected_states, new_state: TicketState,
+                    set_holder: bool, previous_timeline: Optional[bytes] = None):
+        """Commit every write of a claim/reclaim transition in one transaction."""
+        now = self.clock.now_ms()
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            state = self._read_ticket_state(cursor, channel_id)
+            if state not in expected_states:
+                raise InvalidTransition(action, state)
+
+            # Close out any claim being taken over
+            cursor.execute('''
+                UPDATE ticket_claims SET completed = TRUE, completed_at = ?, end_reason = 'taken_over',
+                    timeline = COALESCE(?, timeline)
+                WHERE channel_id = ? AND completed = FALSE
+            ''', (now, previous_timeline, channel_id))
+
+            if set_holder:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO ticket_holders (channel_id, user_id, set_by, set_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (channel_id, holder_id, set_by, now))
+
+            cursor.execute('''
+                INSERT INTO ticket_claims (guild_id, channel_id, user_id, claimed_at)
+                VALUES (?, ?, ?, ?)
+            ''', (guild_id, channel_id, claimer_id, now))
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO active_timeouts 
+                (channel_id, claimer_id, ticket_holder_id, claim_time, last_staff_message, last_holder_message, original_permissions)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (channel_id, claimer_id, holder_id, now, now, now, original_permissions))
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO ticket_state (channel_id, guild_id, state, claimer_id, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (channel_id, guild_id, new_state.value, claimer_id, now))
+
+            conn.commit()
+
+    def apply_completion(self, channel_id: int, action: str, expected_states, new_state: TicketState,
+                         timeout_occurred: bool = False, officer_used: bool = False,
+                         timeline: Optional[bytes] = None):
+        """Commit every write that ends a claim in one transaction."""
+        now = self.clock.now_ms()
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            state = self._read_ticket_state(cursor, channel_id)
+            if state not in expected_states:
+                raise InvalidTransition(action, state)
+
+            cursor.execute('''
+                UPDATE ticket_claims
+                SET completed = TRUE, timeout_occurred = ?, score_awarded = TRUE,
+                    completed_at = ?, end_reason = ?, officer_used = ?, timeline = COALESCE(?, timeline)
+                WHERE channel_id = ? AND completed = FALSE
+            ''', (timeout_occurred, now, action, officer_used, timeline, channel_id))
+
+            cursor.execute('DELETE FROM active_timeouts WHERE channel_id = ?', (channel_id,))
+
+            cursor.execute('''
+                UPDATE ticket_state SET state = ?, updated_at = ? WHERE channel_id = ?
+            ''', (new_state.value, now, channel_id))
+            if cursor.rowcount == 0:
+                cursor.execute('''
+                    INSERT INTO ticket_state (channel_id, state, updated_at) VALUES (?, ?, ?)
+                ''', (channel_id, new_state.value, now))
+
+            conn.commit()
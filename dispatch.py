@@ -0,0 +1,363 @@
+import asyncio
+import heapq
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+import discord
+
+from config import AUTODISPATCH_MAX_LOAD, AUTODISPATCH_BACKLOG
+from sketches import QuantileSketch
+from tickets import InvalidTransition, TicketState
+from timeutil import now_ms
+from tracing import traced
+
+class StaffLoadQueue:
+    """Min-heap of on-duty staff ordered by (open claims, last assignment, user ID).
+
+    A load change pushes a fresh entry and marks the old one dead, so updates
+    are O(log n); dead entries are dropped when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []
+        self._entries: Dict[int, list] = {}  # User ID -> live entry [load, assigned_ms, user_id, alive]
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, user_id: int, load: int, assigned_ms: int = 0):
+        """Add a staff member, or replace their entry."""
+        self.discard(user_id)
+        entry = [max(0, load), assigned_ms, user_id, True]
+        self._entries[user_id] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [entry for entry in self._heap if entry[3]]
+            heapq.heapify(self._heap)
+
+    def discard(self, user_id: int):
+        """Remove a staff member if present."""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            entry[3] = False
+
+    def load_of(self, user_id: int) -> Optional[int]:
+        """Get a staff member's open-claim count, or None if not on duty."""
+        entry = self._entries.get(user_id)
+        return entry[0] if entry is not None else None
+
+    def adjust(self, user_id: int, delta: int, assigned_ms: Optional[int] = None):
+        """Change an on-duty staff member's open-claim count; others are ignored."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self.push(user_id, entry[0] + delta, entry[1] if assigned_ms is None else assigned_ms)
+
+    def least_loaded(self, max_load: int, exclude=()) -> Optional[int]:
+        """Get the staff member with the fewest open claims below max_load, without removing them."""
+        skipped = []
+        found = None
+        while self._heap:
+            entry = self._heap[0]
+            if not entry[3]:
+                heapq.heappop(self._heap)
+            elif entry[0] >= max_load:
+                break
+            elif entry[2] in exclude:
+                skipped.append(heapq.heappop(self._heap))
+            else:
+                found = entry[2]
+                break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def snapshot(self) -> List[tuple]:
+        """Get (user ID, open claims) of everyone on duty, least loaded first."""
+        return [(entry[2], entry[0]) for entry in sorted(self._entries.values())]
+
+class AutoDispatcher:
+    """Opt-in assignment of new and timed-out tickets to the least-loaded on-duty staff member.
+
+    New channels in allowed categories become pending at creation; the first
+    message from a non-staff member names the holder and triggers assignment.
+    Staff timeouts are re-assigned to someone other than the staff member who
+    timed out. Time-to-claim is recorded for automatic and manual claims in
+    opted-in guilds so the two can be compared; other guilds are ignored.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.enabled = set()  # Guilds that opted in; mirrors guild_config.auto_dispatch
+        self.queues: Dict[int, StaffLoadQueue] = {}  # Guild ID -> on-duty staff
+        # Channel ID -> [claimable since (ms), holder ID or None, staff ID to skip or None]
+        self.pending: Dict[int, list] = {}
+        self.backlog: Dict[int, deque] = {}  # Guild ID -> channels waiting for a free staff member
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._assigning = set()  # Channels being claimed by the dispatcher
+        self._tasks = set()  # Background dispatches and drains, kept referenced until done
+        self.counters = {'assigned': 0, 'reassigned': 0, 'queued': 0, 'failed': 0}
+        self.time_to_claim = {'auto': QuantileSketch(), 'manual': QuantileSketch()}
+        bot.tickets.listeners.append(self._on_transition)
+
+    async def load_enabled(self):
+        """Load which guilds opted in (on start and after a restore)."""
+        self.enabled = set(await asyncio.to_thread(self.bot.database.get_auto_dispatch_guilds))
+
+    async def set_enabled(self, guild_id: int, enabled: bool):
+        """Turn automatic assignment on or off for a guild."""
+        await asyncio.to_thread(self.bot.database.set_auto_dispatch, guild_id, enabled)
+        if enabled:
+            self.enabled.add(guild_id)
+            # Transitions were not followed while off
+            self.rebuild_loads(guild_id)
+            return
+        self.enabled.discard(guild_id)
+        self.backlog.pop(guild_id, None)
+        for channel_id in list(self.pending):
+            channel = self.bot.get_channel(channel_id)
+            if channel is None or channel.guild.id == guild_id:
+                del self.pending[channel_id]
+
+    def _spawn(self, coro):
+        """Run a coroutine in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Error in auto-dispatch task: {task.exception()}")
+
+    def _open_claims(self, guild_id: int, user_id: int) -> int:
+        """Count a staff member's open claims from the in-memory claim tracker."""
+        return sum(
+            1 for activity in self.bot.perf_stats.active.values()
+            if activity.guild_id == guild_id and activity.claimer_id == user_id
+        )
+
+    def set_on_duty(self, guild_id: int, user_id: int, on_duty: bool):
+        """Add a staff member to, or remove them from, their guild's dispatch queue."""
+        queue = self.queues.setdefault(guild_id, StaffLoadQueue())
+        if on_duty:
+            queue.push(user_id, self._open_claims(guild_id, user_id))
+            self._schedule_drain(guild_id)
+        else:
+            queue.discard(user_id)
+
+    def rebuild_loads(self, guild_id: Optional[int] = None):
+        """Recount on-duty staff members' open claims (after claims are resumed on start)."""
+        for queue_guild_id, queue in self.queues.items():
+            if guild_id is not None and queue_guild_id != guild_id:
+                continue
+            for user_id, _ in queue.snapshot():
+                queue.push(user_id, self._open_claims(queue_guild_id, user_id))
+
+    async def _is_ticket_channel(self, channel) -> bool:
+        """Check whether a channel sits in one of its guild's explicitly allowed ticket categories."""
+        if not isinstance(channel, discord.TextChannel) or channel.category_id is None:
+            return False
+        config = await asyncio.to_thread(self.bot.database.get_guild_config, channel.guild.id)
+        if not config[0]:
+            return False
+        if channel.category_id == config[2]:
+            return True
+        return channel.category_id in await asyncio.to_thread(self.bot.database.get_allowed_categories, channel.guild.id)
+
+    async def on_channel_create(self, channel):
+        """Start tracking a new ticket channel."""
+        if channel.guild.id in self.enabled and await self._is_ticket_channel(channel):
+            self.pending[channel.id] = [now_ms(), None, None]
+
+    def on_message(self, message):
+        """Name the holder of a pending ticket from its first non-staff message."""
+        entry = self.pending.get(message.channel.id)
+        if entry is None or entry[1] is not None or message.guild is None:
+            return
+        self._spawn(self._identify_holder(message, entry))
+
+    async def _identify_holder(self, message, entry: list):
+        try:
+            staff_role_id = (await asyncio.to_thread(self.bot.database.get_guild_config, message.guild.id))[0]
+            if entry[1] is not None or self.bot.permissions.has_staff_role(message.author, staff_role_id):
+                return
+            entry[1] = message.author.id
+            await self.dispatch(message.channel)
+        except Exception as e:
+            logging.error(f"Error dispatching ticket in channel {message.channel.id}: {e}")
+
+    def forget(self, channel_id: int):
+        """Stop tracking a deleted channel."""
+        self.pending.pop(channel_id, None)
+
+    def _on_transition(self, channel, action: str, previous_claimer_id: Optional[int], claimer_id: Optional[int]):
+        """Keep staff loads in step with every claim and pick up tickets freed by staff timeouts."""
+        guild_id = channel.guild.id
+        if guild_id not in self.enabled:
+            return
+        queue = self.queues.get(guild_id)
+        if queue is not None:
+            if previous_claimer_id is not None:
+                queue.adjust(previous_claimer_id, -1)
+            if claimer_id is not None:
+                queue.adjust(claimer_id, 1)
+
+        if claimer_id is not None:
+            entry = self.pending.pop(channel.id, None)
+            if entry is not None:
+                kind = 'auto' if channel.id in self._assigning else 'manual'
+                self.time_to_claim[kind].add((now_ms() - entry[0]) / 1000)
+        elif action == 'staff_timeout':
+            self.pending[channel.id] = [now_ms(), None, previous_claimer_id]
+            self._spawn(self.dispatch(channel))
+        elif previous_claimer_id is not None:
+            # A staff member has room for another ticket
+            self._schedule_drain(guild_id)
+
+    def _lock(self, guild_id: int) -> asyncio.Lock:
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+    @traced('dispatch.assign', root=True)
+    async def dispatch(self, channel) -> Optional[int]:
+        """Assign a pending ticket to the least-loaded on-duty staff member. Returns who got it."""
+        entry = self.pending.get(channel.id)
+        if entry is None or channel.id in self._assigning:
+            return None
+        guild = channel.guild
+        database = self.bot.database
+        try:
+            if guild.id not in self.enabled:
+                return None
+
+            # One assignment at a time per guild, so each pick sees the previous one's load
+            async with self._lock(guild.id):
+                if channel.id not in self.pending:
+                    return None  # Claimed by hand while waiting
+                staff_role_id = (await asyncio.to_thread(database.get_guild_config, guild.id))[0]
+                staff_role = guild.get_role(staff_role_id) if staff_role_id else None
+                holder_id = entry[1] or await asyncio.to_thread(database.get_ticket_holder, channel.id)
+                if staff_role is None or holder_id is None:
+                    return None
+
+                # Overwrites need real members; without the members intent they are usually fetched
+                holder = await self.bot.permissions.resolve_member(guild, holder_id)
+                if holder is None:
+                    logging.info(f"Not dispatching channel {channel.id}: ticket holder left the guild")
+                    return None
+
+                queue = self.queues.get(guild.id)
+                exclude = {entry[2]} if entry[2] is not None else set()
+                while True:
+                    user_id = queue.least_loaded(AUTODISPATCH_MAX_LOAD, exclude) if queue else None
+                    if user_id is None:
+                        backlog = self.backlog.setdefault(guild.id, deque(maxlen=AUTODISPATCH_BACKLOG))
+                        if channel.id not in backlog:
+                            backlog.append(channel.id)
+                            self.counters['queued'] += 1
+                        return None
+                    staff_member = await self.bot.permissions.resolve_member(guild, user_id)
+                    if staff_member is not None:
+                        break
+                    queue.discard(user_id)  # Left the guild: off duty for good
+
+                state = await self.bot.tickets.get_state(channel.id)
+                action = 'reclaim' if state == TicketState.TIMED_OUT else 'claim'
+
+                self._assigning.add(channel.id)
+                try:
+                    await self.bot.tickets.claim(
+                        channel, staff_member, holder, staff_role, set_holder=action == 'claim', action=action,
+                        set_by=self.bot.user.id if self.bot.user else user_id
+                    )
+                except InvalidTransition:
+                    return None
+                finally:
+                    self._assigning.discard(channel.id)
+                # Rotate between staff with equal load
+                queue.adjust(user_id, 0, assigned_ms=now_ms())
+                self.counters['reassigned' if action == 'reclaim' else 'assigned'] += 1
+
+        except Exception as e:
+            self.counters['failed'] += 1
+            logging.error(f"Error auto-dispatching channel {channel.id}: {e}")
+            return None
+
+        embed = discord.Embed(
+            title="🤖 Ticket Auto-Assigned",
+            description=f"**Claimer:** <@{user_id}>\n**Ticket Holder:** <@{holder_id}>",
+            color=discord.Color.green()
+        )
+        embed.add_field(
+            name="⏰ Timeout Warning",
+            value="15 minutes of inactivity will trigger automatic timeout.",
+            inline=False
+        )
+        try:
+            await channel.send(content=f"<@{user_id}>", embed=embed)
+        except discord.HTTPException as e:
+            logging.warning(f"Could not announce auto-assignment in channel {channel.id}: {e}")
+        logging.info(f"Auto-dispatched channel {channel.id} to {user_id} ({action})")
+        return user_id
+
+    def _schedule_drain(self, guild_id: int):
+        if self.backlog.get(guild_id):
+            self._spawn(self.drain(guild_id))
+
+    async def drain(self, guild_id: int):
+        """Retry queued tickets of a guild until staff run out."""
+        backlog = self.backlog.get(guild_id)
+        for _ in range(len(backlog) if backlog else 0):
+            channel_id = backlog.popleft()
+            channel = self.bot.get_channel(channel_id)
+            if channel is None or channel_id not in self.pending:
+                continue
+            if await self.dispatch(channel) is None and channel_id in self.pending:
+                break  # Re-queued: nobody is free
+
+    def stats(self, guild_id: Optional[int] = None) -> dict:
+        """Get dispatch counters and time-to-claim percentiles (seconds)."""
+        time_to_claim = {
+            kind: {'count': sketch.count, 'p50': sketch.quantile(0.5), 'p90': sketch.quantile(0.9)}
+            for kind, sketch in self.time_to_claim.items()
+        }
+        stats = {**self.counters, 'pending': len(self.pending), 'time_to_claim': time_to_claim}
+        if guild_id is None:
+            stats['on_duty'] = sum(len(queue) for queue in self.queues.values())
+            stats['backlog'] = sum(len(backlog) for backlog in self.backlog.values())
+        else:
+            queue = self.queues.get(guild_id)
+            stats['on_duty'] = queue.snapshot() if queue else []
+            stats['backlog'] = len(self.backlog.get(guild_id, ()))
+        return stats
+
+    def export_state(self) -> dict:
+        """Export duty rosters and pending tickets in a JSON-serializable form."""
+        return {
+            'duty': {str(guild_id): [user_id for user_id, _ in queue.snapshot()] for guild_id, queue in self.queues.items()},
+            'pending': [[channel_id, *entry] for channel_id, entry in self.pending.items()],
+            'time_to_claim': {kind: sketch.to_dict() for kind, sketch in self.time_to_claim.items()}
+        }
+
+    def import_state(self, state: dict):
+        """Load state previously produced by export_state. Loads are recounted once claims resume."""
+        for guild_id, user_ids in state.get('duty', {}).items():
+            queue = self.queues.setdefault(int(guild_id), StaffLoadQueue())
+            for user_id in user_ids:
+                queue.push(user_id, 0)
+        for channel_id, since, holder_id, excluded in state.get('pending', []):
+            self.pending[channel_id] = [since, holder_id, excluded]
+        for kind, data in state.get('time_to_claim', {}).items():
+            self.time_to_claim[kind] = QuantileSketch.from_dict(data)
+
+    def clear_state(self):
+        """Drop rosters, pending tickets and time-to-claim sketches loaded by import_state."""
+        self.queues.clear()
+        self.pending.clear()
+        self.time_to_claim = {'auto': QuantileSketch(), 'manual': QuantileSketch()}
@@ -0,0 +1,132 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+from config import DATABASE_PATH, EXPORT_CHUNK_ROWS
+from timeutil import date_to_ms
+
+# Export name -> (table, date column used for range filters)
+EXPORT_TABLES = {
+    'claims': ('ticket_claims', 'claimed_at'),
+    'leaderboard': ('leaderboard', None),
+    'rollup': ('claim_daily_rollup', 'day')
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Date columns stored as UTC epoch milliseconds; date filters are converted to match
+EPOCH_MS_COLUMNS = {'claimed_at'}
+
+def parse_date(value: Optional[str]) -> Optional[str]:
+    """Validate a YYYY-MM-DD date filter."""
+    if value is None:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+
+def _text_columns(db_path: str, table: str) -> List[str]:
+    """List a table's columns, excluding BLOB columns."""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30.0)
+    try:
+        return [row[1] for row in conn.execute(f'PRAGMA table_info({table})') if row[2].upper() != 'BLOB']
+    finally:
+        conn.close()
+
+def export_table(db_path: str, name: str, out_path: str, fmt: str = 'csv', guild_id: Optional[int] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 chunk_size: int = EXPORT_CHUNK_ROWS) -> int:
+    """Stream a table into a gzip-compressed CSV/JSONL file. Returns the number of rows written.
+
+    Rows are read in rowid order, one fixed-size chunk per short read, so
+    memory stays flat and writers are only blocked while a chunk is read (the
+    database uses a rollback journal, so an open read blocks every commit).
+    Rows written during the export may or may not be included.
+    `since` is inclusive and `until` exclusive.
+    """
+    if name not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export '{name}', expected one of: {', '.join(EXPORT_TABLES)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}")
+
+    table, date_column = EXPORT_TABLES[name]
+    since, until = parse_date(since), parse_date(until)
+    if date_column in EPOCH_MS_COLUMNS:
+        since = date_to_ms(since) if since else None
+        until = date_to_ms(until) if until else None
+
+    conditions = []
+    params = []
+    if guild_id is not None:
+        conditions.append('guild_id = ?')
+        params.append(guild_id)
+    if date_column and since is not None:
+        conditions.append(f'{date_column} >= ?')
+        params.append(since)
+    if date_column and until is not None:
+        conditions.append(f'{date_column} < ?')
+        params.append(until)
+
+    # Binary columns (activity timelines) have no CSV/JSON form and are left out
+    columns = _text_columns(db_path, table)
+    conditions.append('rowid > ?')
+    query = (
+        f'SELECT rowid, {", ".join(columns)} FROM {table} WHERE {" AND ".join(conditions)} '
+        f'ORDER BY rowid LIMIT {int(chunk_size)}'
+    )
+
+    rows_written = 0
+    last_rowid = -1
+    # Autocommit: each chunk's read ends (and releases its shared lock) once fetched
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30.0, isolation_level=None)
+    try:
+        with gzip.open(out_path, 'wt', encoding='utf-8', newline='') as out:
+            if fmt == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(columns)
+
+            while True:
+                rows = conn.execute(query, (*params, last_rowid)).fetchall()
+                if not rows:
+                    break
+                last_rowid = rows[-1][0]
+                chunk = [row[1:] for row in rows]
+
+                if fmt == 'csv':
+                    writer.writerows(chunk)
+                else:
+                    buffer = io.StringIO()
+                    for row in chunk:
+                        buffer.write(json.dumps(dict(zip(columns, row)), separators=(',', ':')))
+                        buffer.write('\n')
+                    out.write(buffer.getvalue())
+
+                rows_written += len(chunk)
+    finally:
+        conn.close()
+
+    logging.info(f"Exported {rows_written} rows from {table} to {out_path}")
+    return rows_written
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ticket bot data to gzip-compressed CSV or JSONL.")
+    parser.add_argument('table', choices=list(EXPORT_TABLES))
+    parser.add_argument('-o', '--output', help="Output file (default: <table>.<format>.gz)")
+    parser.add_argument('-f', '--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--db', default=DATABASE_PATH)
+    parser.add_argument('--guild', type=int)
+    parser.add_argument('--since', help="Start date, inclusive (YYYY-MM-DD)")
+    parser.add_argument('--until', help="End date, exclusive (YYYY-MM-DD)")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    output = args.output or f"{args.table}.{args.format}.gz"
+    count = export_table(args.db, args.table, output, args.format, args.guild, args.since, args.until, args.chunk_size)
+    print(f"{count} rows written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+from timeutil import now_ms
+from config import (
+    INGEST_QUEUE_SIZE, INGEST_WORKERS, INGEST_BATCH_SIZE,
+    INGEST_OVERFLOW_POLICY, INGEST_OVERFLOW_MAX_KEYS
+)
+
+# created_at is UTC epoch milliseconds
+MessageEvent = namedtuple('MessageEvent', ['channel_id', 'user_id', 'created_at'])
+
+class MessageIngestion:
+    """Bounded queue between gateway message events and activity updates."""
+
+    def __init__(self, bot, maxsize: int = INGEST_QUEUE_SIZE, workers: int = INGEST_WORKERS,
+                 batch_size: int = INGEST_BATCH_SIZE, overflow_policy: str = INGEST_OVERFLOW_POLICY):
+        self.bot = bot
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.worker_count = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.overflow_policy = overflow_policy
+        self.workers: List[asyncio.Task] = []
+        # (channel_id, user_id) -> latest event that did not fit in the queue
+        self.overflow: Dict[Tuple[int, int], MessageEvent] = {}
+        self.counters = {
+            'enqueued': 0,
+            'processed': 0,
+            'batches': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'errors': 0
+        }
+
+    def start(self):
+        """Start the worker pool."""
+        if self.workers:
+            return
+        for index in range(self.worker_count):
+            self.workers.append(asyncio.create_task(self._worker(index)))
+        logging.info(f"Message ingestion started with {self.worker_count} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain pending events and stop the worker pool."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Message ingestion drain timed out with {self.queue.qsize()} events pending")
+
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        # Flush anything that was coalesced while the queue was full
+        if self.overflow:
+            pending = list(self.overflow.values())
+            self.overflow = {}
+            try:
+                await self._apply_batch(pending)
+            except Exception as e:
+                logging.error(f"Error flushing coalesced message events: {e}")
+
+        logging.info("Message ingestion stopped")
+
+    def submit(self, message):
+        """Queue a message event without blocking the gateway handler."""
+        event = MessageEvent(message.channel.id, message.author.id, now_ms())
+
+        try:
+            self.queue.put_nowait(event)
+            self.counters['enqueued'] += 1
+        except asyncio.QueueFull:
+            self._handle_overflow(event)
+
+    def _handle_overflow(self, event: MessageEvent):
+        """Apply the overflow policy to an event that did not fit in the queue."""
+        key = (event.channel_id, event.user_id)
+
+        if self.overflow_policy == "coalesce":
+            if key in self.overflow:
+                self.overflow[key] = event
+                self.counters['coalesced'] += 1
+                return
+            if len(self.overflow) < INGEST_OVERFLOW_MAX_KEYS:
+                self.overflow[key] = event
+                return
+
+        self.counters['dropped'] += 1
+        if self.counters['dropped'] == 1 or self.counters['dropped'] % 1000 == 0:
+            logging.warning(f"Message ingestion queue full, {self.counters['dropped']} events dropped so far")
+
+    async def _worker(self, index: int):
+        """Consume events from the queue in batches."""
+        while True:
+            event = await self.queue.get()
+            batch = [event]
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            taken = len(batch)
+            if self.overflow:
+                batch.extend(self.overflow.values())
+                self.overflow = {}
+
+            try:
+                await self._apply_batch(batch)
+            except Exception as e:
+                self.counters['errors'] += 1
+                logging.error(f"Error in message ingestion worker {index}: {e}")
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+
+    async def _apply_batch(self, batch: List[MessageEvent]):
+        """Apply a batch of message events as activity updates."""
+        # Response-time tracking and timelines need every event, in order
+        for event in sorted(batch, key=lambda e: e.created_at):
+            self.bot.perf_stats.observe(event.channel_id, event.user_id, event.created_at / 1000)
+            self.bot.timelines.observe(event.channel_id, event.user_id, event.created_at)
+
+        # Only the latest message per (channel, user) matters for last-message tracking
+        latest: Dict[Tuple[int, int], MessageEvent] = {}
+        for event in batch:
+            key = (event.channel_id, event.user_id)
+            current = latest.get(key)
+            if current is None or event.created_at > current.created_at:
+                latest[key] = event
+
+        await asyncio.to_thread(
+            self.bot.database.update_last_messages,
+            [(e.channel_id, e.user_id, e.created_at) for e in latest.values()]
+        )
+
+        self.counters['processed'] += len(batch)
+        self.counters['batches'] += 1
+
+    @property
+    def depth(self) -> int:
+        """Number of events waiting to be applied."""
+        return self.queue.qsize() + len(self.overflow)
+
+    def stats(self) -> dict:
+        """Get queue depth and counters."""
+        return {
+            'depth': self.depth,
+            'capacity': self.queue.maxsize,
+            'workers': len(self.workers),
+            **self.counters
+        }
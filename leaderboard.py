@@ -1,89 +1,406 @@
+import asyncio
 import discord
+import hashlib
+import heapq
+import json
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Tuple
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from config import LEADERBOARD_CACHE_SIZE, LEADERBOARD_CURSOR_TTL, LEADERBOARD_VIEW_STATE_MAX, LEADERBOARD_LIVE_WINDOW
+
+MEDALS = ["🥇", "🥈", "🥉"]
+PERIODS = ["daily", "weekly", "total"]
+ITEMS_PER_PAGE = 10
+
+class LeaderboardCursor:
+    """Short-lived, already-sorted leaderboard rows for one guild."""
+
+    def __init__(self, guild_id: int, version: tuple, rows: List[Tuple[int, int, int, int]]):
+        self.guild_id = guild_id
+        self.version = version
+        self.created_at = time.monotonic()
+        self.rows: Dict[str, List[Tuple[int, int]]] = {}
+        for index, period in enumerate(PERIODS, start=1):
+            ranked = [(row[0], row[index]) for row in rows if row[index] > 0]
+            ranked.sort(key=lambda r: (-r[1], r[0]))
+            self.rows[period] = ranked
+        self.names: Dict[int, str] = {}  # User ID -> resolved display name
+
+    def is_valid(self, version: tuple) -> bool:
+        """Check whether the cursor can still be used without reloading."""
+        return version == self.version and time.monotonic() - self.created_at < LEADERBOARD_CURSOR_TTL
+
+class LeaderboardView(discord.ui.View):
+    """Prev/next/period buttons that edit a leaderboard message in place."""
+
+    def __init__(self, leaderboard, period: str = "total", page: int = 1, total_pages: Optional[int] = None):
+        super().__init__(timeout=None)
+        self.leaderboard = leaderboard
+
+        if total_pages is not None:
+            self.prev_page.disabled = page <= 1
+            self.next_page.disabled = page >= total_pages
+        for button, button_period in ((self.daily, "daily"), (self.weekly, "weekly"), (self.total, "total")):
+            if button_period == period:
+                button.style = discord.ButtonStyle.primary
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary, custom_id="lb:prev")
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.leaderboard.handle_view_interaction(interaction, "prev")
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary, custom_id="lb:next")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.leaderboard.handle_view_interaction(interaction, "next")
+
+    @discord.ui.button(label="Daily", style=discord.ButtonStyle.secondary, custom_id="lb:daily")
+    async def daily(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.leaderboard.handle_view_interaction(interaction, "daily")
+
+    @discord.ui.button(label="Weekly", style=discord.ButtonStyle.secondary, custom_id="lb:weekly")
+    async def weekly(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.leaderboard.handle_view_interaction(interaction, "weekly")
+
+    @discord.ui.button(label="Total", style=discord.ButtonStyle.secondary, custom_id="lb:total")
+    async def total(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.leaderboard.handle_view_interaction(interaction, "total")
 
 class Leaderboard:
     def __init__(self, bot, database):
         self.bot = bot
         self.database = database
+        # (guild_id, kind, period, page) -> (score version, rendered result)
+        self.render_cache: OrderedDict = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.cache_stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        # Button pagination state
+        self.cursors: Dict[int, LeaderboardCursor] = {}  # Guild ID -> cursor
+        self.view_state: OrderedDict = OrderedDict()  # Message ID -> (period, page, group or None)
+        self.groups: Dict[str, Tuple[int, ...]] = {}  # Group name -> member guild IDs
+        # Persistent leaderboard messages
+        self.live_hashes: Dict[int, str] = {}  # Guild ID -> hash of the content last sent
+        self._live_pending: Dict[Optional[int], asyncio.TimerHandle] = {}  # Guild ID (None = all) -> scheduled edit
+        self._live_tasks = set()
+        self._live_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def export_state(self) -> dict:
+        """Export pagination state in a JSON-serializable form."""
+        return {'view_state': [[message_id, period, page, group] for message_id, (period, page, group) in self.view_state.items()]}
+
+    def import_state(self, state: dict):
+        """Load pagination state previously produced by export_state."""
+        # Older snapshots have no group column
+        for entry in state.get('view_state', []):
+            self._remember_view(*entry)
+
+    def _remember_view(self, message_id: int, period: str, page: int, group: Optional[str] = None):
+        """Record which page a leaderboard message is showing."""
+        self.view_state[message_id] = (period, page, group)
+        self.view_state.move_to_end(message_id)
+        while len(self.view_state) > LEADERBOARD_VIEW_STATE_MAX:
+            self.view_state.popitem(last=False)
+
+    async def reset_daily_scores(self):
+        """Reset daily scores for every guild."""
+        await asyncio.to_thread(self.database.reset_daily_leaderboard)
+
+    async def reset_weekly_scores(self):
+        """Reset weekly scores for every guild."""
+        await asyncio.to_thread(self.database.reset_weekly_leaderboard)
+
+    async def _get_rendered(self, key: tuple, render, version_of=None):
+        """Get a rendered embed from cache, coalescing concurrent identical renders.
+
+        Entries are keyed by guild and versioned by its score version unless
+        version_of supplies another version (e.g. for a group of guilds).
+        """
+        version_of = version_of or (lambda: self.database.get_score_version(key[0]))
+        version = version_of()
+
+        cached = self.render_cache.get(key)
+        if cached and cached[0] == version:
+            self.render_cache.move_to_end(key)
+            self.cache_stats['hits'] += 1
+            return cached[1]
+
+        inflight_key = (key, version)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            self.cache_stats['misses'] += 1
+            task = asyncio.create_task(render())
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda t: self._store_rendered(key, version, t, version_of))
+        else:
+            self.cache_stats['coalesced'] += 1
+
+        # Shield so one cancelled caller doesn't cancel the render for everyone waiting
+        return await asyncio.shield(task)
+
+    def _store_rendered(self, key: tuple, version: tuple, task: asyncio.Task, version_of):
+        """Cache a finished render if it is still current."""
+        self._inflight.pop((key, version), None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if version_of() != version:
+            return
+
+        self.render_cache[key] = (version, task.result())
+        self.render_cache.move_to_end(key)
+        while len(self.render_cache) > LEADERBOARD_CACHE_SIZE:
+            self.render_cache.popitem(last=False)
+
+    async def _resolve_display(self, guild, user_id: int, names: Optional[Dict[int, str]] = None) -> str:
+        """Resolve a user ID to a display string."""
+        if names is not None and user_id in names:
+            return names[user_id]
+
+        display = await self._fetch_display(guild, user_id)
+        if names is not None:
+            names[user_id] = display
+        return display
+
+    async def _fetch_display(self, guild, user_id: int) -> str:
+        """Look up a user's display string from cache or the API."""
+        user = guild.get_member(user_id) if guild else None
+        if not user:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except:
+                user = None
+
+        if user:
+            return f"@{user.display_name if hasattr(user, 'display_name') else user.name}"
+        return "Unknown User"
 
     async def send_leaderboard(self, channel, period: str = "total", page: int = 1):
-        """Send leaderboard to a channel with pagination."""
+        """Send leaderboard to a channel with pagination buttons."""
         try:
-            guild_id = channel.guild.id
             guild = channel.guild
-            
-            # Get leaderboard data
-            leaderboard_data = self.database.get_leaderboard(guild_id, period)
-            
-            if not leaderboard_data:
-                embed = discord.Embed(
-                    title=f"🏆 {period.title()} Leaderboard",
-                    description="No data available yet. Start claiming tickets to appear on the leaderboard!",
-                    color=discord.Color.blue()
+            embed, page, total_pages = await self._get_rendered(
+                (guild.id, 'page', period, page),
+                lambda: self._render_leaderboard_page(guild, period, page)
+            )
+            view = LeaderboardView(self, period, page, total_pages)
+            message = await channel.send(embed=embed, view=view)
+            self._remember_view(message.id, period, page)
+            logging.info(f"Leaderboard sent to channel {channel.id}, period: {period}, page: {page}")
+
+        except Exception as e:
+            logging.error(f"Error sending leaderboard: {e}")
+            await channel.send("❌ An error occurred while fetching the leaderboard.")
+
+    async def handle_view_interaction(self, interaction: discord.Interaction, action: str):
+        """Flip a leaderboard message to another page or period using the cached cursor."""
+        try:
+            guild = interaction.guild
+            message_id = interaction.message.id
+            state = self.view_state.get(message_id)
+            if state is None:
+                # Forgotten (evicted or cold start): guessing could page the wrong period or scope
+                await interaction.response.send_message(
+                    "⌛ This leaderboard has expired. Run the command again for a fresh one.", ephemeral=True
                 )
-                await channel.send(embed=embed)
                 return
+            period, page, group = state
 
-            # Pagination
-            items_per_page = 10
-            total_pages = (len(leaderboard_data) + items_per_page - 1) // items_per_page
-            page = max(1, min(page, total_pages))
-            
-            start_idx = (page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            page_data = leaderboard_data[start_idx:end_idx]
+            if action == "prev":
+                page -= 1
+            elif action == "next":
+                page += 1
+            else:
+                period, page = action, 1
 
-            # Create embed
+            if group is not None:
+                embed, page, total_pages = await self._get_global_embed(group, period, page)
+            else:
+                cursor = await self._get_cursor(guild.id)
+                embed, page, total_pages = await self._build_page_embed(
+                    guild, period, page, cursor.rows[period], cursor.names
+                )
+            self._remember_view(message_id, period, page, group)
+            await interaction.response.edit_message(embed=embed, view=LeaderboardView(self, period, page, total_pages))
+
+        except Exception as e:
+            logging.error(f"Error handling leaderboard button: {e}")
+            if not interaction.response.is_done():
+                await interaction.response.send_message("❌ An error occurred while updating the leaderboard.", ephemeral=True)
+
+    async def _get_cursor(self, guild_id: int) -> LeaderboardCursor:
+        """Get a guild's sorted rows, reusing the cursor while scores are unchanged."""
+        version = self.database.get_score_version(guild_id)
+        cursor = self.cursors.get(guild_id)
+        if cursor is None or not cursor.is_valid(version):
+            self.prune_cursors()
+            rows = await asyncio.to_thread(self.database.get_leaderboard_rows, guild_id)
+            cursor = LeaderboardCursor(guild_id, version, rows)
+            self.cursors[guild_id] = cursor
+        return cursor
+
+    def prune_cursors(self):
+        """Drop cursors that have outlived their TTL."""
+        for guild_id, cursor in list(self.cursors.items()):
+            if time.monotonic() - cursor.created_at >= LEADERBOARD_CURSOR_TTL:
+                del self.cursors[guild_id]
+
+    async def get_group_guilds(self, group: str) -> Tuple[int, ...]:
+        """Get a leaderboard group's member guilds."""
+        members = self.groups.get(group)
+        if members is None:
+            members = tuple(await asyncio.to_thread(self.database.get_group_guilds, group))
+            self.groups[group] = members
+        return members
+
+    async def set_guild_group(self, guild_id: int, group: Optional[str]):
+        """Move a guild into a leaderboard group, or out of its group with None."""
+        await asyncio.to_thread(self.database.set_guild_group, guild_id, group)
+        self.groups.clear()
+
+    def _group_version(self, members: Tuple[int, ...]) -> tuple:
+        """Version of a group's combined ranking: its members and their score versions."""
+        return members, tuple(self.database.get_score_version(guild_id) for guild_id in members)
+
+    @staticmethod
+    def _merge_keys(cursor: LeaderboardCursor, period: str):
+        """Yield one guild's ranking as merge keys, in the order the cursor already holds."""
+        guild_id = cursor.guild_id
+        for user_id, claims in cursor.rows[period]:
+            yield -claims, user_id, guild_id
+
+    async def get_global_page(self, group: str, period: str = "total", page: int = 1):
+        """Get one page of a group's combined ranking.
+
+        Returns (entries, page, total_pages, total_entries) where entries are
+        (rank, guild_id, user_id, claims). Each guild's rows are already sorted,
+        so a heap merge only walks as far as the requested page.
+        """
+        members = await self.get_group_guilds(group)
+        cursors = await asyncio.gather(*(self._get_cursor(guild_id) for guild_id in members))
+
+        total_entries = sum(len(cursor.rows[period]) for cursor in cursors)
+        total_pages = max(1, (total_entries + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
+        page = max(1, min(page, total_pages))
+        start_idx = (page - 1) * ITEMS_PER_PAGE
+
+        merged = heapq.merge(*(self._merge_keys(cursor, period) for cursor in cursors))
+        entries = [
+            (rank, guild_id, user_id, -negated_claims)
+            for rank, (negated_claims, user_id, guild_id)
+            in enumerate(islice(merged, start_idx, start_idx + ITEMS_PER_PAGE), start=start_idx + 1)
+        ]
+        return entries, page, total_pages, total_entries
+
+    async def _get_global_embed(self, group: str, period: str, page: int):
+        """Get a group leaderboard page embed, cached until a member guild's scores change."""
+        members = await self.get_group_guilds(group)
+        return await self._get_rendered(
+            ('global', group, period, page),
+            lambda: self._render_global_page(group, period, page),
+            lambda: self._group_version(members)
+        )
+
+    async def _render_global_page(self, group: str, period: str, page: int):
+        """Build a group leaderboard embed. Returns (embed, page, total_pages)."""
+        entries, page, total_pages, total_entries = await self.get_global_page(group, period, page)
+        if not entries:
             embed = discord.Embed(
-                title=f"🏆 {period.title()} Leaderboard - Page {page}/{total_pages}",
-                color=discord.Color.gold()
+                title=f"🌐 {period.title()} Global Leaderboard",
+                description="No data available yet across this server group.",
+                color=discord.Color.blue()
             )
+            return embed, 1, 1
 
-            # Add leaderboard entries with user display names
-            for i, (user_id, claims) in enumerate(page_data, start=start_idx + 1):
-                # Get user object with better fetching
-                user = guild.get_member(user_id)
-                if not user:
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                    except:
-                        user = None
-
-                if user:
-                    user_display = f"@{user.display_name if hasattr(user, 'display_name') else user.name}"
-                else:
-                    user_display = f"Unknown User"
-                
-                # Determine medal/emoji
-                if i == 1:
-                    medal = "🥇"
-                elif i == 2:
-                    medal = "🥈"
-                elif i == 3:
-                    medal = "🥉"
-                else:
-                    medal = f"{i}."
-
-                embed.add_field(
-                    name=f"{medal} {user_display}",
-                    value=f"{claims} claims",
-                    inline=False
-                )
+        embed = discord.Embed(
+            title=f"🌐 {period.title()} Global Leaderboard - Page {page}/{total_pages}",
+            color=discord.Color.gold()
+        )
+        for rank, guild_id, user_id, claims in entries:
+            guild = self.bot.get_guild(guild_id)
+            cursor = self.cursors.get(guild_id)
+            user_display = await self._resolve_display(guild, user_id, cursor.names if cursor else None)
+            medal = MEDALS[rank - 1] if rank <= len(MEDALS) else f"{rank}."
+            embed.add_field(
+                name=f"{medal} {user_display}",
+                value=f"{claims} claims • {guild.name if guild else 'Unknown Server'}",
+                inline=False
+            )
 
-            # Add pagination info
-            if total_pages > 1:
-                embed.set_footer(text=f"Page {page}/{total_pages} • Use ?lb {period} {page+1} for next page")
-            else:
-                embed.set_footer(text=f"Total entries: {len(leaderboard_data)}")
+        members = await self.get_group_guilds(group)
+        embed.set_footer(text=f"Group '{group}' • {total_entries} entries across {len(members)} servers")
+        return embed, page, total_pages
 
-            await channel.send(embed=embed)
-            logging.info(f"Leaderboard sent to channel {channel.id}, period: {period}, page: {page}")
+    async def send_global_leaderboard(self, channel, period: str = "total", page: int = 1):
+        """Send the combined leaderboard of the channel's guild group."""
+        try:
+            group = await asyncio.to_thread(self.database.get_guild_group, channel.guild.id)
+            if group is None:
+                await channel.send("❌ This server isn't part of a leaderboard group.")
+                return
+
+            embed, page, total_pages = await self._get_global_embed(group, period, page)
+            view = LeaderboardView(self, period, page, total_pages)
+            message = await channel.send(embed=embed, view=view)
+            self._remember_view(message.id, period, page, group)
+            logging.info(f"Global leaderboard for group {group} sent to channel {channel.id}, period: {period}, page: {page}")
 
         except Exception as e:
-            logging.error(f"Error sending leaderboard: {e}")
-            await channel.send("❌ An error occurred while fetching the leaderboard.")
+            logging.error(f"Error sending global leaderboard: {e}")
+            await channel.send("❌ An error occurred while fetching the global leaderboard.")
+
+    async def _render_leaderboard_page(self, guild, period: str, page: int):
+        """Build the leaderboard embed for one page from the database."""
+        # Get leaderboard data
+        leaderboard_data = await asyncio.to_thread(self.database.get_leaderboard, guild.id, period)
+        return await self._build_page_embed(guild, period, page, leaderboard_data)
+
+    async def _build_page_embed(self, guild, period: str, page: int, leaderboard_data: List[Tuple[int, int]],
+                                names: Optional[Dict[int, str]] = None):
+        """Build a page embed from sorted rows. Returns (embed, page, total_pages)."""
+        if not leaderboard_data:
+            embed = discord.Embed(
+                title=f"🏆 {period.title()} Leaderboard",
+                description="No data available yet. Start claiming tickets to appear on the leaderboard!",
+                color=discord.Color.blue()
+            )
+            return embed, 1, 1
+
+        # Pagination
+        total_pages = (len(leaderboard_data) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
+        page = max(1, min(page, total_pages))
+        
+        start_idx = (page - 1) * ITEMS_PER_PAGE
+        end_idx = start_idx + ITEMS_PER_PAGE
+        page_data = leaderboard_data[start_idx:end_idx]
+
+        # Create embed
+        embed = discord.Embed(
+            title=f"🏆 {period.title()} Leaderboard - Page {page}/{total_pages}",
+            color=discord.Color.gold()
+        )
+
+        # Add leaderboard entries with user display names
+        for i, (user_id, claims) in enumerate(page_data, start=start_idx + 1):
+            user_display = await self._resolve_display(guild, user_id, names)
+            
+            # Determine medal/emoji
+            medal = MEDALS[i - 1] if i <= len(MEDALS) else f"{i}."
+
+            embed.add_field(
+                name=f"{medal} {user_display}",
+                value=f"{claims} claims",
+                inline=False
+            )
+
+        # Add pagination info
+        if total_pages > 1:
+            embed.set_footer(text=f"Page {page}/{total_pages} • Use the buttons below to change page")
+        else:
+            embed.set_footer(text=f"Total entries: {len(leaderboard_data)}")
+
+        return embed, page, total_pages
 
     async def send_user_stats(self, channel, user: discord.Member):
         """Send detailed statistics for a specific user."""
@@ -163,118 +480,148 @@ class Leaderboard:
             logging.error(f"Error sending user stats: {e}")
             await channel.send("❌ An error occurred while fetching user statistics.")
 
-    async def update_leaderboard_channels(self):
-        """Update all configured leaderboard channels."""
+    def start_live_updates(self):
+        """Edit persistent leaderboard messages whenever scores change. Call from the event loop."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.database.score_listeners.append(self._on_score_change)
+        self._schedule_live_update(None, delay=0)
+
+    def stop_live_updates(self):
+        """Stop listening for score changes and drop scheduled edits."""
+        if self._on_score_change in self.database.score_listeners:
+            self.database.score_listeners.remove(self._on_score_change)
+        for handle in self._live_pending.values():
+            handle.cancel()
+        self._live_pending.clear()
+        self._loop = None
+
+    def _on_score_change(self, guild_id: Optional[int]):
+        """Score listener; may run in a database worker thread."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._schedule_live_update, guild_id)
+
+    def _schedule_live_update(self, guild_id: Optional[int], delay: float = LEADERBOARD_LIVE_WINDOW):
+        """Debounce: the first change in a window schedules one edit at its end; later ones join it."""
+        if self._loop is None or guild_id in self._live_pending or None in self._live_pending:
+            return
+        self._live_pending[guild_id] = self._loop.call_later(delay, self._run_live_update, guild_id)
+
+    def _run_live_update(self, guild_id: Optional[int]):
+        """Timer callback starting a scheduled edit."""
+        self._live_pending.pop(guild_id, None)
+        task = asyncio.create_task(self.update_leaderboard_channels(guild_id))
+        self._live_tasks.add(task)
+        task.add_done_callback(self._live_tasks.discard)
+
+    async def update_leaderboard_channels(self, guild_id: Optional[int] = None):
+        """Edit the persistent message in configured leaderboard channels (one guild, or all)."""
         try:
-            channels = self.database.get_all_leaderboard_channels()
-            
-            for guild_id, channel_id in channels:
-                try:
-                    guild = self.bot.get_guild(guild_id)
-                    if not guild:
-                        continue
-                        
-                    channel = guild.get_channel(channel_id)
-                    if not channel:
-                        logging.warning(f"Leaderboard channel {channel_id} not found in guild {guild_id}")
-                        continue
-                    
-                    await self.send_leaderboard(channel, "daily")
-                    logging.info(f"Updated leaderboard for guild {guild_id}")
-                    
-                except Exception as e:
-                    logging.error(f"Error updating leaderboard for guild {guild_id}: {e}")
-                    
+            async with self._live_lock:
+                boards = await asyncio.to_thread(self.database.get_live_leaderboards, guild_id)
+                for board_guild_id, channel_id, message_id in boards:
+                    try:
+                        await self._update_live_message(board_guild_id, channel_id, message_id)
+                    except Exception as e:
+                        logging.error(f"Error updating leaderboard for guild {board_guild_id}: {e}")
+
         except Exception as e:
             logging.error(f"Error in update_leaderboard_channels: {e}")
 
+    async def _update_live_message(self, guild_id: int, channel_id: int, message_id: Optional[int]):
+        """Render the daily leaderboard and edit it into the guild's persistent message if it changed."""
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return
+
+        channel = guild.get_channel(channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            logging.warning(f"Leaderboard channel {channel_id} not found or invalid in guild {guild_id}, cleaning up config")
+            await asyncio.to_thread(self.database.clear_leaderboard_channel, guild_id)
+            self.live_hashes.pop(guild_id, None)
+            return
+
+        embed, page, total_pages = await self._get_rendered(
+            (guild.id, 'page', "daily", 1),
+            lambda: self._render_leaderboard_page(guild, "daily", 1)
+        )
+        content_hash = hashlib.sha256(
+            json.dumps([embed.to_dict(), page, total_pages], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        if message_id is not None and self.live_hashes.get(guild_id) == content_hash:
+            return
+
+        view = LeaderboardView(self, "daily", page, total_pages)
+        if message_id is not None:
+            try:
+                # Partial message: edited without fetching it first
+                await channel.get_partial_message(message_id).edit(embed=embed, view=view)
+            except discord.NotFound:
+                message_id = None
+
+        if message_id is None:
+            message = await channel.send(embed=embed, view=view)
+            message_id = message.id
+            await asyncio.to_thread(self.database.set_leaderboard_message, guild_id, message_id)
+            logging.info(f"Posted persistent leaderboard message {message_id} in channel {channel_id}")
+
+        self.live_hashes[guild_id] = content_hash
+        self._remember_view(message_id, "daily", page)
+
     async def send_leaderboard_summary(self, channel):
         """Send a summary of all leaderboard periods."""
         try:
-            guild_id = channel.guild.id
             guild = channel.guild
-            
-            # Get data for all periods
-            daily_data = self.database.get_leaderboard(guild_id, "daily")
-            weekly_data = self.database.get_leaderboard(guild_id, "weekly") 
-            total_data = self.database.get_leaderboard(guild_id, "total")
-            
-            embed = discord.Embed(
-                title="🏆 Leaderboard Summary",
-                color=discord.Color.gold()
+            cached = await self._get_rendered(
+                (guild.id, 'summary', None, None),
+                lambda: self._render_summary(guild)
             )
-            
-            # Daily top 3
-            daily_top = daily_data[:3] if daily_data else []
-            daily_text = ""
-            for i, (user_id, claims) in enumerate(daily_top, 1):
-                user = guild.get_member(user_id)
-                if not user:
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                    except:
-                        user = None
-
-                if user:
-                    user_display = f"@{user.display_name if hasattr(user, 'display_name') else user.name}"
-                else:
-                    user_display = f"Unknown User"
-                medal = ["🥇", "🥈", "🥉"][i-1]
-                daily_text += f"{medal} {user_display} - {claims}\n"
-            
-            if daily_text:
-                embed.add_field(name="📅 Daily Top 3", value=daily_text, inline=True)
-            
-            # Weekly top 3
-            weekly_top = weekly_data[:3] if weekly_data else []
-            weekly_text = ""
-            for i, (user_id, claims) in enumerate(weekly_top, 1):
-                user = guild.get_member(user_id)
-                if not user:
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                    except:
-                        user = None
-
-                if user:
-                    user_display = f"@{user.display_name if hasattr(user, 'display_name') else user.name}"
-                else:
-                    user_display = f"Unknown User"
-                medal = ["🥇", "🥈", "🥉"][i-1]
-                weekly_text += f"{medal} {user_display} - {claims}\n"
-            
-            if weekly_text:
-                embed.add_field(name="📊 Weekly Top 3", value=weekly_text, inline=True)
-            
-            # Total top 3
-            total_top = total_data[:3] if total_data else []
-            total_text = ""
-            for i, (user_id, claims) in enumerate(total_top, 1):
-                user = guild.get_member(user_id)
-                if not user:
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                    except:
-                        user = None
-
-                if user:
-                    user_display = f"@{user.display_name if hasattr(user, 'display_name') else user.name}"
-                else:
-                    user_display = f"Unknown User"
-                medal = ["🥇", "🥈", "🥉"][i-1]
-                total_text += f"{medal} {user_display} - {claims}\n"
-            
-            if total_text:
-                embed.add_field(name="🏆 All-Time Top 3", value=total_text, inline=True)
-            
-            if not any([daily_text, weekly_text, total_text]):
-                embed.description = "No leaderboard data available yet!"
-            
+            # The cached embed is shared; stamp the time on a copy
+            embed = discord.Embed.from_dict(cached.to_dict())
             embed.set_footer(text=f"Updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-            
             await channel.send(embed=embed)
             logging.info(f"Leaderboard summary sent to channel {channel.id}")
             
         except Exception as e:
             logging.error(f"Error sending leaderboard summary: {e}")
             await channel.send("❌ An error occurred while fetching the leaderboard summary.")
+
+    async def _render_top(self, guild, rows: List[Tuple[int, int]]) -> str:
+        """Format the top 3 rows of a leaderboard."""
+        text = ""
+        for i, (user_id, claims) in enumerate(rows[:3], 1):
+            user_display = await self._resolve_display(guild, user_id)
+            text += f"{MEDALS[i-1]} {user_display} - {claims}\n"
+        return text
+
+    async def _render_summary(self, guild) -> discord.Embed:
+        """Build the summary embed for all leaderboard periods."""
+        # Get data for all periods
+        daily_data = await asyncio.to_thread(self.database.get_leaderboard, guild.id, "daily")
+        weekly_data = await asyncio.to_thread(self.database.get_leaderboard, guild.id, "weekly")
+        total_data = await asyncio.to_thread(self.database.get_leaderboard, guild.id, "total")
+        
+        embed = discord.Embed(
+            title="🏆 Leaderboard Summary",
+            color=discord.Color.gold()
+        )
+        
+        daily_text = await self._render_top(guild, daily_data)
+        if daily_text:
+            embed.add_field(name="📅 Daily Top 3", value=daily_text, inline=True)
+        
+        weekly_text = await self._render_top(guild, weekly_data)
+        if weekly_text:
+            embed.add_field(name="📊 Weekly Top 3", value=weekly_text, inline=True)
+        
+        total_text = await self._render_top(guild, total_data)
+        if total_text:
+            embed.add_field(name="🏆 All-Time Top 3", value=total_text, inline=True)
+        
+        if not any([daily_text, weekly_text, total_text]):
+            embed.description = "No leaderboard data available yet!"
+        
+        # The "Updated" footer is added per send, so the cached embed stays valid until scores change
+        return embed
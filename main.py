@@ -1,11 +1,12 @@
+# Imported first so startup timings are measured from here
+from startup import profiler
 import os
 import asyncio
 import logging
-import threading
-import time
-from flask import Flask
 from bot import TicketBot
 
+profiler.mark('imports')
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,21 +17,6 @@ logging.basicConfig(
     ]
 )
 
-# Minimal Flask app to bind a port (required for Render Web Service)
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return 'Bot is running!'
-
-@app.route('/health')
-def health():
-    return 'OK', 200
-
-def run_flask():
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
-
 async def start_bot_with_retry():
     """Starts the Discord bot with retry logic for rate limiting."""
     bot_token = os.getenv('DISCORD_TOKEN')
@@ -39,6 +25,17 @@ async def start_bot_with_retry():
         logging.error("ERROR: DISCORD_TOKEN not found in environment variables")
         return
 
+    # Bind the port first (required for Render Web Service); it serves every login attempt
+    from webserver import StatusServer
+    server = StatusServer()
+    await server.start()
+    try:
+        await _run_bot(bot_token, server)
+    finally:
+        await server.stop()
+
+async def _run_bot(bot_token: str, server):
+    """Run the bot, retrying logins that hit Discord rate limits."""
     retry_count = 0
     max_retries = 3
     
@@ -46,6 +43,7 @@ async def start_bot_with_retry():
         try:
             logging.info(f"Starting Discord bot... (Attempt {retry_count + 1})")
             bot = TicketBot()
+            server.attach(bot)
             await bot.start(bot_token)
             break  # If successful, break out of loop
             
@@ -77,11 +75,6 @@ def main():
         logging.error("DISCORD_TOKEN environment variable not set!")
         return
 
-    logging.info("Starting Flask web server...")
-    # Start Flask app in a background thread
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-
     logging.info("Starting Discord bot with retry logic...")
     try:
         asyncio.run(start_bot_with_retry())
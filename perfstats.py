@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from sketches import QuantileSketch
+from timeutil import now_ms
+
+METRICS = {
+    'first_response': "First response after claim",
+    'turn_response': "Turn response time",
+    'claim_duration': "Claim duration"
+}
+
+# Stored user ID of a guild's rollup sketch
+GUILD_ROLLUP = 0
+
+class _ClaimActivity:
+    """Per-channel state needed to turn message events into latencies."""
+    __slots__ = ('guild_id', 'claimer_id', 'holder_id', 'claimed_at', 'responded', 'waiting_since')
+
+    def __init__(self, guild_id: int, claimer_id: int, holder_id: int, claimed_at: float):
+        self.guild_id = guild_id
+        self.claimer_id = claimer_id
+        self.holder_id = holder_id
+        self.claimed_at = claimed_at
+        self.responded = False
+        self.waiting_since: Optional[float] = None  # Oldest holder message still awaiting a staff reply
+
+class ResponseTimeTracker:
+    """Streaming response-time quantiles per staff member and per guild.
+
+    Sketches are kept in memory and flushed to the database; only the
+    in-flight claims go through the shutdown snapshot.
+    """
+
+    def __init__(self):
+        self.active: Dict[int, _ClaimActivity] = {}  # Channel ID -> activity
+        self.staff_sketches: Dict[Tuple[int, int, str], QuantileSketch] = {}  # (guild, user, metric)
+        self.guild_sketches: Dict[Tuple[int, str], QuantileSketch] = {}  # (guild, metric)
+        self.dirty: Set[Tuple[int, int, str]] = set()  # (guild, user or GUILD_ROLLUP, metric) not yet flushed
+
+    def track_claim(self, channel_id: int, guild_id: int, claimer_id: int, holder_id: int,
+                    claimed_at: Optional[float] = None):
+        """Start tracking a claimed ticket."""
+        self.active[channel_id] = _ClaimActivity(
+            guild_id, claimer_id, holder_id, claimed_at if claimed_at is not None else now_ms() / 1000
+        )
+
+    def is_tracking(self, channel_id: int) -> bool:
+        """Check whether a channel's claim is being tracked."""
+        return channel_id in self.active
+
+    def observe(self, channel_id: int, user_id: int, sent_at: float):
+        """Feed a message event from a tracked ticket."""
+        activity = self.active.get(channel_id)
+        if activity is None:
+            return
+
+        if user_id == activity.holder_id and user_id != activity.claimer_id:
+            if activity.waiting_since is None:
+                activity.waiting_since = sent_at
+        elif user_id == activity.claimer_id:
+            if not activity.responded:
+                activity.responded = True
+                self.record(activity.guild_id, user_id, 'first_response', sent_at - activity.claimed_at)
+            if activity.waiting_since is not None:
+                self.record(activity.guild_id, user_id, 'turn_response', sent_at - activity.waiting_since)
+                activity.waiting_since = None
+
+    def end_claim(self, channel_id: int, ended_at: Optional[float] = None):
+        """Stop tracking a claim and record its duration."""
+        activity = self.active.pop(channel_id, None)
+        if activity is None:
+            return
+
+        ended_at = ended_at if ended_at is not None else now_ms() / 1000
+        self.record(activity.guild_id, activity.claimer_id, 'claim_duration', ended_at - activity.claimed_at)
+
+    def record(self, guild_id: int, user_id: int, metric: str, seconds: float):
+        """Record a latency sample for a staff member and their guild."""
+        if seconds < 0:
+            return
+
+        key = (guild_id, user_id, metric)
+        if key not in self.staff_sketches:
+            self.staff_sketches[key] = QuantileSketch()
+        self.staff_sketches[key].add(seconds)
+
+        guild_key = (guild_id, metric)
+        if guild_key not in self.guild_sketches:
+            self.guild_sketches[guild_key] = QuantileSketch()
+        self.guild_sketches[guild_key].add(seconds)
+        self.dirty.add(key)
+        self.dirty.add((guild_id, GUILD_ROLLUP, metric))
+
+    def _sketch(self, key: Tuple[int, int, str]) -> Optional[QuantileSketch]:
+        """Look up a sketch by its stored (guild, user or GUILD_ROLLUP, metric) key."""
+        guild_id, user_id, metric = key
+        if user_id == GUILD_ROLLUP:
+            return self.guild_sketches.get((guild_id, metric))
+        return self.staff_sketches.get(key)
+
+    async def flush(self, database):
+        """Write sketches changed since the last flush. Failed writes are retried on the next flush."""
+        if not self.dirty:
+            return
+        keys, self.dirty = self.dirty, set()
+        rows = []
+        for key in keys:
+            sketch = self._sketch(key)
+            if sketch is not None:
+                rows.append((*key, json.dumps(sketch.to_dict())))
+        try:
+            await asyncio.to_thread(database.save_perf_sketches, rows)
+        except Exception as e:
+            self.dirty.update(keys)
+            logging.error(f"Error flushing response-time sketches: {e}")
+
+    async def load(self, database):
+        """Load stored sketches. Sketches with samples not yet flushed are newer and kept."""
+        rows: List[Tuple[int, int, str, str]] = await asyncio.to_thread(database.get_perf_sketches)
+        for guild_id, user_id, metric, data in rows:
+            if (guild_id, user_id, metric) in self.dirty:
+                continue
+            sketch = QuantileSketch.from_dict(json.loads(data))
+            if user_id == GUILD_ROLLUP:
+                self.guild_sketches[(guild_id, metric)] = sketch
+            else:
+                self.staff_sketches[(guild_id, user_id, metric)] = sketch
+        logging.info(f"Loaded {len(rows)} stored response-time sketches")
+
+    def forget_guild(self, guild_id: int):
+        """Drop a guild's sketches, e.g. after its stored data is purged."""
+        self.staff_sketches = {key: sketch for key, sketch in self.staff_sketches.items() if key[0] != guild_id}
+        self.guild_sketches = {key: sketch for key, sketch in self.guild_sketches.items() if key[0] != guild_id}
+        self.dirty = {key for key in self.dirty if key[0] != guild_id}
+
+    def get_staff_sketches(self, guild_id: int, user_id: int) -> Dict[str, QuantileSketch]:
+        """Get a staff member's sketches keyed by metric."""
+        return {
+            metric: self.staff_sketches[(guild_id, user_id, metric)]
+            for metric in METRICS if (guild_id, user_id, metric) in self.staff_sketches
+        }
+
+    def get_guild_sketches(self, guild_id: int) -> Dict[str, QuantileSketch]:
+        """Get a guild's rollup sketches keyed by metric."""
+        return {
+            metric: self.guild_sketches[(guild_id, metric)]
+            for metric in METRICS if (guild_id, metric) in self.guild_sketches
+        }
+
+    def export_state(self) -> dict:
+        """Export active claims in a JSON-serializable form (sketches are stored in the database)."""
+        return {
+            'active': [
+                [channel_id, a.guild_id, a.claimer_id, a.holder_id, a.claimed_at, a.responded, a.waiting_since]
+                for channel_id, a in self.active.items()
+            ]
+        }
+
+    def import_state(self, state: dict):
+        """Load state previously produced by export_state."""
+        for channel_id, guild_id, claimer_id, holder_id, claimed_at, responded, waiting_since in state.get('active', []):
+            activity = _ClaimActivity(guild_id, claimer_id, holder_id, claimed_at)
+            activity.responded = responded
+            activity.waiting_since = waiting_since
+            self.active[channel_id] = activity
+        # Snapshots written before sketches were stored carry them; flush them on the next pass
+        for guild_id, user_id, metric, data in state.get('staff', []):
+            self.staff_sketches[(guild_id, user_id, metric)] = QuantileSketch.from_dict(data)
+            self.dirty.add((guild_id, user_id, metric))
+        for guild_id, metric, data in state.get('guild', []):
+            self.guild_sketches[(guild_id, metric)] = QuantileSketch.from_dict(data)
+            self.dirty.add((guild_id, GUILD_ROLLUP, metric))
+        logging.info(f"Loaded {len(self.active)} tracked claims")
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Format seconds as a short human-readable duration."""
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
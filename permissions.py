@@ -1,6 +1,17 @@
 import discord
 import logging
 
+from tracing import traced_methods
+
+# Overwrites a claim puts in place; the reconciler checks claimed channels against these
+CLAIMED_STAFF_ROLE_OVERWRITE = {'view_channel': True, 'send_messages': False, 'read_message_history': True}
+CLAIMER_OVERWRITE = {'view_channel': True, 'send_messages': True, 'read_message_history': True}
+
+def _matches(overwrite, expected: dict) -> bool:
+    """Check that an overwrite sets every expected permission exactly."""
+    return all(getattr(overwrite, name) is value for name, value in expected.items())
+
+@traced_methods('perm')
 class PermissionManager:
     def __init__(self, bot):
         self.bot = bot
@@ -18,6 +29,23 @@ class PermissionManager:
         # Also allow administrators
         return member.guild_permissions.administrator
 
+    async def resolve_member(self, guild, user_id: int):
+        """Get a member from the cache, or fetch them (the members intent is off). None if they left the guild."""
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        try:
+            return await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+
+    async def reapply_claim_permissions(self, channel, staff_role, claimer):
+        """Put a claim's overwrites back in place, e.g. after a failed takeover restored them away."""
+        if staff_role is not None:
+            await channel.set_permissions(staff_role, **CLAIMED_STAFF_ROLE_OVERWRITE)
+        await channel.set_permissions(claimer, **CLAIMER_OVERWRITE)
+        logging.info(f"Re-applied claim permissions for {claimer.id} in channel {channel.id}")
+
     async def restrict_channel_permissions(self, channel, ticket_holder, staff_member, staff_role):
         """Restrict channel permissions efficiently - only remove send_messages from staff role and give individual permission to claimer."""
         # Store original permissions for restoration
@@ -49,21 +77,22 @@ class PermissionManager:
                 original_permissions['staff_member'] = None
             
             # Remove send_messages permission from staff role but keep view access
-            current_staff_perms = channel.overwrites_for(staff_role)
-            await channel.set_permissions(
-                staff_role,
-                view_channel=True,  # Ensure staff can still view
-                send_messages=False,  # Remove send permission
-                read_message_history=True  # Ensure staff can read history
-            )
+            await channel.set_permissions(staff_role, **CLAIMED_STAFF_ROLE_OVERWRITE)
             
             # Give individual send permission to the staff member who claimed
-            await channel.set_permissions(
-                staff_member,
-                send_messages=True,
-                view_channel=True,
-                read_message_history=True
-            )
+            try:
+                await channel.set_permissions(staff_member, **CLAIMER_OVERWRITE)
+            except Exception:
+                # Don't leave staff muted with no claimer: put the staff role back as it was
+                staff_role_perms = original_permissions['staff_role']
+                try:
+                    if staff_role_perms:
+                        await channel.set_permissions(staff_role, **staff_role_perms)
+                    else:
+                        await channel.set_permissions(staff_role, overwrite=None)
+                except Exception as e:
+                    logging.error(f"Error undoing staff role overwrite in channel {channel.id}: {e}")
+                raise
             
             logging.info(f"Efficiently restricted permissions for channel {channel.id} - removed staff role send_messages, added individual permission for {staff_member.id}")
             return str(original_permissions)  # Convert to string for storage
@@ -72,63 +101,81 @@ class PermissionManager:
             logging.error(f"Error restricting channel permissions: {e}")
             raise
 
-    async def restore_channel_permissions(self, channel, original_permissions_str):
-        """Restore original channel permissions efficiently."""
+    async def restore_channel_permissions(self, channel, original_permissions_str, staff_role_id, claimer_id: int):
+        """Restore the staff role and claimer overwrites a claim replaced, looked up by ID."""
         try:
             # Parse the original permissions string back to dict
             import ast
             original_permissions = ast.literal_eval(original_permissions_str)
-            
-            # Get current overwrites to identify the staff role and member to restore
-            current_overwrites = channel.overwrites
-            
-            # Find and restore staff role permissions
-            for target, overwrite in current_overwrites.items():
-                if isinstance(target, discord.Role):
-                    # Check if this role had original permissions stored
-                    if 'staff_role' in original_permissions:
-                        staff_role_perms = original_permissions['staff_role']
-                        if staff_role_perms:
-                            # Restore original permissions
-                            await channel.set_permissions(
-                                target,
-                                view_channel=staff_role_perms.get('view_channel'),
-                                send_messages=staff_role_perms.get('send_messages'),
-                                read_message_history=staff_role_perms.get('read_message_history')
-                            )
-                        else:
-                            # Remove override if role didn't have permissions originally
-                            await channel.set_permissions(target, overwrite=None)
-                        break
-            
-            # Find and restore staff member permissions
-            for target, overwrite in current_overwrites.items():
-                if isinstance(target, discord.Member):
-                    # Check if this member had original permissions stored
-                    if 'staff_member' in original_permissions:
-                        staff_member_perms = original_permissions['staff_member']
-                        if staff_member_perms:
-                            # Restore original permissions
-                            await channel.set_permissions(
-                                target,
-                                view_channel=staff_member_perms.get('view_channel'),
-                                send_messages=staff_member_perms.get('send_messages'),
-                                read_message_history=staff_member_perms.get('read_message_history')
-                            )
-                        else:
-                            # Remove override if member didn't have permissions originally
-                            await channel.set_permissions(target, overwrite=None)
-                        break
-            
+
+            # The snapshot belongs to these two targets only; never whichever overwrites happen to come first
+            targets = []
+            if 'staff_role' in original_permissions:
+                staff_role = channel.guild.get_role(staff_role_id) if staff_role_id else None
+                if staff_role is not None:
+                    targets.append((staff_role, original_permissions['staff_role']))
+                else:
+                    logging.warning(f"Staff role {staff_role_id} not found, not restoring its overwrite in channel {channel.id}")
+            if 'staff_member' in original_permissions:
+                # set_permissions only accepts a real member
+                claimer = await self.resolve_member(channel.guild, claimer_id)
+                if claimer is not None:
+                    targets.append((claimer, original_permissions['staff_member']))
+                else:
+                    logging.info(f"Claimer {claimer_id} left the guild, not restoring their overwrite in channel {channel.id}")
+
+            for target, perms in targets:
+                if perms:
+                    # Restore original permissions
+                    await channel.set_permissions(
+                        target,
+                        view_channel=perms.get('view_channel'),
+                        send_messages=perms.get('send_messages'),
+                        read_message_history=perms.get('read_message_history')
+                    )
+                else:
+                    # Remove override if the target didn't have permissions originally
+                    await channel.set_permissions(target, overwrite=None)
+
             logging.info(f"Efficiently restored permissions for channel {channel.id}")
-            
+
         except Exception as e:
             logging.error(f"Error restoring channel permissions: {e}")
             raise
 
-    async def restore_permissions(self, channel, original_permissions):
+    async def restore_permissions(self, channel, original_permissions, staff_role_id, claimer_id: int):
         """Wrapper method to maintain compatibility."""
-        return await self.restore_channel_permissions(channel, original_permissions)
+        return await self.restore_channel_permissions(channel, original_permissions, staff_role_id, claimer_id)
+
+    def find_claim_drift(self, channel, staff_role_id, claimer_id: int) -> list:
+        """Compare a claimed channel's cached overwrites with what the claim set (no API calls).
+        Returns (kind, target, expected) for each overwrite that differs; an uncached claimer's
+        target is a discord.Object, which apply_overwrites resolves to the member."""
+        drift = []
+        if staff_role_id:
+            staff_role = channel.guild.get_role(staff_role_id)
+            if staff_role is not None and not _matches(channel.overwrites_for(staff_role), CLAIMED_STAFF_ROLE_OVERWRITE):
+                drift.append(('staff_role', staff_role, CLAIMED_STAFF_ROLE_OVERWRITE))
+
+        # Members are rarely cached without the members intent; overwrites are looked up by ID
+        claimer = channel.guild.get_member(claimer_id) or discord.Object(id=claimer_id, type=discord.Member)
+        if not _matches(channel.overwrites_for(claimer), CLAIMER_OVERWRITE):
+            drift.append(('claimer', claimer, CLAIMER_OVERWRITE))
+        return drift
+
+    async def apply_overwrites(self, channel, drift: list):
+        """Re-apply the overwrites reported by find_claim_drift."""
+        applied = []
+        for kind, target, expected in drift:
+            if not isinstance(target, (discord.Member, discord.Role)):
+                # set_permissions only accepts a real member
+                target = await self.resolve_member(channel.guild, target.id)
+                if target is None:
+                    logging.info(f"Skipping {kind} overwrite in channel {channel.id}: member left the guild")
+                    continue
+            await channel.set_permissions(target, **expected)
+            applied.append(kind)
+        logging.info(f"Corrected {len(applied)} drifted overwrite(s) in channel {channel.id}: {applied}")
 
     async def add_officer_permissions(self, channel, officer_role):
         """Add officer role permissions to channel."""
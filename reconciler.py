@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+
+from config import RECONCILE_SLICE_MS, RECONCILE_GRACE_SECONDS, RECONCILE_MAX_FIXES, RECONCILE_FIX_INTERVAL
+from timeutil import now_ms
+from tracing import traced
+
+class PermissionReconciler:
+    """Re-applies claim overwrites that were edited by hand or lost in a failed restore.
+
+    Drift is detected against discord.py's cached overwrites only, in short
+    time slices so thousands of open tickets never block the event loop.
+    Corrections are paced and capped per pass.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._lock = asyncio.Lock()
+        self.counters = {'passes': 0, 'checked': 0, 'drifted': 0, 'corrected': 0, 'failed': 0, 'deferred': 0}
+        self.drift_by_kind = {'staff_role': 0, 'claimer': 0}
+        self.last_report = {}
+
+    def stats(self) -> dict:
+        """Get cumulative drift counters and the last pass report."""
+        return {**self.counters, 'by_kind': dict(self.drift_by_kind), 'last_pass': self.last_report}
+
+    @traced('job.reconcile', root=True)
+    async def run(self):
+        """Run one reconciliation pass over every active claim."""
+        if self._lock.locked():
+            logging.info("Permission reconcile already running, skipping")
+            return
+
+        async with self._lock:
+            started_at = time.perf_counter()
+            report = {'checked': 0, 'drifted': 0, 'corrected': 0, 'failed': 0, 'deferred': 0, 'skipped': 0}
+
+            try:
+                claims = await asyncio.to_thread(self.bot.database.get_active_timeout_states)
+                staff_roles = await asyncio.to_thread(self.bot.database.get_staff_roles)
+                drifted = await self._find_drift(claims, staff_roles, report)
+
+                for channel, claimer_id in drifted[:RECONCILE_MAX_FIXES]:
+                    if await self._correct(channel, staff_roles.get(channel.guild.id), claimer_id):
+                        report['corrected'] += 1
+                    else:
+                        report['failed'] += 1
+                    await asyncio.sleep(RECONCILE_FIX_INTERVAL)
+                report['deferred'] = max(0, len(drifted) - RECONCILE_MAX_FIXES)
+
+            except Exception as e:
+                logging.error(f"Error during permission reconcile: {e}")
+
+            self.counters['passes'] += 1
+            for key in ('checked', 'drifted', 'corrected', 'failed', 'deferred'):
+                self.counters[key] += report[key]
+            report['duration_s'] = round(time.perf_counter() - started_at, 2)
+            self.last_report = report
+            if report['drifted']:
+                logging.info(
+                    f"Permission reconcile: {report['checked']} checked, {report['drifted']} drifted, "
+                    f"{report['corrected']} corrected, {report['failed']} failed, {report['deferred']} deferred "
+                    f"in {report['duration_s']} s"
+                )
+
+    async def _find_drift(self, claims, staff_roles, report: dict) -> list:
+        """Compare claims against the cache, yielding the loop every RECONCILE_SLICE_MS."""
+        drifted = []
+        grace_cutoff = now_ms() - RECONCILE_GRACE_SECONDS * 1000
+        slice_started = time.perf_counter()
+
+        for state in claims:
+            if (time.perf_counter() - slice_started) * 1000 >= RECONCILE_SLICE_MS:
+                await asyncio.sleep(0)
+                slice_started = time.perf_counter()
+
+            channel_id, claimer_id, claim_time = state[0], state[1], state[3]
+            # Fresh claims and in-flight transitions are still settling
+            if (claim_time or 0) > grace_cutoff or self.bot.tickets.locks.is_held(channel_id):
+                report['skipped'] += 1
+                continue
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue  # Deleted channels are purged by retention
+
+            report['checked'] += 1
+            drift = self.bot.permissions.find_claim_drift(channel, staff_roles.get(channel.guild.id), claimer_id)
+            if drift:
+                report['drifted'] += 1
+                for kind, _, _ in drift:
+                    self.drift_by_kind[kind] += 1
+                drifted.append((channel, claimer_id))
+        return drifted
+
+    async def _correct(self, channel, staff_role_id, claimer_id: int) -> bool:
+        """Re-check a drifted channel under its lock and re-apply the claim overwrites."""
+        try:
+            async with self.bot.tickets.locks.hold(channel.id):
+                # The claim may have ended or changed hands since the scan
+                timeout_info = await asyncio.to_thread(self.bot.database.get_timeout_info, channel.id)
+                if not timeout_info or timeout_info[0] != claimer_id:
+                    return True
+                drift = self.bot.permissions.find_claim_drift(channel, staff_role_id, claimer_id)
+                if drift:
+                    await self.bot.permissions.apply_overwrites(channel, drift)
+            return True
+        except Exception as e:
+            logging.error(f"Error correcting permissions in channel {channel.id}: {e}")
+            return False
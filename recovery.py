@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+from config import DATABASE_PATH, DISCORD_TOKEN, RECOVERY_CONCURRENCY, RECOVERY_PROGRESS_EVERY
+from tickets import InvalidTransition
+from timeutil import now_ms, from_ms
+from tracing import traced
+
+RECOVERED = "recovered"
+SKIPPED = "skipped"  # No longer claimed by the time its turn came
+MISSING = "missing"  # Channel not found; retention purges deleted channels
+FAILED = "failed"
+SELECTED = "selected"  # Dry run
+
+STATUS_ICONS = {RECOVERED: "✅", SKIPPED: "⏭️", MISSING: "❔", FAILED: "❌", SELECTED: "🔎"}
+
+_ID_PATTERN = re.compile(r'^<[@#]!?(\d+)>$|^(\d+)$')
+
+def _parse_id(value: str) -> int:
+    """Parse a raw ID or a user/channel mention."""
+    match = _ID_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Not an ID or mention: {value}")
+    return int(match.group(1) or match.group(2))
+
+def parse_filters(tokens: List[str]) -> Dict:
+    """Parse 'category=<id> claimer=<@user> older=<minutes> concurrency=<n> dry' command tokens."""
+    filters = {'category_id': None, 'claimer_id': None, 'min_age_minutes': None,
+               'concurrency': RECOVERY_CONCURRENCY, 'dry_run': False}
+    for token in tokens:
+        key, _, value = token.partition('=')
+        key = key.lower()
+        if key in ('dry', 'dry_run') and not value:
+            filters['dry_run'] = True
+        elif key == 'category' and value:
+            filters['category_id'] = _parse_id(value)
+        elif key == 'claimer' and value:
+            filters['claimer_id'] = _parse_id(value)
+        elif key == 'older' and value:
+            filters['min_age_minutes'] = int(value)
+        elif key == 'concurrency' and value:
+            filters['concurrency'] = max(1, int(value))
+        else:
+            raise ValueError(f"Unknown filter: {token}")
+    return filters
+
+def format_result(result: dict) -> str:
+    """One line of the per-channel summary."""
+    line = f"{STATUS_ICONS[result['status']]} <#{result['channel_id']}> claimed by <@{result['claimer_id']}>"
+    if result['claim_time']:
+        line += f" at {from_ms(result['claim_time']).strftime('%Y-%m-%d %H:%M')} UTC"
+    if result['detail']:
+        line += f" - {result['detail']}"
+    return line
+
+class RecoveryManager:
+    """Bulk-completes stuck claims, restoring each channel's stored permission snapshot."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._lock = asyncio.Lock()
+        self.last_report = {}
+
+    async def select(self, guild_id: int, category_id: Optional[int] = None, claimer_id: Optional[int] = None,
+                     min_age_minutes: Optional[int] = None) -> List[tuple]:
+        """Get (channel_id, channel or None, claimer_id, claim_time) of active claims matching the filters."""
+        claimed_before = now_ms() - min_age_minutes * 60000 if min_age_minutes else None
+        rows = await asyncio.to_thread(self.bot.database.get_recovery_candidates, claimer_id, claimed_before)
+
+        selected = []
+        for channel_id, row_guild_id, row_claimer_id, claim_time in rows:
+            channel = self.bot.get_channel(channel_id)
+            if (channel.guild.id if channel is not None else row_guild_id) != guild_id:
+                continue
+            if category_id is not None and (channel is None or channel.category_id != category_id):
+                continue
+            selected.append((channel_id, channel, row_claimer_id, claim_time))
+        return selected
+
+    @traced('recovery.run', root=True)
+    async def recover(self, guild_id: int, category_id: Optional[int] = None, claimer_id: Optional[int] = None,
+                      min_age_minutes: Optional[int] = None, concurrency: int = RECOVERY_CONCURRENCY,
+                      dry_run: bool = False,
+                      progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> dict:
+        """Complete every matching claim, at most `concurrency` channels at a time.
+
+        progress(done, total) is awaited every RECOVERY_PROGRESS_EVERY channels and at the end.
+        """
+        if self._lock.locked():
+            raise RuntimeError("A recovery run is already in progress")
+
+        async with self._lock:
+            started_at = time.perf_counter()
+            selected = await self.select(guild_id, category_id, claimer_id, min_age_minutes)
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            done = 0
+
+            async def recover_one(channel_id, channel, row_claimer_id, claim_time):
+                nonlocal done
+                if dry_run:
+                    status, detail = (SELECTED, None) if channel is not None else (MISSING, "channel not found")
+                else:
+                    async with semaphore:
+                        status, detail = await self._recover_channel(channel_id, channel)
+
+                done += 1
+                if progress and (done % RECOVERY_PROGRESS_EVERY == 0 or done == len(selected)):
+                    try:
+                        await progress(done, len(selected))
+                    except Exception as e:
+                        logging.warning(f"Error reporting recovery progress: {e}")
+                return {'channel_id': channel_id, 'claimer_id': row_claimer_id, 'claim_time': claim_time,
+                        'status': status, 'detail': detail}
+
+            results = await asyncio.gather(*(recover_one(*candidate) for candidate in selected))
+
+            report = {
+                'guild_id': guild_id,
+                'dry_run': dry_run,
+                'selected': len(selected),
+                'counts': dict(Counter(result['status'] for result in results)),
+                'results': results,
+                'duration_s': round(time.perf_counter() - started_at, 2)
+            }
+            self.last_report = report
+            logging.info(
+                f"Recovery in guild {guild_id}{' (dry run)' if dry_run else ''}: {len(selected)} selected, "
+                f"{report['counts']} in {report['duration_s']} s"
+            )
+            return report
+
+    async def _recover_channel(self, channel_id: int, channel) -> tuple:
+        """Restore one channel's permissions and complete its claim. Returns (status, detail)."""
+        if channel is None:
+            return MISSING, "channel not found"
+        try:
+            await self.bot.tickets.complete(channel, 'recovery')
+            return RECOVERED, None
+        except InvalidTransition as e:
+            return SKIPPED, str(e)
+        except Exception as e:
+            logging.error(f"Error recovering channel {channel_id}: {e}")
+            return FAILED, str(e)
+
+class _RecoveryClient(discord.Client):
+    """Gateway client carrying just the managers TicketService needs, for use while the bot is stopped."""
+
+    def __init__(self, args):
+        from perfstats import ResponseTimeTracker
+        from permissions import PermissionManager
+        from sharding import open_database
+        from tickets import TicketService
+        from timeline import TimelineStore
+        from timeouts import TimeoutManager
+
+        super().__init__(intents=discord.Intents.default())
+        self.args = args
+        self.report = None
+        self.database = open_database(args.db)
+        self.permissions = PermissionManager(self)
+        self.timeout_manager = TimeoutManager(self)
+        self.perf_stats = ResponseTimeTracker()
+        self.timelines = TimelineStore()
+        self.tickets = TicketService(self)
+        self.recovery = RecoveryManager(self)
+
+    async def on_ready(self):
+        """Run the recovery once the channel cache is populated, then disconnect."""
+        async def print_progress(done: int, total: int):
+            print(f"{done}/{total} channels processed")
+
+        try:
+            self.report = await self.recovery.recover(
+                self.args.guild, self.args.category, self.args.claimer, self.args.older_than,
+                self.args.concurrency, self.args.dry_run, print_progress
+            )
+        except Exception as e:
+            logging.error(f"Recovery failed: {e}")
+        finally:
+            await self.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Complete stuck ticket claims and restore their permissions. Run while the bot is stopped."
+    )
+    parser.add_argument('--guild', type=int, required=True)
+    parser.add_argument('--category', type=int, help="Only channels in this category")
+    parser.add_argument('--claimer', type=int, help="Only claims held by this user")
+    parser.add_argument('--older-than', type=int, help="Only claims older than this many minutes")
+    parser.add_argument('--concurrency', type=int, default=RECOVERY_CONCURRENCY)
+    parser.add_argument('--dry-run', action='store_true', help="List matching claims without changing anything")
+    parser.add_argument('--db', default=DATABASE_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    client = _RecoveryClient(args)
+    asyncio.run(client.start(DISCORD_TOKEN))
+
+    report = client.report
+    if report is None:
+        raise SystemExit(1)
+    for result in report['results']:
+        print(f"{result['channel_id']}\t{result['claimer_id']}\t{result['status']}\t{result['detail'] or ''}")
+    print(f"{report['selected']} selected: {report['counts']} in {report['duration_s']} s")
+    if report['counts'].get(FAILED):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import importlib
+import logging
+import sys
+import time
+
+from tracing import traced
+
+# Imported fresh on reload, in this order so the managers bind the new config values.
+# Other modules keep the config they were started with until the process restarts.
+RELOADABLE_MODULES = ('config', 'permissions', 'timeouts', 'leaderboard')
+COMMANDS_EXTENSION = 'bot_commands'
+
+class HotReloader:
+    """Reloads the command cog and swaps the permission, timeout and leaderboard managers in place.
+
+    New modules are imported beside the running ones and the new managers are
+    built and loaded with the old managers' state before anything is swapped,
+    so a failing import or setup puts the previous modules back and leaves the
+    bot as it was. The gateway connection is never touched.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._lock = asyncio.Lock()
+        self.last_report = {}
+
+    @traced('job.reload', root=True)
+    async def reload(self) -> dict:
+        """Reload code and swap managers, raising (after rolling back) if anything fails to set up."""
+        if self._lock.locked():
+            raise RuntimeError("A reload is already running")
+
+        async with self._lock:
+            started_at = time.perf_counter()
+            bot = self.bot
+            previous = {name: sys.modules.pop(name) for name in RELOADABLE_MODULES if name in sys.modules}
+            try:
+                modules = {name: importlib.import_module(name) for name in RELOADABLE_MODULES}
+                permissions = modules['permissions'].PermissionManager(bot)
+                timeout_manager = modules['timeouts'].TimeoutManager(bot, clock=bot.timeout_manager.clock)
+                leaderboard = None
+                if bot._leaderboard is not None:
+                    leaderboard = modules['leaderboard'].Leaderboard(bot, bot.database)
+                    leaderboard.import_state(bot._leaderboard.export_state())
+                # Puts the previous cog back by itself if the new one fails to set up
+                await bot.reload_extension(COMMANDS_EXTENSION)
+            except BaseException:
+                # Including cancellation: never leave half-reloaded modules behind
+                sys.modules.update(previous)
+                raise
+
+            bot.permissions = permissions
+            report = await self._swap_timeout_manager(timeout_manager)
+            if leaderboard is not None:
+                self._swap_leaderboard(leaderboard, modules['leaderboard'])
+
+            report['modules'] = [*RELOADABLE_MODULES, COMMANDS_EXTENSION]
+            report['duration_ms'] = round((time.perf_counter() - started_at) * 1000, 1)
+            self.last_report = report
+            logging.info(
+                f"Hot reload: {', '.join(report['modules'])} in {report['duration_ms']} ms, "
+                f"{report['timeouts_moved']} timers moved, {report['timeouts_kept']} left to finish"
+            )
+            return report
+
+    async def _swap_timeout_manager(self, new) -> dict:
+        """Hand every timer to the new manager; timeouts already being handled finish on the old code."""
+        old = self.bot.timeout_manager
+        # Shared so tasks still running on the old code keep the new manager's view current
+        new.timeout_tasks = old.timeout_tasks
+        new.deadlines = old.deadlines
+        new.test_timeouts = old.test_timeouts
+        new._resume_lock = old._resume_lock
+        self.bot.timeout_manager = new
+
+        # Nothing below yields, so a task whose deadline is still ahead is asleep and safe to replace
+        now = new.clock.now_ms()
+        report = {'timeouts_moved': 0, 'timeouts_kept': 0}
+        for channel_id, task in list(new.timeout_tasks.items()):
+            if task.done():
+                continue
+            deadline = new.deadlines.get(channel_id)
+            if deadline is not None and deadline[0] <= now:
+                report['timeouts_kept'] += 1
+                continue
+            initial_delay = (deadline[0] - now) / 1000 if deadline is not None else None
+            await new.start_timeout_monitoring(channel_id, initial_delay=initial_delay)
+            report['timeouts_moved'] += 1
+        return report
+
+    def _swap_leaderboard(self, new, module):
+        """Move live updates, groups and persistent buttons to the new leaderboard."""
+        old = self.bot._leaderboard
+        live = old._loop is not None
+        old.stop_live_updates()
+        # Cached renders and cursors came from the old code and are rebuilt on demand
+        new.groups.update(old.groups)
+        new.live_hashes.update(old.live_hashes)
+        new.cache_stats.update(old.cache_stats)
+        self.bot._leaderboard = new
+
+        if self.bot._deferred_started:
+            self.bot.add_view(module.LeaderboardView(new))
+        if live:
+            new.start_live_updates()
@@ -0,0 +1,256 @@
+import asyncio
+import csv
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from config import REPORT_DAYS, REPORT_WORKERS, REPORT_TOP_STAFF, RESPONSE_WINDOW_MINUTES
+from perfstats import format_duration
+from timeline import TicketTimeline, ROLE_CLAIMER, ROLE_HOLDER
+from timeutil import now_ms, from_ms, MS_PER_DAY
+from tracing import traced
+
+# Upper bounds (seconds) of the turn response histogram buckets
+RESPONSE_BUCKETS = [(60, "<1m"), (300, "1-5m"), (900, "5-15m"), (3600, "15-60m"), (float('inf'), "60m+")]
+
+CSV_COLUMNS = [
+    'user_id', 'name', 'claims', 'points', 'completed', 'staff_timeouts', 'holder_timeouts',
+    'taken_over', 'recovered', 'officer_escalations', 'turns', 'answered_in_window', 'turn_p50_s', 'turn_p90_s',
+    'first_response_p50_s', 'claim_duration_p50_s'
+]
+
+def _timeline_responses(np, blob: bytes):
+    """Get (turn waits ms, first response ms or None) of one claim timeline, vectorized."""
+    timeline = TicketTimeline.from_bytes(blob)
+    roles = np.frombuffer(timeline.roles, dtype=np.uint8)
+    times = timeline.base_ms + np.cumsum(np.frombuffer(timeline.deltas, dtype=np.uint32).astype(np.int64))
+
+    claimer_idx = np.flatnonzero(roles == ROLE_CLAIMER)
+    holder_idx = np.flatnonzero(roles == ROLE_HOLDER)
+    # First response is only known when no early events were compacted away
+    first = int(times[claimer_idx[0]] - timeline.base_ms) if claimer_idx.size and not timeline.dropped else None
+    if not claimer_idx.size or not holder_idx.size:
+        return np.empty(0, dtype=np.int64), first
+
+    # A turn starts at the first holder message after each claimer message and ends at the next one
+    turn = np.searchsorted(claimer_idx, holder_idx)
+    turn, first_holder = np.unique(turn, return_index=True)
+    answered = turn < claimer_idx.size
+    waits = times[claimer_idx[turn[answered]]] - times[holder_idx[first_holder[answered]]]
+    return waits, first
+
+def _percentile(np, values, q: float) -> Optional[float]:
+    """Percentile of a possibly empty array, in seconds."""
+    return round(float(np.percentile(values, q)) / 1000, 1) if values.size else None
+
+def aggregate_claims(rows: List[tuple], points: Dict[int, int], window_seconds: float) -> dict:
+    """Aggregate one guild's claim rows into per-staff statistics. Runs in a worker process.
+
+    Rows are (user_id, claimed_at, completed_at, end_reason, officer_used, timeline)
+    as returned by Database.get_report_claims.
+    """
+    import numpy as np
+
+    count = len(rows)
+    users = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    claimed = np.fromiter((row[1] or 0 for row in rows), dtype=np.int64, count=count)
+    completed = np.fromiter((row[2] or 0 for row in rows), dtype=np.int64, count=count)
+    reasons = np.array([row[3] or '' for row in rows], dtype=object)
+    officer = np.fromiter((bool(row[4]) for row in rows), dtype=bool, count=count)
+
+    staff = np.unique(np.concatenate([users, np.fromiter(points, dtype=np.int64, count=len(points))]))
+    owner = np.searchsorted(staff, users)
+
+    def per_staff(mask):
+        return np.bincount(owner[mask], minlength=staff.size)
+
+    claims = np.bincount(owner, minlength=staff.size)
+    ended = completed > 0
+    finished = per_staff(ended & (reasons == 'unclaim'))
+    staff_timeouts = per_staff(reasons == 'staff_timeout')
+    holder_timeouts = per_staff(reasons == 'holder_timeout')
+    taken_over = per_staff(reasons == 'taken_over')
+    # Stuck claims bulk-closed by ?recover, not by the staff member
+    recovered = per_staff(reasons == 'recovery')
+    escalations = per_staff(officer)
+    durations = completed - claimed
+
+    # Flatten every timeline's turn waits with the index of the staff member who answered
+    wait_parts, wait_owner_parts = [], []
+    first_owner, first_values = [], []
+    for index, row in enumerate(rows):
+        if not row[5]:
+            continue
+        try:
+            waits, first = _timeline_responses(np, row[5])
+        except ValueError as e:
+            logging.warning(f"Skipping unreadable timeline in report: {e}")
+            continue
+        wait_parts.append(waits)
+        wait_owner_parts.append(np.full(waits.size, owner[index], dtype=np.int64))
+        if first is not None:
+            first_owner.append(owner[index])
+            first_values.append(first)
+
+    waits = np.concatenate(wait_parts) if wait_parts else np.empty(0, dtype=np.int64)
+    wait_owner = np.concatenate(wait_owner_parts) if wait_owner_parts else np.empty(0, dtype=np.int64)
+    first_owner = np.array(first_owner, dtype=np.int64)
+    first_values = np.array(first_values, dtype=np.int64)
+
+    turns = np.bincount(wait_owner, minlength=staff.size)
+    in_window = np.bincount(wait_owner[waits <= window_seconds * 1000], minlength=staff.size)
+
+    # Sort once by (owner, value) so each staff member's values are one contiguous slice
+    order = np.lexsort((waits, wait_owner))
+    waits, wait_owner = waits[order], wait_owner[order]
+    bounds = np.searchsorted(wait_owner, np.arange(staff.size + 1))
+
+    report_staff = []
+    for i, user_id in enumerate(staff.tolist()):
+        staff_waits = waits[bounds[i]:bounds[i + 1]]
+        report_staff.append({
+            'user_id': user_id,
+            'claims': int(claims[i]),
+            'points': int(points.get(user_id, 0)),
+            'completed': int(finished[i]),
+            'staff_timeouts': int(staff_timeouts[i]),
+            'holder_timeouts': int(holder_timeouts[i]),
+            'taken_over': int(taken_over[i]),
+            'recovered': int(recovered[i]),
+            'officer_escalations': int(escalations[i]),
+            'turns': int(turns[i]),
+            'answered_in_window': int(in_window[i]),
+            'turn_p50_s': _percentile(np, staff_waits, 50),
+            'turn_p90_s': _percentile(np, staff_waits, 90),
+            'first_response_p50_s': _percentile(np, first_values[first_owner == i], 50),
+            'claim_duration_p50_s': _percentile(np, durations[(owner == i) & ended], 50)
+        })
+    report_staff.sort(key=lambda s: (-s['claims'], -s['points'], s['user_id']))
+
+    histogram, _ = np.histogram(waits / 1000, bins=[0] + [bound for bound, _ in RESPONSE_BUCKETS])
+    return {
+        'claims': count,
+        'staff_timeouts': int(staff_timeouts.sum()),
+        'holder_timeouts': int(holder_timeouts.sum()),
+        'recovered': int(recovered.sum()),
+        'officer_escalations': int(escalations.sum()),
+        'turns': int(waits.size),
+        'answered_in_window': int(in_window.sum()),
+        'turn_p50_s': _percentile(np, waits, 50),
+        'turn_p90_s': _percentile(np, waits, 90),
+        'turn_histogram': [[label, int(n)] for (_, label), n in zip(RESPONSE_BUCKETS, histogram)],
+        'staff': report_staff
+    }
+
+class WeeklyReports:
+    """Weekly staff performance reports, aggregated in a worker process."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use."""
+        if self._executor is None:
+            # Spawn rather than fork: the bot process has live threads and sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @traced('report.build')
+    async def build(self, guild_id: int, days: int = REPORT_DAYS) -> dict:
+        """Snapshot a guild's recent claims and aggregate them off the event loop."""
+        until = now_ms()
+        since = until - days * MS_PER_DAY
+        rows = await asyncio.to_thread(self.bot.database.get_report_claims, guild_id, since, until)
+        # Weekly points are read before the reset wipes them
+        points = dict(await asyncio.to_thread(self.bot.database.get_leaderboard, guild_id, "weekly"))
+
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(
+            self._get_executor(), aggregate_claims, rows, points, RESPONSE_WINDOW_MINUTES * 60
+        )
+        report.update({'guild_id': guild_id, 'since': since, 'until': until})
+        return report
+
+    def _display_name(self, guild, user_id: int) -> str:
+        """Resolve a staff member from the member cache only."""
+        member = guild.get_member(user_id) if guild else None
+        return f"@{member.display_name}" if member else f"User {user_id}"
+
+    def render(self, guild, report: dict) -> Tuple[discord.Embed, discord.File]:
+        """Build the summary embed and the full CSV attachment."""
+        since = from_ms(report['since']).strftime('%Y-%m-%d')
+        until = from_ms(report['until']).strftime('%Y-%m-%d')
+        embed = discord.Embed(
+            title="📈 Weekly Staff Report",
+            description=(
+                f"{since} → {until}\n"
+                f"**{report['claims']}** claims • ⏰ {report['staff_timeouts']} staff / "
+                f"{report['holder_timeouts']} holder timeouts • 👮 {report['officer_escalations']} escalations"
+                + (f" • 🛠️ {report['recovered']} recovered" if report['recovered'] else "")
+            ),
+            color=discord.Color.blue()
+        )
+
+        if report['turns']:
+            histogram = " • ".join(f"{label}: {n}" for label, n in report['turn_histogram'])
+            embed.add_field(
+                name="⏱️ Turn Response Times",
+                value=(
+                    f"p50 {format_duration(report['turn_p50_s'])} • p90 {format_duration(report['turn_p90_s'])} • "
+                    f"{report['answered_in_window']}/{report['turns']} within {RESPONSE_WINDOW_MINUTES}m\n{histogram}"
+                ),
+                inline=False
+            )
+
+        for staff in report['staff'][:REPORT_TOP_STAFF]:
+            embed.add_field(
+                name=self._display_name(guild, staff['user_id']),
+                value=(
+                    f"{staff['claims']} claims • {staff['points']} pts • "
+                    f"⏰ {staff['staff_timeouts']}/{staff['holder_timeouts']} • 👮 {staff['officer_escalations']}\n"
+                    f"p50 {format_duration(staff['turn_p50_s'])} • p90 {format_duration(staff['turn_p90_s'])}"
+                ),
+                inline=True
+            )
+        if len(report['staff']) > REPORT_TOP_STAFF:
+            embed.set_footer(text=f"{len(report['staff']) - REPORT_TOP_STAFF} more staff in the attached file")
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for staff in report['staff']:
+            writer.writerow(dict(staff, name=self._display_name(guild, staff['user_id'])))
+        filename = f"weekly_report_{report['guild_id']}_{until}.csv"
+        return embed, discord.File(io.BytesIO(buffer.getvalue().encode('utf-8')), filename=filename)
+
+    async def send_report(self, channel, days: int = REPORT_DAYS):
+        """Build a guild's report and post it to a channel."""
+        report = await self.build(channel.guild.id, days)
+        embed, file = self.render(channel.guild, report)
+        await channel.send(embed=embed, file=file)
+        logging.info(f"Weekly report for guild {channel.guild.id} sent to channel {channel.id} ({report['claims']} claims)")
+
+    async def post_weekly_reports(self):
+        """Post a report to every configured leaderboard channel."""
+        channels = await asyncio.to_thread(self.bot.database.get_all_leaderboard_channels)
+        for guild_id, channel_id in channels:
+            channel = self.bot.get_channel(channel_id)
+            if not isinstance(channel, discord.TextChannel):
+                continue
+            try:
+                await self.send_report(channel)
+            except Exception as e:
+                logging.error(f"Error sending weekly report for guild {guild_id}: {e}")
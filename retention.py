@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from config import (
+    RETENTION_DAYS, HOLDER_RETENTION_DAYS, RETENTION_BATCH_SIZE,
+    RETENTION_VACUUM_PAGES, RETENTION_SLICE_PAUSE
+)
+from timeutil import now_ms, MS_PER_DAY
+from tracing import traced
+
+class RetentionManager:
+    """Rolls up old claims, purges deleted channels/guilds and reclaims free pages."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._lock = asyncio.Lock()
+        self.last_report = {}
+
+    @traced('job.retention', root=True)
+    async def run(self):
+        """Run one full retention pass in small slices."""
+        if self._lock.locked():
+            logging.info("Retention pass already running, skipping")
+            return
+
+        async with self._lock:
+            started_at = time.perf_counter()
+            report = {'claims_rolled_up': 0, 'holders_purged': 0, 'pages_freed': 0}
+
+            try:
+                claim_cutoff = now_ms() - RETENTION_DAYS * MS_PER_DAY
+                while True:
+                    rolled = await asyncio.to_thread(
+                        self.bot.database.rollup_old_claims, claim_cutoff, RETENTION_BATCH_SIZE
+                    )
+                    report['claims_rolled_up'] += rolled
+                    if rolled < RETENTION_BATCH_SIZE:
+                        break
+                    await asyncio.sleep(RETENTION_SLICE_PAUSE)
+
+                holder_cutoff = now_ms() - HOLDER_RETENTION_DAYS * MS_PER_DAY
+                report['holders_purged'] = await asyncio.to_thread(
+                    self.bot.database.purge_stale_holders, holder_cutoff
+                )
+
+                report['pages_freed'] = await self.vacuum()
+
+            except Exception as e:
+                logging.error(f"Error during retention pass: {e}")
+
+            report['duration_s'] = round(time.perf_counter() - started_at, 2)
+            self.last_report = report
+            logging.info(
+                f"Retention pass: {report['claims_rolled_up']} claims rolled up, "
+                f"{report['holders_purged']} holders purged, {report['pages_freed']} pages freed "
+                f"in {report['duration_s']} s"
+            )
+
+    async def vacuum(self) -> int:
+        """Run incremental_vacuum in slices until the free list is empty. Returns the pages freed."""
+        initial = remaining = await asyncio.to_thread(self.bot.database.get_freelist_count)
+        while remaining != 0:
+            left = await asyncio.to_thread(self.bot.database.incremental_vacuum, RETENTION_VACUUM_PAGES)
+            if left >= remaining:
+                break  # No progress, don't spin
+            remaining = left
+            await asyncio.sleep(RETENTION_SLICE_PAUSE)
+        return max(0, initial - remaining)
+
+    async def purge_channel(self, channel_id: int):
+        """Drop in-memory and stored state for a deleted channel."""
+        try:
+            await self.bot.timeout_manager.stop_timeout_monitoring(channel_id)
+            self.bot.perf_stats.end_claim(channel_id)
+            self.bot.timelines.finish(channel_id)
+            await asyncio.to_thread(self.bot.database.purge_channel, channel_id)
+            logging.info(f"Purged data for deleted channel {channel_id}")
+        except Exception as e:
+            logging.error(f"Error purging data for channel {channel_id}: {e}")
+
+    async def purge_guild(self, guild_id: int):
+        """Drop in-memory and stored state for a guild the bot left."""
+        try:
+            channel_ids = set(await asyncio.to_thread(self.bot.database.get_guild_channels, guild_id))
+            channel_ids.update(
+                channel_id for channel_id, activity in self.bot.perf_stats.active.items()
+                if activity.guild_id == guild_id
+            )
+            for channel_id in channel_ids:
+                await self.bot.timeout_manager.stop_timeout_monitoring(channel_id)
+                self.bot.perf_stats.end_claim(channel_id)
+                self.bot.timelines.finish(channel_id)
+            self.bot.perf_stats.forget_guild(guild_id)
+            await asyncio.to_thread(self.bot.database.purge_guild, guild_id)
+            logging.info(f"Purged data for guild {guild_id}")
+        except Exception as e:
+            logging.error(f"Error purging data for guild {guild_id}: {e}")
@@ -0,0 +1,334 @@
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import DATABASE_PATH, DATABASE_SHARDS, DATABASE_SHARD_DIR
+from database import Database
+from timeutil import get_clock
+
+# Single-shard methods whose first argument is a guild ID
+GUILD_ROUTED = frozenset({
+    'set_staff_role', 'set_officer_role', 'set_allowed_category', 'add_allowed_category',
+    'remove_allowed_category', 'get_allowed_categories', 'set_leaderboard_channel', 'clear_leaderboard_channel',
+    'set_leaderboard_message', 'set_guild_config', 'get_guild_config', 'award_score', 'get_leaderboard',
+    'get_leaderboard_rows', 'get_report_claims', 'set_guild_group', 'get_guild_group', 'purge_guild',
+    'get_guild_channels',
+    'set_auto_dispatch', 'get_auto_dispatch'
+})
+
+# Single-shard methods whose first argument is a channel ID
+CHANNEL_ROUTED = frozenset({
+    'get_active_claim', 'analyze_conversation_and_award_points', 'set_ticket_holder',
+    'get_ticket_holder', 'get_timeout_info', 'remove_timeout', 'update_last_message',
+    'mark_officer_used', 'get_ticket_state', 'apply_completion'
+})
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """Stable shard index of a guild."""
+    return zlib.crc32(int(guild_id).to_bytes(8, 'little')) % shard_count
+
+def shard_paths(shard_dir: str, shard_count: int) -> List[str]:
+    """Paths of every shard file, in shard order."""
+    return [os.path.join(shard_dir, f"shard-{index:02d}.db") for index in range(shard_count)]
+
+class ShardedDatabase:
+    """Database API over per-guild-bucket SQLite files, so busy guilds only lock their own shard.
+
+    Each shard is a full Database. Guild-keyed calls route by hashing the guild
+    ID; channel-keyed calls use a channel directory loaded from the shards at
+    init and extended as claims are committed. Calls that span every guild fan
+    out to all shards in parallel.
+    """
+
+    def __init__(self, shard_dir: str, shard_count: int, initialize: bool = True, clock=None):
+        existing = [
+            name for name in os.listdir(shard_dir) if name.startswith('shard-') and name.endswith('.db')
+        ] if os.path.isdir(shard_dir) else []
+        if existing and len(existing) != shard_count:
+            # A different count would route guilds to shards that do not hold their data
+            raise RuntimeError(f"{shard_dir} holds {len(existing)} shards but {shard_count} are configured")
+        os.makedirs(shard_dir, exist_ok=True)
+
+        self.clock = clock or get_clock()
+        self.shards = [Database(path, initialize=False, clock=self.clock) for path in shard_paths(shard_dir, shard_count)]
+        self.channel_shards: Dict[int, int] = {}  # Channel ID -> shard index
+        self._executor = ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix='shard')
+        # Score versions are kept here so callers see one counter per guild
+        self.score_versions: Dict[int, int] = {}
+        self.score_epoch = 0
+        self._version_lock = threading.Lock()
+        self.score_listeners: List[Callable[[Optional[int]], None]] = []
+        for shard in self.shards:
+            shard.score_listeners.append(self._bump_score_version)
+        if initialize:
+            self.init_database()
+
+    def __getattr__(self, name):
+        if name in GUILD_ROUTED:
+            def call(guild_id, *args, **kwargs):
+                return getattr(self.for_guild(guild_id), name)(guild_id, *args, **kwargs)
+        elif name in CHANNEL_ROUTED:
+            def call(channel_id, *args, **kwargs):
+                return getattr(self.for_channel(channel_id), name)(channel_id, *args, **kwargs)
+        else:
+            raise AttributeError(f"{type(self).__name__} has no attribute {name!r}")
+        return call
+
+    def for_guild(self, guild_id: int) -> Database:
+        """Get the shard holding a guild's data."""
+        return self.shards[shard_of(guild_id, len(self.shards))]
+
+    def for_channel(self, channel_id: int) -> Database:
+        """Get the shard holding a channel's data. Unknown channels have no data, so any shard answers."""
+        return self.shards[self.channel_shards.get(channel_id, 0)]
+
+    def register_channel(self, channel_id: int, guild_id: int):
+        """Route a channel to its guild's shard before writing channel-keyed rows."""
+        self.channel_shards[channel_id] = shard_of(guild_id, len(self.shards))
+
+    def _fan_out(self, call: Callable, items: Optional[list] = None) -> list:
+        """Run a call for every shard (or every item) in parallel. Results keep the input order."""
+        items = self.shards if items is None else items
+        if len(items) == 1:
+            return [call(items[0])]
+        return list(self._executor.map(call, items))
+
+    @property
+    def paths(self) -> List[str]:
+        """Database files holding this store's data."""
+        return [shard.db_path for shard in self.shards]
+
+    def path_for_guild(self, guild_id: int) -> str:
+        """Get the database file holding a guild's data."""
+        return self.for_guild(guild_id).db_path
+
+    def init_database(self):
+        """Initialize every shard and load the channel directory."""
+        def init_shard(shard: Database) -> List[int]:
+            shard.init_database()
+            return shard.get_known_channels()
+
+        for index, channels in enumerate(self._fan_out(init_shard)):
+            for channel_id in channels:
+                self.channel_shards[channel_id] = index
+        logging.info(f"Opened {len(self.shards)} database shards with {len(self.channel_shards)} known channels")
+
+    def get_score_version(self, guild_id: int) -> Tuple[int, int]:
+        """Get the current leaderboard score version for a guild."""
+        return (self.score_epoch, self.score_versions.get(guild_id, 0))
+
+    def _bump_score_version(self, guild_id: Optional[int] = None):
+        """Invalidate cached leaderboard data for one guild, or all guilds."""
+        with self._version_lock:
+            if guild_id is None:
+                self.score_epoch += 1
+            else:
+                self.score_versions[guild_id] = self.score_versions.get(guild_id, 0) + 1
+        for listener in self.score_listeners:
+            listener(guild_id)
+
+    def apply_claim(self, guild_id: int, channel_id: int, *args, **kwargs):
+        """Commit a claim/reclaim transition in the guild's shard."""
+        self.register_channel(channel_id, guild_id)
+        return self.for_guild(guild_id).apply_claim(guild_id, channel_id, *args, **kwargs)
+
+    def get_live_leaderboards(self, guild_id: Optional[int] = None):
+        """Get (guild_id, channel_id, message_id) of configured leaderboard channels."""
+        if guild_id is not None:
+            return self.for_guild(guild_id).get_live_leaderboards(guild_id)
+        return [row for rows in self._fan_out(lambda shard: shard.get_live_leaderboards()) for row in rows]
+
+    def get_staff_roles(self) -> Dict[int, int]:
+        """Get guild ID -> staff role ID for every configured guild."""
+        roles = {}
+        for shard_roles in self._fan_out(lambda shard: shard.get_staff_roles()):
+            roles.update(shard_roles)
+        return roles
+
+    def get_auto_dispatch_guilds(self) -> List[int]:
+        """Get every guild with automatic ticket assignment on, across shards."""
+        return [guild_id for guilds in self._fan_out(lambda shard: shard.get_auto_dispatch_guilds()) for guild_id in guilds]
+
+    def save_perf_sketches(self, rows: List[Tuple[int, int, str, str]]):
+        """Store response-time sketches, writing each guild's rows to its shard in parallel."""
+        groups = defaultdict(list)
+        for row in rows:
+            groups[shard_of(row[0], len(self.shards))].append(row)
+        self._fan_out(lambda index: self.shards[index].save_perf_sketches(groups[index]), list(groups))
+
+    def get_perf_sketches(self) -> List[Tuple[int, int, str, str]]:
+        """Get every stored response-time sketch across shards."""
+        return [row for rows in self._fan_out(lambda shard: shard.get_perf_sketches()) for row in rows]
+
+    def get_all_leaderboard_channels(self):
+        """Get (guild_id, channel_id) of every configured leaderboard channel."""
+        return [row for rows in self._fan_out(lambda shard: shard.get_all_leaderboard_channels()) for row in rows]
+
+    def get_group_guilds(self, group_name: str) -> List[int]:
+        """Get the guild IDs in a leaderboard group."""
+        return sorted(guild_id for guilds in self._fan_out(lambda shard: shard.get_group_guilds(group_name))
+                      for guild_id in guilds)
+
+    def reset_daily_leaderboard(self):
+        """Reset daily scores in every shard."""
+        self._fan_out(lambda shard: shard.reset_daily_leaderboard())
+
+    def reset_weekly_leaderboard(self):
+        """Reset weekly scores in every shard."""
+        self._fan_out(lambda shard: shard.reset_weekly_leaderboard())
+
+    def get_active_timeout_states(self):
+        """Get the full timeout state of every active claim."""
+        return [row for rows in self._fan_out(lambda shard: shard.get_active_timeout_states()) for row in rows]
+
+    def get_all_active_timeouts(self):
+        """Get every active timeout row."""
+        return [row for rows in self._fan_out(lambda shard: shard.get_all_active_timeouts()) for row in rows]
+
+    def get_recovery_candidates(self, claimer_id: Optional[int] = None, claimed_before: Optional[int] = None):
+        """Get (channel_id, guild_id, claimer_id, claim_time) of matching active claims, oldest first."""
+        rows = [row for rows in self._fan_out(lambda shard: shard.get_recovery_candidates(claimer_id, claimed_before))
+                for row in rows]
+        return sorted(rows, key=lambda row: row[3] or 0)
+
+    def ping(self):
+        """Confirm every shard is reachable."""
+        self._fan_out(lambda shard: shard.ping())
+
+    def get_state_fingerprint(self):
+        """Concatenate the shards' claim-state fingerprints."""
+        return [value for fingerprint in self._fan_out(lambda shard: shard.get_state_fingerprint()) for value in fingerprint]
+
+    def rollup_old_claims(self, cutoff: int, batch_size: int) -> int:
+        """Roll up one batch per shard. The total reaches batch_size while any shard has more."""
+        return sum(self._fan_out(lambda shard: shard.rollup_old_claims(cutoff, batch_size)))
+
+    def purge_stale_holders(self, cutoff: int) -> int:
+        """Delete stale ticket holder rows in every shard."""
+        return sum(self._fan_out(lambda shard: shard.purge_stale_holders(cutoff)))
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Free up to `pages` pages per shard. Returns the free pages left across shards."""
+        return sum(self._fan_out(lambda shard: shard.incremental_vacuum(pages)))
+
+    def get_freelist_count(self) -> int:
+        """Get the number of unused pages across shards."""
+        return sum(self._fan_out(lambda shard: shard.get_freelist_count()))
+
+    def purge_channel(self, channel_id: int):
+        """Remove all data for a deleted channel."""
+        self.for_channel(channel_id).purge_channel(channel_id)
+        self.channel_shards.pop(channel_id, None)
+
+    def _write_by_channel(self, name: str, items: list, channel_of: Callable):
+        """Split a batch of channel-keyed writes by shard and apply the parts in parallel."""
+        groups = defaultdict(list)
+        for item in items:
+            groups[self.channel_shards.get(channel_of(item), 0)].append(item)
+        self._fan_out(lambda index: getattr(self.shards[index], name)(groups[index]), list(groups))
+
+    def remove_timeouts(self, channel_ids: List[int]):
+        """Remove timeout tracking for several channels."""
+        self._write_by_channel('remove_timeouts', channel_ids, lambda channel_id: channel_id)
+
+    def update_last_messages(self, events: List[Tuple[int, int, int]]):
+        """Apply a batch of activity updates, writing to each affected shard in parallel."""
+        self._write_by_channel('update_last_messages', events, lambda event: event[0])
+
+def open_database(db_path: str = DATABASE_PATH, initialize: bool = True, clock=None):
+    """Open the configured store: one file, or DATABASE_SHARDS shard files."""
+    if DATABASE_SHARDS <= 0:
+        return Database(db_path, initialize=initialize, clock=clock)
+    if not os.path.isdir(DATABASE_SHARD_DIR) and os.path.exists(db_path):
+        raise RuntimeError(
+            f"Sharding is enabled but {DATABASE_SHARD_DIR} does not exist; "
+            f"split {db_path} first with: python sharding.py --shards {DATABASE_SHARDS}"
+        )
+    return ShardedDatabase(DATABASE_SHARD_DIR, DATABASE_SHARDS, initialize=initialize, clock=clock)
+
+def split_database(source_path: str, shard_dir: str, shard_count: int) -> dict:
+    """Copy a single database into shard files. Run while the bot is stopped; the source is left in place."""
+    paths = shard_paths(shard_dir, shard_count)
+    if any(os.path.exists(path) for path in paths):
+        raise FileExistsError(f"{shard_dir} already contains shard files")
+
+    # Bring the source schema up to date first, as the bot would on start
+    Database(source_path)
+    with sqlite3.connect(source_path) as conn:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        columns = {table: [row[1] for row in conn.execute(f'PRAGMA table_info({table})')] for table in tables}
+        source_counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in tables}
+        # Channel-keyed tables carry no guild ID; claims and ticket state do
+        channel_shards = {
+            channel_id: shard_of(guild_id, shard_count)
+            for channel_id, guild_id in conn.execute('''
+                SELECT channel_id, guild_id FROM ticket_claims WHERE guild_id IS NOT NULL
+                UNION ALL SELECT channel_id, guild_id FROM ticket_state WHERE guild_id IS NOT NULL
+            ''')
+        }
+
+    os.makedirs(shard_dir, exist_ok=True)
+    copied = defaultdict(int)
+    for index, path in enumerate(paths):
+        Database(path)
+        conn = sqlite3.connect(path)
+        try:
+            conn.create_function('shard_of', 1, lambda guild_id: None if guild_id is None else shard_of(guild_id, shard_count))
+            conn.execute('ATTACH DATABASE ? AS source', (source_path,))
+            conn.execute('CREATE TEMP TABLE channel_shard (channel_id INTEGER PRIMARY KEY, shard INTEGER)')
+            conn.executemany('INSERT INTO temp.channel_shard VALUES (?, ?)', channel_shards.items())
+
+            for table in tables:
+                target_columns = {row[1] for row in conn.execute(f'PRAGMA main.table_info({table})')}
+                shared = [column for column in columns[table] if column in target_columns]
+                if 'guild_id' in shared:
+                    condition = 'shard_of(guild_id) = ?'
+                elif 'channel_id' in shared:
+                    condition = 'channel_id IN (SELECT channel_id FROM temp.channel_shard WHERE shard = ?)'
+                else:
+                    logging.warning(f"Table {table} has no guild or channel column, not copied")
+                    continue
+                column_list = ', '.join(shared)
+                cursor = conn.execute(
+                    f'INSERT INTO main.{table} ({column_list}) SELECT {column_list} FROM source.{table} WHERE {condition}',
+                    (index,)
+                )
+                copied[table] += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        logging.info(f"Wrote shard {index} to {path}")
+
+    # Rows that could not be tied to a guild (e.g. a holder set on a never-claimed channel) are left behind
+    skipped = {table: source_counts[table] - copied[table] for table in tables if source_counts[table] != copied[table]}
+    return {'shards': shard_count, 'copied': dict(copied), 'skipped': skipped}
+
+def main(argv=None):
+    """Command-line entry point: python sharding.py --shards N [--source PATH] [--out DIR]"""
+    parser = argparse.ArgumentParser(description="Split the single database into shard files. Run while the bot is stopped.")
+    parser.add_argument('--shards', type=int, required=True, help="Number of shard files (set DATABASE_SHARDS to match)")
+    parser.add_argument('--source', default=DATABASE_PATH)
+    parser.add_argument('--out', default=DATABASE_SHARD_DIR)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    report = split_database(args.source, args.out, args.shards)
+
+    for table, rows in sorted(report['copied'].items()):
+        print(f"{table}: {rows} rows")
+    for table, rows in sorted(report['skipped'].items()):
+        print(f"{table}: {rows} rows without a known guild were not copied")
+    print(f"Split {args.source} into {report['shards']} shards in {args.out}; start the bot with DATABASE_SHARDS={report['shards']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import math
+from typing import Dict, Optional
+
+from config import PERF_SKETCH_ACCURACY, PERF_SKETCH_MAX_BUCKETS
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch with bounded memory.
+
+    Values are counted in logarithmically sized buckets (DDSketch-style), so any
+    reported quantile is within the configured relative accuracy. When the bucket
+    limit is reached the lowest buckets are collapsed, which only affects the
+    smallest values.
+    """
+
+    def __init__(self, relative_accuracy: float = PERF_SKETCH_ACCURACY, max_buckets: int = PERF_SKETCH_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, count: int = 1):
+        """Record a value."""
+        if value < 1e-9:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'QuantileSketch'):
+        """Fold another sketch with the same accuracy into this one."""
+        if other.count == 0:
+            return
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Get the value at quantile q (0..1)."""
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return max(self.min, min(self.max, value))
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Mean of all recorded values."""
+        return self.total / self.count if self.count else None
+
+    def _collapse(self):
+        """Merge the two lowest buckets to stay within the bucket limit."""
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def to_dict(self) -> dict:
+        """Serialize to a JSON-compatible dict."""
+        return {
+            'accuracy': self.relative_accuracy,
+            'buckets': [[key, count] for key, count in self.buckets.items()],
+            'zero': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        """Rebuild a sketch produced by to_dict."""
+        sketch = cls(relative_accuracy=data.get('accuracy', PERF_SKETCH_ACCURACY))
+        sketch.buckets = {int(key): count for key, count in data.get('buckets', [])}
+        sketch.zero_count = data.get('zero', 0)
+        sketch.count = data.get('count', 0)
+        sketch.total = data.get('total', 0.0)
+        sketch.min = data.get('min')
+        sketch.max = data.get('max')
+        return sketch
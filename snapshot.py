@@ -0,0 +1,105 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config import SNAPSHOT_PATH, SNAPSHOT_MAX_AGE_SECONDS
+
+SNAPSHOT_VERSION = 2  # 2: timestamps are epoch milliseconds
+
+class StateSnapshot:
+    """Checkpoint of in-memory state, written on clean shutdown and warm-loaded on boot."""
+
+    def __init__(self, path: str = SNAPSHOT_PATH, max_age: int = SNAPSHOT_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        # Section name -> (dump, load, clear); dump returns JSON-serializable data, load receives it back,
+        # clear drops whatever load put in place
+        self.sections: Dict[str, Tuple[Callable, Callable, Callable]] = {}
+
+    def register(self, name: str, dump: Callable, load: Callable, clear: Callable):
+        """Register a named section of state to checkpoint."""
+        self.sections[name] = (dump, load, clear)
+
+    def save(self, fingerprint) -> bool:
+        """Dump all sections and write them with a clean-shutdown marker."""
+        payload = {
+            'version': SNAPSHOT_VERSION,
+            'clean_shutdown': True,
+            'written_at': time.time(),
+            'fingerprint': fingerprint,
+            'sections': {}
+        }
+
+        for name, (dump, _, _) in self.sections.items():
+            try:
+                payload['sections'][name] = dump()
+            except Exception as e:
+                logging.error(f"Error dumping snapshot section {name}: {e}")
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            logging.info(f"State snapshot written to {self.path} ({len(payload['sections'])} sections)")
+            return True
+        except Exception as e:
+            logging.error(f"Error writing state snapshot: {e}")
+            return False
+
+    def load(self, fingerprint) -> Optional[str]:
+        """Warm-load sections if the snapshot is valid.
+
+        Returns None on success, otherwise the reason the snapshot was rejected.
+        The snapshot file is consumed either way so a later crash never reuses it.
+        """
+        if not os.path.exists(self.path):
+            return "no snapshot"
+
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                payload = json.load(f)
+        except Exception as e:
+            self._discard()
+            return f"unreadable snapshot ({e})"
+
+        self._discard()
+
+        if payload.get('version') != SNAPSHOT_VERSION:
+            return "snapshot version mismatch"
+        if not payload.get('clean_shutdown'):
+            return "previous shutdown was not clean"
+        if time.time() - payload.get('written_at', 0) > self.max_age:
+            return "snapshot is stale"
+        # JSON turns tuples into lists, so compare in the same shape
+        if payload.get('fingerprint') != json.loads(json.dumps(fingerprint)):
+            return "snapshot does not match database"
+
+        for name, data in payload.get('sections', {}).items():
+            if name not in self.sections:
+                continue
+            try:
+                self.sections[name][1](data)
+            except Exception as e:
+                logging.error(f"Error loading snapshot section {name}: {e}")
+                return f"section {name} failed to load"
+
+        return None
+
+    def clear(self):
+        """Clear every section, e.g. after a load failed partway and earlier sections were already loaded."""
+        for name, (_, _, clear) in self.sections.items():
+            try:
+                clear()
+            except Exception as e:
+                logging.error(f"Error clearing snapshot section {name}: {e}")
+
+    def _discard(self):
+        """Remove the snapshot file."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
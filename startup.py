@@ -0,0 +1,44 @@
+import logging
+import time
+from typing import Dict
+
+class StartupProfiler:
+    """Timings of cold-start phases, measured from when this module is first imported."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._last = self.origin
+        self.phases: Dict[str, float] = {}  # Phase -> seconds since the previous checkpoint
+        self.offsets: Dict[str, float] = {}  # Phase -> seconds since origin when it finished
+        self.logged = False
+
+    def mark(self, phase: str):
+        """Close a sequential phase at the current time. Later marks of the same phase are ignored."""
+        if phase in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self.offsets[phase] = now - self.origin
+        self._last = now
+
+    def record(self, phase: str, seconds: float):
+        """Record a phase that ran concurrently with others (e.g. DB init during login)."""
+        self.phases.setdefault(phase, seconds)
+
+    def report(self) -> dict:
+        """Get phase durations and the time to the last checkpoint, in milliseconds."""
+        return {
+            'phases_ms': {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            'total_ms': round((self._last - self.origin) * 1000, 1)
+        }
+
+    def log_report(self):
+        """Log the startup breakdown once."""
+        if self.logged:
+            return
+        self.logged = True
+        report = self.report()
+        breakdown = ", ".join(f"{phase} {ms} ms" for phase, ms in report['phases_ms'].items())
+        logging.info(f"Startup timings: {breakdown} (total {report['total_ms']} ms)")
+
+profiler = StartupProfiler()
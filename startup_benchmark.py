@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from config import DATABASE_PATH, STARTUP_BENCH_HISTORY
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter so every import is cold; prints one JSON line
+_CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import bot
+imported = time.perf_counter()
+instance = bot.TicketBot()
+constructed = time.perf_counter()
+db_started = time.perf_counter()
+if bot.FAST_BOOT:
+    instance.database.init_database()
+db_done = time.perf_counter()
+import leaderboard, apscheduler.schedulers.asyncio, apscheduler.triggers.cron, pytz
+deferred = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'construct_ms': (constructed - imported) * 1000,
+    'db_init_ms': (db_done - db_started) * 1000,
+    'deferred_ms': (deferred - db_done) * 1000
+}))
+'''
+
+def run_once(fast_boot: bool, db_source: Optional[str]) -> dict:
+    """Measure one cold start in a subprocess against a scratch copy of the database."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        if db_source and os.path.exists(db_source):
+            shutil.copy2(db_source, os.path.join(work_dir, os.path.basename(DATABASE_PATH)))
+        env = dict(os.environ, FAST_BOOT='1' if fast_boot else '0', PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE='1')
+        result = subprocess.run(
+            [sys.executable, '-c', _CHILD], cwd=work_dir, env=env,
+            capture_output=True, text=True, check=True
+        )
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+    if fast_boot:
+        # DB init overlaps the login round trip and deferred imports happen after ready
+        timings['critical_ms'] = timings['import_ms'] + timings['construct_ms']
+    else:
+        timings['critical_ms'] = timings['import_ms'] + timings['construct_ms'] + timings['deferred_ms']
+    return timings
+
+def benchmark(runs: int, db_source: Optional[str]) -> dict:
+    """Median timings per mode over several cold starts."""
+    results = {}
+    for mode, fast_boot in (('eager', False), ('fast', True)):
+        samples = [run_once(fast_boot, db_source) for _ in range(runs)]
+        results[mode] = {
+            key: round(statistics.median(sample[key] for sample in samples), 1)
+            for key in samples[0]
+        }
+    return results
+
+def _last_entry(history_path: str) -> Optional[dict]:
+    """Get the previous benchmark entry, if any."""
+    if not os.path.exists(history_path):
+        return None
+    last = None
+    with open(history_path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+def main(argv=None):
+    """Command-line entry point: python startup_benchmark.py [--runs N] [--db PATH]"""
+    parser = argparse.ArgumentParser(description="Benchmark cold-start phases without connecting to Discord.")
+    parser.add_argument('--runs', type=int, default=5, help="Cold starts per mode (median is reported)")
+    parser.add_argument('--db', default=DATABASE_PATH, help="Database copied into each run (default: live database)")
+    parser.add_argument('--history', default=STARTUP_BENCH_HISTORY, help="JSONL file results are appended to")
+    args = parser.parse_args(argv)
+
+    results = benchmark(max(1, args.runs), args.db)
+    previous = _last_entry(args.history)
+
+    for mode, timings in results.items():
+        line = ", ".join(f"{key} {value} ms" for key, value in timings.items())
+        if previous and mode in previous.get('results', {}):
+            delta = timings['critical_ms'] - previous['results'][mode]['critical_ms']
+            line += f" ({delta:+.1f} ms critical path vs previous)"
+        print(f"{mode}: {line}")
+
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'at': int(time.time()), 'runs': args.runs, 'results': results}) + '\n')
+
+if __name__ == '__main__':
+    main()
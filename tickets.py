@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from tracing import traced
+
+class TicketState(str, Enum):
+    UNCLAIMED = "unclaimed"
+    CLAIMED = "claimed"
+    TIMED_OUT = "timed_out"
+    RECLAIMED = "reclaimed"
+    COMPLETED = "completed"
+
+ACTIVE_STATES = {TicketState.CLAIMED, TicketState.RECLAIMED}
+
+# Action -> (states it may start from, resulting state)
+TRANSITIONS = {
+    'claim': ({TicketState.UNCLAIMED, TicketState.TIMED_OUT, TicketState.COMPLETED}, TicketState.CLAIMED),
+    'reclaim': ({TicketState.TIMED_OUT} | ACTIVE_STATES, TicketState.RECLAIMED),
+    'staff_timeout': (ACTIVE_STATES, TicketState.TIMED_OUT),
+    'holder_timeout': (ACTIVE_STATES, TicketState.COMPLETED),
+    'unclaim': (ACTIVE_STATES, TicketState.COMPLETED),
+    'recovery': (ACTIVE_STATES, TicketState.COMPLETED)
+}
+
+class InvalidTransition(Exception):
+    """Raised when an action is not allowed from a ticket's current state."""
+
+    def __init__(self, action: str, state: TicketState):
+        super().__init__(f"Cannot {action} a ticket that is {state.value}")
+        self.action = action
+        self.state = state
+
+class ChannelLocks:
+    """One asyncio lock per channel, created on demand and dropped when idle."""
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, channel_id: int):
+        lock = self._locks.get(channel_id)
+        if lock is None:
+            lock = self._locks[channel_id] = asyncio.Lock()
+        self._users[channel_id] = self._users.get(channel_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[channel_id] -= 1
+            if self._users[channel_id] == 0:
+                del self._users[channel_id]
+                del self._locks[channel_id]
+
+    def is_held(self, channel_id: int) -> bool:
+        """Check whether a transition is running (or waiting) on a channel."""
+        return channel_id in self._locks
+
+    def __len__(self):
+        return len(self._locks)
+
+class TicketService:
+    """Ticket state machine: every transition runs under the channel lock and commits in one transaction."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.locks = ChannelLocks()
+        # Called as listener(channel, action, previous claimer ID, new claimer ID) after each committed transition
+        self.listeners: List[Callable] = []
+
+    def _notify(self, channel, action: str, previous_claimer_id: Optional[int], claimer_id: Optional[int]):
+        """Tell listeners about a committed transition; a failing listener never undoes it."""
+        for listener in self.listeners:
+            try:
+                listener(channel, action, previous_claimer_id, claimer_id)
+            except Exception as e:
+                logging.error(f"Error in ticket transition listener for channel {channel.id}: {e}")
+
+    async def get_state(self, channel_id: int) -> TicketState:
+        """Get a ticket's current state."""
+        return await asyncio.to_thread(self.bot.database.get_ticket_state, channel_id)
+
+    @traced('ticket.claim')
+    async def claim(self, channel, claimer, ticket_holder, staff_role, set_holder: bool,
+                    action: str = 'claim', set_by: Optional[int] = None) -> TicketState:
+        """Claim (or reclaim) a ticket for a staff member."""
+        expected, new_state = TRANSITIONS[action]
+        database = self.bot.database
+
+        async with self.locks.hold(channel.id):
+            state = await asyncio.to_thread(database.get_ticket_state, channel.id)
+            if state not in expected:
+                raise InvalidTransition(action, state)
+
+            # Taking over an active claim: put back the permissions it replaced first,
+            # so the new claim records the channel's real originals
+            previous_claimer_id = None
+            previous_timeline = None
+            if state in ACTIVE_STATES:
+                timeout_info = await asyncio.to_thread(database.get_timeout_info, channel.id)
+                if timeout_info:
+                    previous_claimer_id = timeout_info[0]
+                    await self.bot.permissions.restore_channel_permissions(
+                        channel, timeout_info[5], staff_role.id, previous_claimer_id
+                    )
+                timeline = self.bot.timelines.get(channel.id)
+                previous_timeline = timeline.to_bytes() if timeline is not None else None
+
+            original_permissions = None
+            try:
+                original_permissions = await self.bot.permissions.restrict_channel_permissions(
+                    channel, ticket_holder, claimer, staff_role
+                )
+                await asyncio.to_thread(
+                    database.apply_claim, channel.guild.id, channel.id, claimer.id, ticket_holder.id,
+                    set_by if set_by is not None else claimer.id, original_permissions,
+                    action, expected, new_state, set_holder, previous_timeline
+                )
+            except Exception:
+                # Nothing was committed: the previous claim (if any) is still the live one
+                await self._undo_claim_permissions(channel, staff_role, claimer, original_permissions, previous_claimer_id)
+                raise
+
+            if state in ACTIVE_STATES:
+                # The previous claim ended with the commit
+                await self.bot.timeout_manager.stop_timeout_monitoring(channel.id)
+                self.bot.perf_stats.end_claim(channel.id)
+                self.bot.timelines.finish(channel.id)
+
+            self.bot.perf_stats.track_claim(channel.id, channel.guild.id, claimer.id, ticket_holder.id)
+            self.bot.timelines.start(channel.id, claimer.id, ticket_holder.id)
+            await self.bot.timeout_manager.start_timeout_monitoring(channel.id)
+            self._notify(channel, action, previous_claimer_id, claimer.id)
+
+            logging.info(f"Ticket {channel.id}: {state.value} -> {new_state.value} ({action} by {claimer.id})")
+            return new_state
+
+    async def _undo_claim_permissions(self, channel, staff_role, claimer, original_permissions: Optional[str],
+                                      previous_claimer_id: Optional[int]):
+        """Undo a failed transition's overwrites and give the claim that is still live its own back."""
+        try:
+            if original_permissions is not None:
+                await self.bot.permissions.restore_channel_permissions(
+                    channel, original_permissions, staff_role.id, claimer.id
+                )
+            if previous_claimer_id is not None:
+                previous_claimer = await self.bot.permissions.resolve_member(channel.guild, previous_claimer_id)
+                if previous_claimer is not None:
+                    await self.bot.permissions.reapply_claim_permissions(channel, staff_role, previous_claimer)
+        except Exception as e:
+            # The reconciler corrects whatever is left over on its next pass
+            logging.error(f"Error rolling back permissions for channel {channel.id}: {e}")
+
+    @traced('ticket.complete')
+    async def complete(self, channel, action: str, stop_monitoring: bool = True,
+                       expected_claimer: Optional[int] = None) -> Optional[tuple]:
+        """End the active claim on a ticket. Returns the timeout info it ended.
+
+        With expected_claimer set, the transition is refused if the ticket has
+        been claimed by someone else since the caller looked at it.
+        """
+        expected, new_state = TRANSITIONS[action]
+        database = self.bot.database
+
+        async with self.locks.hold(channel.id):
+            state = await asyncio.to_thread(database.get_ticket_state, channel.id)
+            if state not in expected:
+                raise InvalidTransition(action, state)
+
+            timeout_info = await asyncio.to_thread(database.get_timeout_info, channel.id)
+            if not timeout_info:
+                raise InvalidTransition(action, TicketState.UNCLAIMED)
+            if expected_claimer is not None and timeout_info[0] != expected_claimer:
+                raise InvalidTransition(action, state)
+
+            # Restore original permissions
+            staff_role_id = (await asyncio.to_thread(database.get_guild_config, channel.guild.id))[0]
+            await self.bot.permissions.restore_channel_permissions(channel, timeout_info[5], staff_role_id, timeout_info[0])
+
+            timeline = self.bot.timelines.get(channel.id)
+            try:
+                await asyncio.to_thread(
+                    database.apply_completion, channel.id, action, expected, new_state,
+                    timeout_occurred=(action == 'staff_timeout'), officer_used=bool(timeout_info[6]),
+                    timeline=timeline.to_bytes() if timeline is not None else None
+                )
+            except Exception:
+                # Nothing was committed: the claim is still the live one, so give it its overwrites back
+                staff_role = channel.guild.get_role(staff_role_id) if staff_role_id else None
+                await self._undo_claim_permissions(channel, staff_role, None, None, timeout_info[0])
+                raise
+
+            self.bot.perf_stats.end_claim(channel.id)
+            await self.bot.perf_stats.flush(database)
+            self.bot.timelines.finish(channel.id)
+            if stop_monitoring:
+                await self.bot.timeout_manager.stop_timeout_monitoring(channel.id)
+            self._notify(channel, action, timeout_info[0], None)
+
+            logging.info(f"Ticket {channel.id}: {state.value} -> {new_state.value} ({action})")
+            return timeout_info
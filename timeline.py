@@ -0,0 +1,198 @@
+import base64
+import logging
+import struct
+import sys
+from array import array
+from typing import Dict, Optional
+
+from config import TIMELINE_MAX_EVENTS, RESPONSE_WINDOW_MINUTES
+from timeutil import now_ms
+
+# Who spoke; message contents are never stored
+ROLE_CLAIMER = 0
+ROLE_HOLDER = 1
+ROLE_OTHER = 2
+
+# Blob layout: version, base timestamp (ms), event count, dropped count, then roles and deltas
+_HEADER = struct.Struct('<BqII')
+_VERSION = 1
+_MAX_DELTA = 0xFFFFFFFF
+
+class TicketTimeline:
+    """Append-only message timeline for one claim, delta-encoded in array buffers.
+
+    Timestamps are integer milliseconds; each event stores its distance from
+    the previous one. Once max_events is reached the oldest quarter is folded
+    into the base timestamp, so memory stays bounded for long tickets.
+    """
+    __slots__ = ('claimer_id', 'holder_id', 'base_ms', 'last_ms', 'roles', 'deltas', 'dropped', 'max_events')
+
+    def __init__(self, claimer_id: int, holder_id: int, started_ms: int,
+                 max_events: int = TIMELINE_MAX_EVENTS):
+        self.claimer_id = claimer_id
+        self.holder_id = holder_id
+        self.base_ms = int(started_ms)
+        self.last_ms = self.base_ms
+        self.roles = array('B')
+        self.deltas = array('I')
+        self.dropped = 0
+        self.max_events = max(4, max_events)
+
+    def role_of(self, user_id: int) -> int:
+        """Classify a message author."""
+        if user_id == self.claimer_id:
+            return ROLE_CLAIMER
+        if user_id == self.holder_id:
+            return ROLE_HOLDER
+        return ROLE_OTHER
+
+    def append(self, user_id: int, sent_ms: int):
+        """Record a message event."""
+        # Events arrive in timestamp order per batch; clamp stragglers rather than reorder
+        delta = min(max(0, sent_ms - self.last_ms), _MAX_DELTA)
+
+        if len(self.roles) >= self.max_events:
+            self._compact()
+
+        self.roles.append(self.role_of(user_id))
+        self.deltas.append(delta)
+        self.last_ms += delta
+
+    def _compact(self):
+        """Drop the oldest quarter of events, folding their deltas into the base."""
+        count = self.max_events // 4
+        self.base_ms += sum(self.deltas[:count])
+        del self.roles[:count]
+        del self.deltas[:count]
+        self.dropped += count
+
+    def __len__(self):
+        return len(self.roles)
+
+    def events(self):
+        """Yield (role, epoch ms) pairs in order."""
+        current = self.base_ms
+        for role, delta in zip(self.roles, self.deltas):
+            current += delta
+            yield role, current
+
+    def summarize(self, now: Optional[int] = None, window_minutes: float = RESPONSE_WINDOW_MINUTES) -> dict:
+        """Summarize claimer responsiveness to the ticket holder. Durations are in seconds."""
+        now = now if now is not None else now_ms()
+        window = window_minutes * 60000
+        summary = {
+            'claimer_messages': 0,
+            'holder_messages': 0,
+            'turns': 0,  # Holder messages that were (or still are) waiting for a reply
+            'answered_in_window': 0,
+            'max_wait': 0.0,
+            'pending_wait': None,  # Seconds the holder has been waiting right now
+            'last_claimer_age': None,
+            'dropped': self.dropped
+        }
+
+        waiting_since = None
+        last_claimer = None
+        for role, sent_at in self.events():
+            if role == ROLE_HOLDER:
+                summary['holder_messages'] += 1
+                if waiting_since is None:
+                    waiting_since = sent_at
+            elif role == ROLE_CLAIMER:
+                summary['claimer_messages'] += 1
+                last_claimer = sent_at
+                if waiting_since is not None:
+                    wait_ms = sent_at - waiting_since
+                    summary['turns'] += 1
+                    summary['max_wait'] = max(summary['max_wait'], wait_ms / 1000)
+                    if wait_ms <= window:
+                        summary['answered_in_window'] += 1
+                    waiting_since = None
+
+        if waiting_since is not None:
+            summary['turns'] += 1
+            summary['pending_wait'] = max(0.0, (now - waiting_since) / 1000)
+            summary['max_wait'] = max(summary['max_wait'], summary['pending_wait'])
+        if last_claimer is not None:
+            summary['last_claimer_age'] = max(0.0, (now - last_claimer) / 1000)
+        return summary
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact little-endian blob."""
+        roles, deltas = self.roles, self.deltas
+        if sys.byteorder != 'little':
+            deltas = array('I', deltas)
+            deltas.byteswap()
+        return (_HEADER.pack(_VERSION, self.base_ms, len(roles), self.dropped)
+                + roles.tobytes() + deltas.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, claimer_id: int = 0, holder_id: int = 0) -> 'TicketTimeline':
+        """Deserialize a blob produced by to_bytes."""
+        version, base_ms, count, dropped = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported timeline version {version}")
+
+        timeline = cls(claimer_id, holder_id, base_ms)
+        offset = _HEADER.size
+        timeline.roles.frombytes(data[offset:offset + count])
+        offset += count
+        timeline.deltas.frombytes(data[offset:offset + count * timeline.deltas.itemsize])
+        if sys.byteorder != 'little':
+            timeline.deltas.byteswap()
+        if len(timeline.roles) != count or len(timeline.deltas) != count:
+            raise ValueError("Truncated timeline blob")
+
+        timeline.dropped = dropped
+        timeline.last_ms = base_ms + sum(timeline.deltas)
+        timeline.max_events = max(timeline.max_events, count)
+        return timeline
+
+class TimelineStore:
+    """Timelines for every actively claimed ticket, keyed by channel."""
+
+    def __init__(self):
+        self.active: Dict[int, TicketTimeline] = {}
+
+    def start(self, channel_id: int, claimer_id: int, holder_id: int, started_ms: Optional[int] = None):
+        """Begin a fresh timeline for a new claim."""
+        self.active[channel_id] = TicketTimeline(
+            claimer_id, holder_id, started_ms if started_ms is not None else now_ms()
+        )
+
+    def is_tracking(self, channel_id: int) -> bool:
+        """Check whether a channel has a timeline."""
+        return channel_id in self.active
+
+    def get(self, channel_id: int) -> Optional[TicketTimeline]:
+        """Get a channel's live timeline."""
+        return self.active.get(channel_id)
+
+    def observe(self, channel_id: int, user_id: int, sent_ms: int):
+        """Append a message event to a tracked ticket."""
+        timeline = self.active.get(channel_id)
+        if timeline is not None:
+            timeline.append(user_id, sent_ms)
+
+    def finish(self, channel_id: int) -> Optional[bytes]:
+        """Stop tracking a claim and return its timeline blob for persistence."""
+        timeline = self.active.pop(channel_id, None)
+        return timeline.to_bytes() if timeline is not None else None
+
+    def export_state(self) -> dict:
+        """Export live timelines in a JSON-serializable form."""
+        return {
+            'active': [
+                [channel_id, t.claimer_id, t.holder_id, base64.b64encode(t.to_bytes()).decode('ascii')]
+                for channel_id, t in self.active.items()
+            ]
+        }
+
+    def import_state(self, state: dict):
+        """Load state previously produced by export_state."""
+        for channel_id, claimer_id, holder_id, blob in state.get('active', []):
+            try:
+                self.active[channel_id] = TicketTimeline.from_bytes(base64.b64decode(blob), claimer_id, holder_id)
+            except (ValueError, struct.error) as e:
+                logging.warning(f"Skipping unreadable timeline for channel {channel_id}: {e}")
+        logging.info(f"Loaded {len(self.active)} ticket timelines")
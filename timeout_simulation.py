@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from database import Database
+from perfstats import ResponseTimeTracker
+from sharding import ShardedDatabase
+from tickets import TicketService, InvalidTransition
+from timeline import TimelineStore
+from timeouts import TimeoutManager
+from timeutil import SimulatedClock, set_clock
+
+STAFF_TIMEOUT_PREFIX = "⏰ **Staff Timeout:**"
+HOLDER_TIMEOUT_PREFIX = "👋 Hey"
+
+class _SimChannel:
+    """Ticket channel that records what the bot sends instead of calling Discord."""
+
+    def __init__(self, channel_id: int, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.category_id = None
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+class _SimPermissions:
+    """Permission manager stand-in; overwrites are not part of the timeout engine."""
+
+    async def restrict_channel_permissions(self, channel, ticket_holder, staff_member, staff_role):
+        return str({'staff_role': None, 'staff_member': None})
+
+    async def restore_channel_permissions(self, channel, original_permissions_str, staff_role_id, claimer_id):
+        pass
+
+class _SimBot:
+    """Carries the real timeout and scoring managers, with every clock pointed at the simulation."""
+
+    def __init__(self, work_dir: str, clock: SimulatedClock, channels: int, guilds: int, shards: int):
+        if shards:
+            self.database = ShardedDatabase(os.path.join(work_dir, 'shards'), shards, clock=clock)
+        else:
+            self.database = Database(os.path.join(work_dir, 'simulation.db'), clock=clock)
+        self.permissions = _SimPermissions()
+        self.timeout_manager = TimeoutManager(self, clock=clock)
+        self.perf_stats = ResponseTimeTracker()
+        self.timelines = TimelineStore()
+        self.tickets = TicketService(self)
+        self.guilds = [SimpleNamespace(id=guild_id) for guild_id in range(1, guilds + 1)]
+        self.channels = {
+            channel_id: _SimChannel(channel_id, self.guilds[channel_id % guilds])
+            for channel_id in range(1000, 1000 + channels)
+        }
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+async def simulate(args) -> dict:
+    """Run claims, conversations and timeouts for args.hours of simulated time."""
+    rng = random.Random(args.seed)
+    clock = SimulatedClock()
+    previous_clock = set_clock(clock)
+    staff_role = SimpleNamespace(id=1)
+    # Each staff member answers a waiting holder with their own per-minute probability
+    staff = [SimpleNamespace(id=100 + i, rate=rng.uniform(args.min_reply, args.max_reply)) for i in range(args.staff)]
+    counts = {'claims': 0, 'messages': 0, 'closed': 0, 'points': 0}
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            bot = _SimBot(work_dir, clock, args.channels, max(1, args.guilds), args.shards)
+            channels = list(bot.channels.values())
+            holders = {channel.id: SimpleNamespace(id=channel.id * 10) for channel in channels}
+            claimers = {}
+            waiting_on = {}  # Channel ID -> 'staff' or 'holder'
+            started_at = time.perf_counter()
+
+            async def claim(channel):
+                claimer = rng.choice(staff)
+                try:
+                    await bot.tickets.claim(channel, claimer, holders[channel.id], staff_role, set_holder=True)
+                except InvalidTransition:
+                    return
+                claimers[channel.id] = claimer
+                waiting_on[channel.id] = 'staff'
+                counts['claims'] += 1
+
+            async def close(channel):
+                timeline = bot.timelines.get(channel.id)
+                awarded = await asyncio.to_thread(
+                    bot.database.analyze_conversation_and_award_points, channel.id,
+                    timeline.summarize() if timeline is not None else None
+                )
+                try:
+                    await bot.tickets.complete(channel, 'unclaim')
+                except InvalidTransition:
+                    return
+                counts['closed'] += 1
+                counts['points'] += bool(awarded)
+
+            await asyncio.gather(*(claim(channel) for channel in channels))
+
+            for _ in range(int(args.hours * 60)):
+                now = clock.now_ms()
+                events, to_claim, to_close = [], [], []
+                for channel in channels:
+                    if not bot.timelines.is_tracking(channel.id):
+                        if rng.random() < args.reclaim_chance:
+                            to_claim.append(channel)
+                        continue
+
+                    claimer = claimers[channel.id]
+                    if waiting_on[channel.id] == 'staff' and rng.random() < claimer.rate:
+                        events.append((channel.id, claimer.id, now))
+                        waiting_on[channel.id] = 'holder'
+                    elif waiting_on[channel.id] == 'holder' and rng.random() < args.holder_reply:
+                        events.append((channel.id, holders[channel.id].id, now))
+                        waiting_on[channel.id] = 'staff'
+                    elif rng.random() < args.close_chance:
+                        to_close.append(channel)
+
+                await asyncio.to_thread(bot.database.update_last_messages, events)
+                for channel_id, user_id, sent_at in events:
+                    bot.timelines.observe(channel_id, user_id, sent_at)
+                    bot.perf_stats.observe(channel_id, user_id, sent_at / 1000)
+                counts['messages'] += len(events)
+
+                await asyncio.gather(*(close(channel) for channel in to_close))
+                await asyncio.gather(*(claim(channel) for channel in to_claim))
+                await clock.advance(60)
+
+            wall_seconds = time.perf_counter() - started_at
+            for channel_id in list(bot.timeout_manager.timeout_tasks):
+                await bot.timeout_manager.stop_timeout_monitoring(channel_id)
+            await asyncio.sleep(0)
+
+            sent = [content for channel in channels for content in channel.sent]
+            points = Counter()
+            for guild in bot.guilds:
+                points.update(dict(await asyncio.to_thread(bot.database.get_leaderboard, guild.id, "total")))
+    finally:
+        set_clock(previous_clock)
+
+    return {
+        **counts,
+        'staff_timeouts': sum(content.startswith(STAFF_TIMEOUT_PREFIX) for content in sent),
+        'holder_timeouts': sum(content.startswith(HOLDER_TIMEOUT_PREFIX) for content in sent),
+        'still_claimed': len(bot.timelines.active),
+        'top_staff': points.most_common(5),
+        'wall_s': round(wall_seconds, 2),
+        'speedup': round(args.hours * 3600 / wall_seconds) if wall_seconds else None
+    }
+
+def main(argv=None):
+    """Command-line entry point: python timeout_simulation.py [--channels N] [--hours H]"""
+    parser = argparse.ArgumentParser(
+        description="Drive the timeout and scoring engine through hours of simulated time against a scratch database."
+    )
+    parser.add_argument('--channels', type=int, default=200, help="Ticket channels claimed concurrently")
+    parser.add_argument('--hours', type=float, default=4, help="Simulated hours to run")
+    parser.add_argument('--guilds', type=int, default=1, help="Guilds the channels are spread across")
+    parser.add_argument('--shards', type=int, default=0, help="Database shard files (0 for a single file)")
+    parser.add_argument('--staff', type=int, default=20, help="Staff members claiming tickets")
+    parser.add_argument('--min-reply', type=float, default=0.03, help="Slowest staff per-minute reply probability")
+    parser.add_argument('--max-reply', type=float, default=0.5, help="Fastest staff per-minute reply probability")
+    parser.add_argument('--holder-reply', type=float, default=0.2, help="Holder per-minute reply probability")
+    parser.add_argument('--close-chance', type=float, default=0.02, help="Per-minute chance staff closes an idle ticket")
+    parser.add_argument('--reclaim-chance', type=float, default=0.1, help="Per-minute chance an ended ticket is claimed again")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="Log at INFO level")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    result = asyncio.run(simulate(args))
+
+    print(f"{args.hours} simulated hours over {args.channels} channels in {result['wall_s']} s ({result['speedup']}x)")
+    print(f"{result['claims']} claims, {result['messages']} messages, {result['closed']} closed by staff "
+          f"({result['points']} points awarded), {result['still_claimed']} still claimed")
+    print(f"{result['staff_timeouts']} staff timeouts, {result['holder_timeouts']} holder timeouts")
+    for user_id, points in result['top_staff']:
+        print(f"  staff {user_id}: {points} points")
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,40 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 import discord
 
+from config import RESUME_CONCURRENCY
+from tickets import InvalidTransition
+from timeutil import get_clock
+from tracing import traced
+
+DEFAULT_TIMEOUT_SECONDS = 15 * 60
+
+def compute_deadline(claim_time: int, last_staff: int, last_holder: int,
+                     timeout_seconds: int) -> Tuple[int, str]:
+    """Get when a claim times out (epoch ms) and who is responsible ('holder' or 'staff')."""
+    timeout_delta = timeout_seconds * 1000
+
+    # Whoever spoke last is waiting on the other party
+    if last_staff > last_holder:
+        kind = 'holder'
+        last_active = last_holder
+    else:
+        kind = 'staff'
+        last_active = last_staff
+
+    # A timeout can never occur before a full period has passed since the claim
+    return max(claim_time, last_active) + timeout_delta, kind
+
 class TimeoutManager:
-    def __init__(self, bot):
+    def __init__(self, bot, clock=None):
         self.bot = bot
+        self.clock = clock or get_clock()
         self.timeout_tasks: Dict[int, asyncio.Task] = {}
         self.test_timeouts: Dict[int, int] = {}  # Channel ID -> test timeout in seconds
+        self.deadlines: Dict[int, Tuple[int, str]] = {}  # Channel ID -> (next deadline in epoch ms, who times out)
+        self._resume_lock = asyncio.Lock()
     
     def set_test_timeout(self, channel_id: int, timeout_seconds: int):
         """Set a test timeout for a specific channel."""
@@ -22,84 +48,184 @@ class TimeoutManager:
             # Remove test timeout after use (one-time only)
             del self.test_timeouts[channel_id]
             return duration
-        return 15 * 60  # Default 15 minutes in seconds
+        return DEFAULT_TIMEOUT_SECONDS
+    
+    def export_state(self) -> dict:
+        """Export in-memory timer state in a JSON-serializable form.
+        
+        Deadlines are not included: they are recomputed from the database on
+        resume, since the snapshot misses any activity recorded after it.
+        """
+        return {
+            'test_timeouts': {str(channel_id): seconds for channel_id, seconds in self.test_timeouts.items()}
+        }
+    
+    def import_state(self, state: dict):
+        """Load timer state previously produced by export_state."""
+        # Older snapshots also carry 'deadlines', which are ignored
+        for channel_id, seconds in state.get('test_timeouts', {}).items():
+            self.test_timeouts[int(channel_id)] = seconds
+    
+    def is_monitoring(self, channel_id: int) -> bool:
+        """Check whether a live monitoring task exists for a channel."""
+        task = self.timeout_tasks.get(channel_id)
+        return task is not None and not task.done()
     
-    async def start_timeout_monitoring(self, channel_id: int):
+    async def start_timeout_monitoring(self, channel_id: int, initial_delay: Optional[float] = None):
         """Start timeout monitoring for a channel."""
         if channel_id in self.timeout_tasks:
             self.timeout_tasks[channel_id].cancel()
         
-        task = asyncio.create_task(self._monitor_timeout(channel_id))
+        task = asyncio.create_task(self._monitor_timeout(channel_id, initial_delay))
         self.timeout_tasks[channel_id] = task
         logging.info(f"Started timeout monitoring for channel {channel_id}")
     
     async def stop_timeout_monitoring(self, channel_id: int):
         """Stop timeout monitoring for a channel."""
+        self.deadlines.pop(channel_id, None)
         if channel_id in self.timeout_tasks:
             self.timeout_tasks[channel_id].cancel()
             del self.timeout_tasks[channel_id]
             logging.info(f"Stopped timeout monitoring for channel {channel_id}")
     
-    async def _monitor_timeout(self, channel_id: int):
+    async def _monitor_timeout(self, channel_id: int, initial_delay: Optional[float] = None):
         """Monitor timeout for a specific channel."""
         try:
             # Get timeout duration (test or default)
             timeout_seconds = self.get_timeout_duration(channel_id)
             check_interval = min(60, timeout_seconds / 10)  # Check more frequently for test timeouts
             
+            # Resumed channels already know how long until their deadline
+            delay = check_interval if initial_delay is None else max(0, min(initial_delay, check_interval))
+            
             while True:
-                await asyncio.sleep(check_interval)
+                await self.clock.sleep(delay)
+                delay = check_interval
                 
                 timeout_info = self.bot.database.get_timeout_info(channel_id)
                 if not timeout_info:
                     logging.info(f"No timeout info found for channel {channel_id}, stopping monitoring")
                     break
                 
-                (claimer_id, ticket_holder_id, claim_time_str, 
-                 last_staff_str, last_holder_str, original_permissions, officer_used) = timeout_info
-                
-                # Parse datetime strings
-                try:
-                    claim_time = datetime.fromisoformat(claim_time_str.replace('Z', '+00:00'))
-                    last_staff = datetime.fromisoformat(last_staff_str.replace('Z', '+00:00'))
-                    last_holder = datetime.fromisoformat(last_holder_str.replace('Z', '+00:00'))
-                except ValueError:
-                    # Handle different datetime formats
-                    claim_time = datetime.strptime(claim_time_str, '%Y-%m-%d %H:%M:%S.%f')
-                    last_staff = datetime.strptime(last_staff_str, '%Y-%m-%d %H:%M:%S.%f')
-                    last_holder = datetime.strptime(last_holder_str, '%Y-%m-%d %H:%M:%S.%f')
+                (claimer_id, ticket_holder_id, claim_time, 
+                 last_staff, last_holder, original_permissions, officer_used) = timeout_info
                 
-                now = datetime.now()
-                timeout_delta = timedelta(seconds=timeout_seconds)
+                deadline, kind = compute_deadline(claim_time, last_staff, last_holder, timeout_seconds)
                 
-                # Calculate inactive times
-                staff_inactive_time = now - last_staff
-                holder_inactive_time = now - last_holder
+                self.deadlines[channel_id] = (deadline, kind)
+                remaining = (deadline - self.clock.now_ms()) / 1000
+                if remaining > 0:
+                    delay = min(check_interval, remaining)
+                    continue
                 
-                # Check if enough time has passed since claim for timeout to occur
-                if (now - claim_time) >= timeout_delta:
-                    # Determine who was last active by comparing timestamps
-                    if last_staff > last_holder:
-                        # Staff was last active, so ticket holder should be timed out
-                        if holder_inactive_time >= timeout_delta:
-                            await self._handle_holder_timeout(channel_id, claimer_id, ticket_holder_id, original_permissions, officer_used)
-                            break
-                    else:
-                        # Ticket holder was last active (or they were active at same time), so staff should be timed out
-                        if staff_inactive_time >= timeout_delta:
-                            await self._handle_staff_timeout(channel_id, claimer_id, original_permissions, officer_used)
-                            break
+                if kind == 'holder':
+                    # Staff was last active, so ticket holder should be timed out
+                    await self._handle_holder_timeout(channel_id, claimer_id, ticket_holder_id)
+                else:
+                    # Ticket holder was last active (or they were active at same time), so staff should be timed out
+                    await self._handle_staff_timeout(channel_id, claimer_id)
+                break
         
         except asyncio.CancelledError:
             logging.info(f"Timeout monitoring cancelled for channel {channel_id}")
         except Exception as e:
             logging.error(f"Error in timeout monitoring for channel {channel_id}: {e}")
         finally:
-            # Clean up task reference
-            if channel_id in self.timeout_tasks:
+            # Clean up task reference (unless it has already been replaced)
+            if self.timeout_tasks.get(channel_id) is asyncio.current_task():
                 del self.timeout_tasks[channel_id]
+                self.deadlines.pop(channel_id, None)
+    
+    @traced('timeout.resume_all', root=True)
+    async def resume_all(self, states: List[tuple], concurrency: int = RESUME_CONCURRENCY) -> dict:
+        """Resume monitoring for all active timeouts from bulk-loaded state.
+        
+        Safe to call again after a reconnect: channels that already have a live
+        monitoring task are left untouched.
+        """
+        async with self._resume_lock:
+            started_at = time.perf_counter()
+            now = self.clock.now_ms()
+            report = {'total': len(states), 'started': 0, 'overdue': 0, 'skipped': 0, 'stale': 0, 'errors': 0}
+            
+            overdue = []
+            stale_channels = []
+            
+            for state in states:
+                (channel_id, claimer_id, ticket_holder_id, claim_time,
+                 last_staff, last_holder, original_permissions, officer_used) = state
+                
+                if self.is_monitoring(channel_id):
+                    report['skipped'] += 1
+                    continue
+                
+                # Verify channel still exists
+                if not self.bot.get_channel(channel_id):
+                    stale_channels.append(channel_id)
+                    continue
+                
+                # Always from the row: it includes activity newer than any snapshot.
+                # The test timeout is only peeked; the monitor task consumes it.
+                try:
+                    deadline, kind = compute_deadline(
+                        claim_time, last_staff, last_holder,
+                        self.test_timeouts.get(channel_id, DEFAULT_TIMEOUT_SECONDS)
+                    )
+                except TypeError as e:
+                    logging.error(f"Invalid timeout state for channel {channel_id}: {e}")
+                    report['errors'] += 1
+                    continue
+                self.deadlines[channel_id] = (deadline, kind)
+                remaining = (deadline - now) / 1000
+                if remaining > 0:
+                    await self.start_timeout_monitoring(channel_id, initial_delay=remaining)
+                    report['started'] += 1
+                else:
+                    overdue.append((state, kind))
+            
+            # Clean up stale timeout data in one statement
+            if stale_channels:
+                self.bot.database.remove_timeouts(stale_channels)
+                report['stale'] = len(stale_channels)
+                logging.info(f"Cleaned up stale timeout data for {len(stale_channels)} channels")
+            
+            # Handle overdue timeouts concurrently, bounded to avoid a REST burst
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            
+            async def handle_overdue(state, kind):
+                channel_id, claimer_id, ticket_holder_id = state[:3]
+                self.test_timeouts.pop(channel_id, None)  # Used up: no monitor task will run
+                async with semaphore:
+                    if kind == 'holder':
+                        await self._handle_holder_timeout(channel_id, claimer_id, ticket_holder_id)
+                    else:
+                        await self._handle_staff_timeout(channel_id, claimer_id)
+            
+            if overdue:
+                await asyncio.gather(*(handle_overdue(state, kind) for state, kind in overdue))
+                report['overdue'] = len(overdue)
+            
+            report['duration_ms'] = round((time.perf_counter() - started_at) * 1000, 1)
+            return report
     
-    async def _handle_staff_timeout(self, channel_id: int, claimer_id: int, original_permissions: str, officer_used: bool):
+    @traced('timeout.manual', root=True)
+    async def handle_timeout(self, channel_id: int):
+        """Trigger a timeout immediately, for whichever party is currently waited on."""
+        timeout_info = self.bot.database.get_timeout_info(channel_id)
+        if not timeout_info:
+            return
+        
+        claimer_id, ticket_holder_id, claim_time, last_staff, last_holder = timeout_info[:5]
+        _, kind = compute_deadline(claim_time, last_staff, last_holder, self.get_timeout_duration(channel_id))
+        
+        await self.stop_timeout_monitoring(channel_id)
+        if kind == 'holder':
+            await self._handle_holder_timeout(channel_id, claimer_id, ticket_holder_id)
+        else:
+            await self._handle_staff_timeout(channel_id, claimer_id)
+    
+    @traced('timeout.staff', root=True)
+    async def _handle_staff_timeout(self, channel_id: int, claimer_id: int):
         """Handle staff timeout - restore permissions and allow reclaiming."""
         try:
             channel = self.bot.get_channel(channel_id)
@@ -107,14 +233,12 @@ class TimeoutManager:
                 logging.warning(f"Channel {channel_id} not found for staff timeout")
                 return
             
-            # Restore original permissions
-            await self.bot.permission_manager.restore_permissions(channel, original_permissions)
-
-            # FIX #2: Mark claim as completed with timeout - Fixed to pass officer_used parameter
-            self.bot.database.complete_claim(channel_id, timeout_occurred=True, officer_used=officer_used)
-            
-            # Remove timeout tracking
-            self.bot.database.remove_timeout(channel_id)
+            # Restore permissions, complete the claim and mark the ticket reclaimable in one transition
+            try:
+                await self.bot.tickets.complete(channel, 'staff_timeout', stop_monitoring=False, expected_claimer=claimer_id)
+            except InvalidTransition as e:
+                logging.info(f"Skipping staff timeout for channel {channel_id}: {e}")
+                return
             
             # Send timeout message so others know ticket is reclaimable
             await channel.send(
@@ -127,22 +251,21 @@ class TimeoutManager:
         except Exception as e:
             logging.error(f"Error handling staff timeout for channel {channel_id}: {e}")
     
-    async def _handle_holder_timeout(self, channel_id: int, claimer_id: int, ticket_holder_id: int, original_permissions: str, officer_used: bool):
-        """Handle ticket holder timeout - ping holder, award claimer point, restore permissions."""
+    @traced('timeout.holder', root=True)
+    async def _handle_holder_timeout(self, channel_id: int, claimer_id: int, ticket_holder_id: int):
+        """Handle ticket holder timeout - ping holder, restore permissions and complete the claim."""
         try:
             channel = self.bot.get_channel(channel_id)
             if not channel:
                 logging.warning(f"Channel {channel_id} not found for holder timeout")
                 return
             
-            # Restore original permissions so others can help
-            await self.bot.permission_manager.restore_permissions(channel, original_permissions)
-            
-            # FIX #2: Award point to claimer since they were active - Fixed to pass officer_used parameter
-            self.bot.database.complete_claim(channel_id, timeout_occurred=False, officer_used=officer_used)  # Award point
-            
-            # Remove timeout tracking
-            self.bot.database.remove_timeout(channel_id)
+            # Restore permissions so others can help and complete the claim in one transition
+            try:
+                await self.bot.tickets.complete(channel, 'holder_timeout', stop_monitoring=False, expected_claimer=claimer_id)
+            except InvalidTransition as e:
+                logging.info(f"Skipping holder timeout for channel {channel_id}: {e}")
+                return
             
             # Send friendly message pinging the ticket holder
             await channel.send(
@@ -150,7 +273,7 @@ class TimeoutManager:
                 f"Our staff member <@{claimer_id}> is ready to assist you. 😊"
             )
             
-            logging.info(f"Holder timeout handled for channel {channel_id} - ticket holder pinged, claimer awarded point, permissions restored")
+            logging.info(f"Holder timeout handled for channel {channel_id} - ticket holder pinged, permissions restored")
             
         except Exception as e:
             logging.error(f"Error handling holder timeout for channel {channel_id}: {e}")
@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+MS_PER_SECOND = 1000
+MS_PER_DAY = 86_400_000
+
+# Real seconds SimulatedClock.advance waits for woken tasks to block again
+SETTLE_TIMEOUT = 10.0
+
+class SystemClock:
+    """Wall-clock time and real event-loop sleeps."""
+
+    def now_ms(self) -> int:
+        """Current time as UTC epoch milliseconds."""
+        return time.time_ns() // 1_000_000
+
+    async def sleep(self, seconds: float):
+        """Sleep on the event loop."""
+        await asyncio.sleep(seconds)
+
+class SimulatedClock:
+    """Virtual time that only moves when advanced, so hours of timeouts run in seconds.
+
+    Tasks sleeping on the clock are woken in deadline order. After each wake-up
+    advance() lets the woken tasks run (including worker-thread database calls)
+    until they finish or sleep on the clock again, so time never moves past
+    work that is still in flight.
+    """
+
+    def __init__(self, start_ms: Optional[int] = None):
+        self._now = start_ms if start_ms is not None else SystemClock().now_ms()
+        self._sleepers: List[tuple] = []  # Heap of (wake ms, sequence, future, task)
+        self._sequence = itertools.count()
+        self._sleeping = set()  # Tasks currently blocked in sleep()
+
+    def now_ms(self) -> int:
+        """Current virtual time as UTC epoch milliseconds."""
+        return self._now
+
+    @property
+    def pending(self) -> int:
+        """Number of tasks sleeping on the clock."""
+        return len(self._sleeping)
+
+    async def sleep(self, seconds: float):
+        """Block until the clock has been advanced past now + seconds."""
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        task = asyncio.current_task()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._now + int(seconds * MS_PER_SECOND), next(self._sequence), future, task))
+        self._sleeping.add(task)
+        try:
+            await future
+        finally:
+            self._sleeping.discard(task)
+
+    async def advance(self, seconds: float):
+        """Move time forward, waking every sleeper whose deadline is reached on the way."""
+        target = self._now + int(seconds * MS_PER_SECOND)
+        while self._sleepers and self._sleepers[0][0] <= target:
+            wake_ms = self._sleepers[0][0]
+            self._now = max(self._now, wake_ms)
+            woken = []
+            while self._sleepers and self._sleepers[0][0] == wake_ms:
+                _, _, future, task = heapq.heappop(self._sleepers)
+                if not future.done():
+                    future.set_result(None)
+                    self._sleeping.discard(task)
+                    woken.append(task)
+            await self._settle(woken)
+        self._now = max(self._now, target)
+        await asyncio.sleep(0)
+
+    async def _settle(self, tasks: list):
+        """Let woken tasks run until each is done or sleeping on the clock again."""
+        deadline = time.monotonic() + SETTLE_TIMEOUT
+        spins = 0
+        while any(not task.done() and task not in self._sleeping for task in tasks):
+            if time.monotonic() > deadline:
+                logging.warning("Simulated clock advanced with tasks still running")
+                return
+            spins += 1
+            # Yield to ready callbacks first; back off while worker threads finish
+            await asyncio.sleep(0 if spins < 100 else 0.001)
+
+_clock = SystemClock()
+
+def get_clock():
+    """Get the process-wide clock."""
+    return _clock
+
+def set_clock(clock):
+    """Replace the process-wide clock (e.g. with a SimulatedClock). Returns the previous one."""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+def now_ms() -> int:
+    """Current time as UTC epoch milliseconds, from the process-wide clock."""
+    return _clock.now_ms()
+
+def to_ms(value) -> Optional[int]:
+    """Convert a stored timestamp to UTC epoch milliseconds.
+
+    Accepts integers (already converted), datetimes and the legacy ISO
+    strings written by datetime.now(); naive values are local server time.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise TypeError("Boolean is not a timestamp")
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lstrip('-').isdigit():
+            return int(text)
+        try:
+            value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            value = datetime.strptime(text, '%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(value, datetime):
+        # astimezone() on a naive datetime assumes local time
+        return int(value.astimezone(timezone.utc).timestamp() * MS_PER_SECOND)
+    raise TypeError(f"Unsupported timestamp {value!r}")
+
+def from_ms(ms: int) -> datetime:
+    """Convert UTC epoch milliseconds to an aware UTC datetime."""
+    return datetime.fromtimestamp(ms / MS_PER_SECOND, tz=timezone.utc)
+
+def date_to_ms(day: str) -> int:
+    """Convert a YYYY-MM-DD date to UTC midnight in epoch milliseconds."""
+    parsed = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp()) * MS_PER_SECOND
@@ -0,0 +1,192 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from config import (
+    TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_EXPORT_PATH, TRACE_EXPORT_MAX_BYTES
+)
+
+class Span:
+    """One timed operation inside a trace."""
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attrs', 'start_ms', 'started',
+                 'duration_ms', 'error', 'sampled', 'spans', 'finished')
+
+    def __init__(self, name: str, parent: Optional['Span'], sampled: bool, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.sampled = sampled
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else random.getrandbits(64)
+        # Finished spans of the whole trace, shared with the root
+        self.spans: List[dict] = parent.spans if parent else []
+        self.start_ms = time.time_ns() // 1_000_000
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.error: Optional[str] = None
+        self.finished = False
+
+    def to_dict(self) -> dict:
+        """Get the finished span in its exported form."""
+        return {
+            'span_id': f"{self.span_id:016x}",
+            'parent_id': f"{self.parent_id:016x}" if self.parent_id else None,
+            'name': self.name,
+            'start_ms': self.start_ms,
+            'duration_ms': round(self.duration_ms, 2),
+            'attrs': self.attrs,
+            'error': self.error
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+class Tracer:
+    """Head-sampled span tracing into a ring buffer, exported as JSONL.
+
+    The sampling decision is made once per root span; children of an
+    unsampled root cost one contextvar lookup. The current span follows
+    awaits and asyncio.to_thread calls through contextvars.
+    """
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, capacity: int = TRACE_BUFFER_SIZE,
+                 export_path: str = TRACE_EXPORT_PATH, export_max_bytes: int = TRACE_EXPORT_MAX_BYTES):
+        self.sample_rate = sample_rate
+        self.traces: deque = deque(maxlen=capacity)
+        self.export_path = export_path
+        self.export_max_bytes = export_max_bytes
+        self._pending: List[dict] = []
+        self._export_lock = threading.Lock()
+        self.counters = {'started': 0, 'sampled': 0, 'exported': 0}
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, **attrs):
+        """Time a block as a child of the current span.
+
+        With root=True the block always starts a new trace; otherwise it is
+        only traced inside a live trace. Tasks copy the context they were
+        created in, so a task that outlives its trace sees a finished span
+        here; that span is ignored rather than collecting children forever.
+        """
+        parent = _current_span.get()
+        if parent is not None and (root or parent.finished):
+            parent = None
+        if parent is None:
+            if not root:
+                yield None
+                return
+            self.counters['started'] += 1
+            sampled = random.random() < self.sample_rate
+            if sampled:
+                self.counters['sampled'] += 1
+            span = Span(name, None, sampled, attrs)
+        elif not parent.sampled:
+            # Unsampled traces still propagate so children skip cheaply
+            yield None
+            return
+        else:
+            span = Span(name, parent, True, attrs)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finished = True
+            if span.sampled:
+                span.duration_ms = (time.perf_counter() - span.started) * 1000
+                span.spans.append(span.to_dict())
+                if parent is None:
+                    self._finish_trace(span)
+
+    def _finish_trace(self, root: Span):
+        """Move a completed trace into the ring buffer and export queue."""
+        trace = {
+            'trace_id': f"{root.trace_id:016x}",
+            'name': root.name,
+            'start_ms': root.start_ms,
+            'duration_ms': round(root.duration_ms, 2),
+            'error': root.error,
+            'spans': sorted(root.spans, key=lambda s: s['start_ms'])
+        }
+        self.traces.append(trace)
+        with self._export_lock:
+            self._pending.append(trace)
+
+    def slowest(self, count: int = 5) -> List[dict]:
+        """Get the slowest traces still in the ring buffer."""
+        return sorted(self.traces, key=lambda t: t['duration_ms'], reverse=True)[:count]
+
+    def flush(self) -> int:
+        """Append pending traces to the JSONL export. Runs in a worker thread."""
+        with self._export_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        try:
+            if os.path.exists(self.export_path) and os.path.getsize(self.export_path) > self.export_max_bytes:
+                os.replace(self.export_path, f"{self.export_path}.1")
+            with open(self.export_path, 'a', encoding='utf-8') as f:
+                for trace in pending:
+                    f.write(json.dumps(trace, separators=(',', ':')))
+                    f.write('\n')
+        except OSError as e:
+            logging.error(f"Error exporting traces: {e}")
+            return 0
+
+        self.counters['exported'] += len(pending)
+        return len(pending)
+
+tracer = Tracer()
+
+def traced(name: Optional[str] = None, root: bool = False):
+    """Decorate a sync or async function so each call is traced as a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name, root=root):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name, root=root):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_methods(prefix: str):
+    """Class decorator tracing every public method as '<prefix>.<method>' child spans."""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or not inspect.isfunction(value):
+                continue
+            setattr(cls, attr, traced(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
+
+def trace_http(http_client):
+    """Wrap a discord HTTPClient so every REST call (including rate-limit waits) is a span."""
+    request = http_client.request
+
+    @functools.wraps(request)
+    async def traced_request(route, **kwargs):
+        with tracer.span(f"http.{route.method} {route.path}"):
+            return await request(route, **kwargs)
+
+    http_client.request = traced_request
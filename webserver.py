@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from config import WEB_HOST, WEB_PORT, LOOP_LAG_INTERVAL, READY_MAX_LOOP_LAG, READY_DB_TIMEOUT
+
+class StatusServer:
+    """Health, readiness and status endpoints served on the bot's event loop."""
+
+    def __init__(self, host: str = WEB_HOST, port: int = WEB_PORT):
+        self.host = host
+        self.port = port
+        self.bot = None
+        self.started_at = time.time()
+        self.loop_lag = 0.0  # Seconds the last probe woke up late
+        self.max_loop_lag = 0.0
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.handle_index)
+        self.app.router.add_get('/health', self.handle_health)
+        self.app.router.add_get('/ready', self.handle_ready)
+        self.app.router.add_get('/status', self.handle_status)
+
+    def attach(self, bot):
+        """Point the endpoints at the running bot (replaced on each login attempt)."""
+        self.bot = bot
+
+    async def start(self):
+        """Bind the port and start probing loop lag."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(self._probe_loop_lag())
+        logging.info(f"Status server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop serving and cancel the lag probe."""
+        if self._lag_task:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        logging.info("Status server stopped")
+
+    async def _probe_loop_lag(self):
+        """Measure how late the loop wakes a sleeping task."""
+        while True:
+            expected = time.perf_counter() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.perf_counter() - expected)
+            self.max_loop_lag = max(self.max_loop_lag, self.loop_lag)
+
+    async def handle_index(self, request):
+        """Root endpoint kept for uptime pingers."""
+        return web.Response(text='Bot is running!')
+
+    async def handle_health(self, request):
+        """Liveness: the process and its event loop are responding."""
+        return web.Response(text='OK')
+
+    async def handle_ready(self, request):
+        """Readiness: gateway connected, database reachable and loop not lagging."""
+        checks = {
+            'gateway': self._gateway_connected(),
+            'database': await self._database_reachable(),
+            'loop_lag': self.loop_lag < READY_MAX_LOOP_LAG
+        }
+        ready = all(checks.values())
+        return web.json_response(
+            {'ready': ready, 'checks': checks, 'loop_lag_ms': round(self.loop_lag * 1000, 1)},
+            status=200 if ready else 503
+        )
+
+    async def handle_status(self, request):
+        """Status JSON built from in-memory state only."""
+        bot = self.bot
+        status = {
+            'uptime_s': round(time.time() - self.started_at),
+            'loop_lag_ms': round(self.loop_lag * 1000, 1),
+            'max_loop_lag_ms': round(self.max_loop_lag * 1000, 1),
+            'gateway_connected': self._gateway_connected()
+        }
+        if bot is not None:
+            backup_lag = bot.backups.lag_seconds
+            status.update({
+                'user': str(bot.user) if bot.user else None,
+                'guilds': len(bot.guilds),
+                'latency_ms': round(bot.latency * 1000, 1) if math.isfinite(bot.latency) else None,
+                'monitored_tickets': len(bot.timeout_manager.timeout_tasks),
+                'tracked_claims': len(bot.perf_stats.active),
+                'ingestion': bot.ingestion.stats(),
+                'permission_drift': bot.reconciler.stats(),
+                'admission': bot.admission.stats(),
+                'dispatch': bot.dispatcher.stats(),
+                # Not created until first use; reporting must not create it
+                'leaderboard_cache': dict(bot._leaderboard.cache_stats) if bot._leaderboard is not None else None,
+                'backup_lag_s': round(backup_lag) if backup_lag is not None else None,
+                'startup': bot.startup_report
+            })
+        return web.json_response(status)
+
+    def _gateway_connected(self) -> bool:
+        """Check whether the bot currently has a live gateway session."""
+        bot = self.bot
+        return bot is not None and not bot.is_closed() and bot.gateway_connected
+
+    async def _database_reachable(self) -> bool:
+        """Check that the database answers a trivial query in time."""
+        if self.bot is None:
+            return False
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.bot.database.ping), timeout=READY_DB_TIMEOUT)
+            return True
+        except Exception as e:
+            logging.warning(f"Readiness database check failed: {e}")
+            return False